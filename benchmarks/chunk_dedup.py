@@ -0,0 +1,92 @@
+"""
+Deduplication benchmark for the backup chunk store.
+
+Writes a synthetic "day 1" log, then N following days that each keep most of the
+previous day with lines edited, inserted and deleted at random places plus new lines
+appended, like rotated logs or daily dumps. Every day is backed up with the local
+engine, once storing whole files and once with content-defined chunking, and the
+bytes stored, dedup ratio and throughput are reported.
+
+Usage: python benchmarks/chunk_dedup.py [--size-mb 16] [--days 4] [--avg-kb 64]
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mtb.backup_engines.registry import get_engine
+from mtb.utils import logger
+
+WORDS = ["INFO", "WARN", "ERROR", "user=alice", "user=bob", "GET", "POST", "/api/v1/orders",
+         "/api/v1/items", "status=200", "status=500", "duration_ms=12", "request completed"]
+
+def make_line(rng, n):
+    return f"2024-05-01T{n // 3600 % 24:02d}:{n // 60 % 60:02d}:{n % 60:02d} " + \
+        " ".join(rng.choice(WORDS) for _ in range(8)) + f" id={rng.getrandbits(48):x}\n"
+
+def next_day(lines, rng, counter):
+    """Edit 20 lines, insert and delete 5 blocks of lines and append 5% new lines."""
+    lines = list(lines)
+    for _ in range(20):
+        lines[rng.randrange(len(lines))] = make_line(rng, next(counter))
+    for _ in range(5):
+        at = rng.randrange(len(lines))
+        lines[at:at] = [make_line(rng, next(counter)) for _ in range(rng.randrange(1, 50))]
+        at = rng.randrange(len(lines))
+        del lines[at:at + rng.randrange(1, 50)]
+    lines.extend(make_line(rng, next(counter)) for _ in range(len(lines) // 20))
+    return lines
+
+def run(label, settings, days_dir, days):
+    engine = get_engine("local", settings)
+    total_in = total_stored = 0
+    start = time.perf_counter()
+    for day in range(days):
+        source = os.path.join(days_dir, f"day{day}")
+        stats = engine.backup(source).as_dict()
+        total_in += stats["bytes_hashed"]
+        total_stored += stats["bytes_sent"]
+    seconds = time.perf_counter() - start
+    if engine.chunk_store is not None:
+        engine.chunk_store.close()
+    print(f"{label:14} in {total_in / 1e6:8.1f} MB  stored {total_stored / 1e6:8.1f} MB  "
+          f"dedup x{total_in / total_stored:5.2f}  {total_in / 1e6 / seconds:7.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=16, help="Size of the first day's file.")
+    parser.add_argument("--days", type=int, default=4, help="Number of daily versions.")
+    parser.add_argument("--avg-kb", type=int, default=64, help="Average chunk size in KB.")
+    args = parser.parse_args()
+
+    logger.get_logger().setLevel(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="mtb-chunk-bench-")
+    try:
+        rng = random.Random(42)
+        counter = iter(range(10 ** 9))
+        lines = []
+        while sum(map(len, lines[-1:])) * len(lines) < args.size_mb * 1024 * 1024:
+            lines.append(make_line(rng, next(counter)))
+        days_dir = os.path.join(workdir, "days")
+        for day in range(args.days):
+            os.makedirs(os.path.join(days_dir, f"day{day}"))
+            with open(os.path.join(days_dir, f"day{day}", "app.log"), "w") as f:
+                f.writelines(lines)
+            lines = next_day(lines, rng, counter)
+
+        avg = args.avg_kb * 1024
+        run("whole files", {"destination": os.path.join(workdir, "whole")}, days_dir, args.days)
+        run("chunked", {"destination": os.path.join(workdir, "chunked"), "chunking": True,
+                        "chunk_min_size": avg // 4, "chunk_avg_size": avg, "chunk_max_size": avg * 4,
+                        "chunk_index": os.path.join(workdir, "chunks.db")}, days_dir, args.days)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compression benchmark for file_utils.compress_file across codecs, levels and file sizes.
+
+Generates synthetic application-log files in a temporary directory and reports, for
+every codec/level, the throughput (MB/s of input) and the compression ratio.
+
+Usage: python benchmarks/compression_codecs.py [--sizes 16,128] [--levels 1,6,9] [--threads N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mtb.utils import file_utils
+
+WORDS = [b"INFO", b"WARN", b"ERROR", b"DEBUG", b"user=alice", b"user=bob", b"GET", b"POST",
+         b"/api/v1/orders", b"/api/v1/items", b"status=200", b"status=500", b"duration_ms=12",
+         b"duration_ms=340", b"connection reset", b"request completed", b"cache miss"]
+
+def write_log(path, size_mb):
+    rng = random.Random(size_mb)
+    lines = [b"2024-05-01T12:%02d:%02d " % (i // 60 % 60, i % 60) +
+             b" ".join(rng.choice(WORDS) for _ in range(10)) + b"\n" for i in range(20000)]
+    block = b"".join(lines)
+    with open(path, "wb") as f:
+        written = 0
+        while written < size_mb * 1024 * 1024:
+            f.write(block)
+            written += len(block)
+    return os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="16,128", help="File sizes in MB, comma-separated.")
+    parser.add_argument("--levels", default="1,6,9", help="Compression levels, comma-separated.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Threads for pgzip/zstd.")
+    args = parser.parse_args()
+
+    codecs = ["gzip", "pgzip", "zip"] + (["zstd"] if file_utils.zstandard is not None else [])
+    print(f"{'size MB':>7} {'codec':<6} {'level':>5} {'seconds':>8} {'MB/s':>8} {'ratio':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in (int(s) for s in args.sizes.split(",")):
+            src = os.path.join(tmp, f"app-{size_mb}.log")
+            size = write_log(src, size_mb)
+            for codec in codecs:
+                for level in (int(l) for l in args.levels.split(",")):
+                    start = time.perf_counter()
+                    out = file_utils.compress_file(src, codec=codec, level=level, threads=args.threads)
+                    seconds = time.perf_counter() - start
+                    ratio = size / os.path.getsize(out)
+                    os.remove(out)
+                    print(f"{size_mb:>7} {codec:<6} {level:>5} {seconds:>8.2f} "
+                          f"{size / 1048576 / seconds:>8.1f} {ratio:>6.1f}")
+            os.remove(src)
+
+if __name__ == "__main__":
+    main()
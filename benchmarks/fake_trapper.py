@@ -0,0 +1,102 @@
+"""
+Minimal local stand-in for a Zabbix server trapper, for exercising mtb's senders.
+
+Speaks the Zabbix protocol (ZBXD header, optional zlib compression), accepts
+"sender data" requests and answers like a real server. Received items, request and
+connection counts are recorded on the server object. Can be run standalone:
+
+    python benchmarks/fake_trapper.py --port 10051
+"""
+import argparse
+import json
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+HEADER = struct.Struct('<4sBII')
+
+def read_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+def pack(payload):
+    body = json.dumps(payload).encode("utf-8")
+    return HEADER.pack(b"ZBXD", 0x01, len(body), 0) + body
+
+class TrapperHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        try:
+            magic, flags, datalen, reserved = HEADER.unpack(read_exact(self.request, HEADER.size))
+        except (ConnectionError, struct.error):
+            return
+        if magic != b"ZBXD":
+            return
+        body = read_exact(self.request, datalen)
+        if flags & 0x02:
+            body = zlib.decompress(body)
+        request = json.loads(body)
+        items = request.get("data", [])
+        if server.delay:
+            time.sleep(server.delay)
+        with server.lock:
+            server.requests += 1
+            server.items.extend(items)
+        failed = sum(1 for item in items if item.get("key") in server.reject_keys)
+        info = (f"processed: {len(items) - failed}; failed: {failed}; "
+                f"total: {len(items)}; seconds spent: 0.000100")
+        self.request.sendall(pack({"response": "success", "info": info}))
+
+class FakeTrapper(socketserver.ThreadingTCPServer):
+    """Threaded fake trapper. Use as a context manager to run it in a background thread."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, reject_keys=()):
+        super().__init__((host, port), TrapperHandler)
+        self.lock = threading.Lock()
+        self.delay = delay
+        self.reject_keys = set(reject_keys)
+        self.items = []
+        self.requests = 0
+        self.connections = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+        self.server_close()
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Zabbix trapper.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10051)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering.")
+    args = parser.parse_args()
+    server = FakeTrapper(args.host, args.port, delay=args.delay)
+    print(f"Fake trapper listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{server.requests} requests, {len(server.items)} items")
+
+if __name__ == "__main__":
+    main()
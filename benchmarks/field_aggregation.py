@@ -0,0 +1,98 @@
+"""
+Benchmark of JSON log field aggregation (mtb.utils.log_fields).
+
+Generates JSON log lines with a log-normal duration_ms (plus a slow tail), a status
+and a few other keys, then aggregates duration_ms (stats) and status (count) with:
+  - json.loads: every line parsed into a dict, exact percentiles from the sorted values;
+  - aggregator: FieldAggregator over 4 MB chunks (one regex per field, LogSketch).
+Reports MB/s, the relative error of the sketch's p50/p95/p99 against the exact ones,
+the number of sketch buckets, and checks that both count the same statuses.
+
+Usage: python benchmarks/field_aggregation.py [--mb 64]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mtb.utils.log_fields import FieldAggregator, QUANTILES
+
+BLOCK = 4 * 1024 * 1024
+
+def make_corpus(megabytes, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    i = 0
+    while size < megabytes * 1024 * 1024:
+        i += 1
+        duration = rng.lognormvariate(3.5, 0.8) if rng.random() < 0.99 else rng.uniform(2000, 30000)
+        record = {
+            "ts": f"2026-10-18T10:{i % 60:02d}:{i % 57:02d}.{i % 1000:03d}Z",
+            "level": "INFO",
+            "logger": "orders.RequestHandler",
+            "msg": f"GET /api/orders/{i} done",
+            "request": {"id": f"{i:x}", "user": f"u{i % 5000}"},
+            "status": rng.choice((200, 200, 200, 200, 201, 304, 404, 500)),
+            "duration_ms": round(duration, 2),
+        }
+        line = json.dumps(record)
+        lines.append(line)
+        size += len(line) + 1
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def blocks(data):
+    pos = 0
+    while pos < len(data):
+        end = data.rfind(b"\n", pos, pos + BLOCK) + 1 or len(data)
+        yield data[pos:end]
+        pos = end
+
+def exact_quantile(values, q):
+    return values[int(q * (len(values) - 1))]
+
+def with_json(data):
+    durations, statuses = [], {}
+    for line in data.splitlines():
+        record = json.loads(line)
+        durations.append(float(record["duration_ms"]))
+        status = str(record["status"])
+        statuses[status] = statuses.get(status, 0) + 1
+    durations.sort()
+    return {name: exact_quantile(durations, q) for name, q in QUANTILES}, statuses
+
+def with_aggregator(data):
+    aggregator = FieldAggregator({"duration_ms": "stats", "status": "count"})
+    for chunk in blocks(data):
+        aggregator.feed(chunk)
+    sketch = aggregator.sketches["duration_ms"]
+    return {name: sketch.quantile(q) for name, q in QUANTILES}, dict(aggregator.counts["status"]), sketch
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=64, help="Size of the generated corpus.")
+    args = parser.parse_args()
+
+    data = make_corpus(args.mb)
+    mb = len(data) / 1024 / 1024
+    lines = data.count(b"\n")
+    print(f"corpus {mb:.0f} MB, {lines} lines")
+
+    start = time.perf_counter()
+    exact, statuses = with_json(data)
+    print(f"json.loads   {mb / (time.perf_counter() - start):8.1f} MB/s")
+    start = time.perf_counter()
+    approx, counted, sketch = with_aggregator(data)
+    print(f"aggregator   {mb / (time.perf_counter() - start):8.1f} MB/s  ({len(sketch.buckets)} buckets)")
+    assert counted == statuses, f"status counts differ: {counted} != {statuses}"
+    for name, _ in QUANTILES:
+        error = abs(approx[name] - exact[name]) / exact[name] if exact[name] else math.nan
+        print(f"  {name}  exact {exact[name]:10.2f}  sketch {approx[name]:10.2f}  error {error:.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark of the multi-pattern log matcher with literal prefiltering.
+
+Generates a log corpus that looks like a mix of application logs (levels, threads,
+request ids, durations), access logs and Java stack traces, with rare error lines, and
+matches it against 1, 10 and 100 logs.yaml-style patterns with:
+  - per line: every regex searched on every line (the naive approach);
+  - per pattern: every regex searched over whole 4 MB blocks;
+  - matcher: mtb.utils.pattern_matcher.PatternMatcher (prefilter, then full regexes).
+Reports MB/s and checks that the three methods count the same matches.
+
+Usage: python benchmarks/pattern_matching.py [--mb 32] [--skip-per-line]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mtb.utils.pattern_matcher import PatternMatcher, strip_wildcards
+
+BLOCK = 4 * 1024 * 1024
+
+SERVICES = ["orders", "billing", "auth", "search", "inventory", "gateway", "mailer", "reports"]
+
+BASE_PATTERNS = [
+    ".*SQL connection fail.*",
+    ".*Connection error.*",
+    r"ERROR \[[^\]]+\] .*(timeout|refused)",
+    r"OutOfMemoryError",
+    r"Exception in thread \"[^\"]+\"",
+    r"HTTP/1\.[01]\" 5\d\d",
+    r"duration_ms=\d{5,}",
+    r"deadlock detected",
+    r"(?i)fatal",
+    r"^WARN .*retrying",
+]
+
+def make_patterns(count):
+    patterns = list(BASE_PATTERNS)
+    rng = random.Random(7)
+    while len(patterns) < count:
+        service = rng.choice(SERVICES)
+        n = len(patterns)
+        patterns.append(rng.choice([
+            rf"ERR-{n:04d}: .* failed",
+            rf"(timeout|refused) connecting to {service}-{n}",
+            rf"{service}: quota {n} exceeded",
+            rf"user=u{n}\d* .*denied",
+            rf"code={n} (error|failure)",
+        ]))
+    return patterns[:count]
+
+def make_corpus(megabytes, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    i = 0
+    while size < megabytes * 1024 * 1024:
+        i += 1
+        service = rng.choice(SERVICES)
+        r = rng.random()
+        if r < 0.45:
+            line = (f"2026-10-18 10:{i % 60:02d}:{i % 57:02d},{i % 1000:03d} INFO [pool-{i % 16}-thread-{i % 8}] "
+                    f"{service}.RequestHandler - request id={i:x} user=u{i % 5000} done duration_ms={rng.randrange(900)}")
+        elif r < 0.80:
+            line = (f"10.{i % 256}.{i % 199}.{i % 97} - - [18/Oct/2026:10:{i % 60:02d}:00 +0000] "
+                    f"\"GET /api/{service}/items/{i} HTTP/1.1\" {rng.choice((200, 200, 200, 304, 404))} {rng.randrange(99999)}")
+        elif r < 0.95:
+            line = (f"2026-10-18 10:{i % 60:02d}:{i % 57:02d},{i % 1000:03d} DEBUG [main] {service}.Cache - "
+                    f"hit key=item:{i} ttl={rng.randrange(3600)}")
+        elif r < 0.985:
+            line = f"\tat com.example.{service}.Service.handle(Service.java:{rng.randrange(900)})"
+        elif r < 0.993:
+            line = f"WARN [{service}] upstream slow, retrying in {rng.randrange(10)}s"
+        else:
+            line = rng.choice([
+                f"2026-10-18 10:00:00,000 ERROR [{service}] call failed: timeout after 30000ms",
+                f"2026-10-18 10:00:00,000 ERROR [{service}] Connection error to db{i % 3}",
+                "Exception in thread \"main\" java.lang.OutOfMemoryError: Java heap space",
+                f"10.0.0.1 - - [18/Oct/2026:10:00:00 +0000] \"POST /api/{service} HTTP/1.1\" 503 0",
+                f"ERR-{i % 100:04d}: batch {i} failed",
+                f"code={i % 100} error in {service}",
+            ])
+        lines.append(line)
+        size += len(line) + 1
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def blocks(data):
+    """Split data in blocks of complete lines, like the log scanner does."""
+    pos = 0
+    while pos < len(data):
+        end = data.rfind(b"\n", pos, pos + BLOCK) + 1 or len(data)
+        yield data[pos:end]
+        pos = end
+
+def per_line(data, patterns):
+    regexes = [re.compile(p.encode("utf-8")) for p in patterns]
+    counts = [0] * len(patterns)
+    for line in data.split(b"\n"):
+        for i, regex in enumerate(regexes):
+            if regex.search(line):
+                counts[i] += 1
+    return counts
+
+def per_pattern(data, patterns):
+    regexes = [re.compile(strip_wildcards(p).encode("utf-8"), re.MULTILINE) for p in patterns]
+    counts = [0] * len(patterns)
+    for chunk in blocks(data):
+        for i, regex in enumerate(regexes):
+            last = -1
+            for m in regex.finditer(chunk):
+                start = chunk.rfind(b"\n", 0, m.start()) + 1
+                if start != last:
+                    last = start
+                    counts[i] += 1
+    return counts
+
+def matcher(data, patterns):
+    compiled = PatternMatcher(patterns)
+    counts = [0] * len(patterns)
+    for chunk in blocks(data):
+        for index, _ in compiled.search(chunk):
+            counts[index] += 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=32, help="Size of the generated corpus.")
+    parser.add_argument("--skip-per-line", action="store_true", help="Do not run the (slow) per-line method.")
+    args = parser.parse_args()
+
+    data = make_corpus(args.mb)
+    mb = len(data) / 1024 / 1024
+    lines = data.count(b"\n")
+    print(f"corpus {mb:.0f} MB, {lines} lines")
+    for count in (1, 10, 100):
+        patterns = make_patterns(count)
+        compiled = PatternMatcher(patterns)
+        print(f"{count} patterns ({len(compiled.prefiltered)} prefiltered, {len(compiled.distinct)} literals)")
+        methods = [("per pattern", per_pattern), ("matcher", matcher)]
+        if not args.skip_per_line:
+            methods.insert(0, ("per line", per_line))
+        results = {}
+        for name, func in methods:
+            start = time.perf_counter()
+            results[name] = func(data, patterns)
+            seconds = time.perf_counter() - start
+            print(f"  {name:12} {mb / seconds:8.1f} MB/s  {sum(results[name]):7d} matches")
+        reference = next(iter(results.values()))
+        for name, counts in results.items():
+            assert counts == reference, f"{name} counts differ: {counts} != {reference}"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Overhead benchmark of the sampled process monitor.
+
+Starts --processes idle child processes (sleep), then measures the CPU time one sample
+costs with:
+  - process_iter: one psutil.process_iter() pass with name, cmdline, cpu_percent,
+    memory_info, num_threads and num_fds for every process (what a naive grouping
+    monitor would do; its cpu_percent is 0.0 for every process on a first pass);
+  - sampler: ProcessSampler.sample() with the children in a group (by name) or only
+    this process in a group (by cmdline regex), first sample (empty handle cache) and
+    following samples.
+
+Usage: python benchmarks/process_sampling.py [--processes 2000] [--samples 5]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mtb.utils import logger
+from mtb.utils.process_sampler import ProcessGroup, ProcessSampler
+
+def naive_pass():
+    attrs = ["name", "cmdline", "cpu_percent", "memory_info", "num_threads", "num_fds"]
+    return sum(1 for _ in psutil.process_iter(attrs))
+
+def cpu_seconds(func):
+    start = time.process_time()
+    result = func()
+    return time.process_time() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processes", type=int, default=2000, help="Idle child processes to start.")
+    parser.add_argument("--samples", type=int, default=5, help="Samples taken with the same sampler.")
+    args = parser.parse_args()
+
+    logger.get_logger().setLevel(logging.WARNING)
+    children = [subprocess.Popen(["sleep", "600"]) for _ in range(args.processes)]
+    try:
+        print(f"{len(psutil.pids())} processes")
+        seconds, count = cpu_seconds(naive_pass)
+        print(f"process_iter   {seconds * 1000:8.1f} ms cpu  ({count} processes)")
+        python = ProcessGroup("python", cmdline=r"python.*process_sampling")
+        for title, groups in (("every child grouped", [ProcessGroup("sleepers", names=["sleep"]), python]),
+                              ("one process grouped", [python])):
+            print(title)
+            sampler = ProcessSampler(groups)
+            for i in range(args.samples):
+                seconds, result = cpu_seconds(lambda: sampler.sample(0.1))
+                label = "sampler, first" if i == 0 else "sampler, next"
+                grouped = sum(values["count"] for values in result["groups"].values())
+                print(f"  {label:14} {seconds * 1000:8.1f} ms cpu  (two passes, {result['processes']} processes, "
+                      f"{grouped} grouped)")
+    finally:
+        for child in children:
+            child.kill()
+        for child in children:
+            child.wait()
+
+if __name__ == "__main__":
+    main()
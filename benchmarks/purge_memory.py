@@ -0,0 +1,70 @@
+"""
+Memory benchmark for the streaming purge pipeline.
+
+Generates a flat spool directory with many files and runs the purge pipeline over it
+(scandir walk -> rule match -> age filter -> action) under tracemalloc, first with
+files that are too young to need an action, then deleting every file. Asserts that
+the peak of Python allocations stays below a fixed bound, independent of the number of
+files.
+
+Usage: python benchmarks/purge_memory.py [--files 300000] [--max-peak-mb 8]
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mtb.commands import purge
+from mtb.utils import purge_planner
+
+def build_spool(directory, files):
+    old = time.time() - 10 * 86400
+    for i in range(files):
+        path = os.path.join(directory, f"msg-{i:08d}.dat")
+        with open(path, "w"):
+            pass
+        os.utime(path, (old, old))
+
+def measure(label, rules, root, max_peak_mb):
+    stats = purge.PurgeStats()
+    progress = purge.ProgressCounter(0, stats)
+    tracemalloc.start()
+    start = time.perf_counter()
+    purge.process_files(purge_planner.plan(rules, root), time.time(), stats, progress)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_mb = peak / 1024 / 1024
+    print(f"{label:28} {progress.files:9d} files  {seconds:7.2f}s  peak {peak / 1024:8.1f} KB  "
+          f"deleted {stats.deleted}")
+    assert peak_mb < max_peak_mb, f"peak memory {peak_mb:.2f} MB exceeds {max_peak_mb} MB"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=300000, help="Number of files in the spool directory.")
+    parser.add_argument("--max-peak-mb", type=float, default=8, help="Allowed peak of traced allocations.")
+    args = parser.parse_args()
+
+    # Per-file log lines are not what is measured here.
+    logging.getLogger("mtb").setLevel(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="mtb-purge-mem-")
+    try:
+        print(f"Creating {args.files} files...")
+        build_spool(workdir, args.files)
+        root = workdir
+        pattern = rf"{root}/msg-.*\.dat$"
+        measure("scan only (files too young)",
+                purge_planner.build_rules({pattern: {"compress": 30, "delete": 60}}), root, args.max_peak_mb)
+        measure("delete every file",
+                purge_planner.build_rules({pattern: {"compress": 30, "delete": 1}}), root, args.max_peak_mb)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Startup-time benchmark for the mtb CLI.
+
+For every command in the manifest, starts a fresh interpreter that resolves the command
+through the lazy command group and reports the wall time and the number of imported
+modules. The "eager" column imports every command module, as the CLI did before the
+manifest existed.
+
+Usage: python benchmarks/startup_time.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import click
+from mtb.mtb import main
+main.get_command(click.Context(main), {name!r})
+print(json.dumps({{"seconds": time.perf_counter() - t0, "modules": len(sys.modules)}}))
+"""
+
+EAGER_SNIPPET = """
+import json, sys, time, importlib
+t0 = time.perf_counter()
+import click
+from mtb.mtb import main
+from mtb.commands.manifest import COMMANDS
+for entry in COMMANDS.values():
+    try:
+        importlib.import_module(entry["module"])
+    except Exception:
+        pass
+print(json.dumps({"seconds": time.perf_counter() - t0, "modules": len(sys.modules)}))
+"""
+
+def run_snippet(snippet):
+    """Run a snippet in a fresh interpreter; return (wall seconds, import seconds, module count)."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", snippet], cwd=REPO_ROOT,
+                          capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return wall, result["seconds"], result["modules"]
+
+def measure(snippet, runs):
+    samples = [run_snippet(snippet) for _ in range(runs)]
+    return (statistics.median(s[0] for s in samples),
+            statistics.median(s[1] for s in samples),
+            samples[-1][2])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command (median is reported).")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from mtb.commands.manifest import COMMANDS
+
+    print(f"{'command':<20} {'wall ms':>9} {'import ms':>10} {'modules':>8}")
+    wall, imp, mods = measure(EAGER_SNIPPET, args.runs)
+    print(f"{'(eager, all)':<20} {wall * 1000:>9.1f} {imp * 1000:>10.1f} {mods:>8}")
+    for name in sorted(COMMANDS):
+        try:
+            wall, imp, mods = measure(LAZY_SNIPPET.format(name=name), args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<20} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{name:<20} {wall * 1000:>9.1f} {imp * 1000:>10.1f} {mods:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+End-to-end latency benchmark for the file-watcher pipeline.
+
+Starts a watchdog observer on a spool directory with the file-watcher pipeline moving
+every file to an outbox, then drops a burst of files into the spool (each written in
+several chunks, so every file raises a burst of modify events). Reports how long the
+observer callbacks took, the time until the last file was moved and the latency
+percentiles from the first event of a file to its move, and asserts that every file
+was handled (no event lost). Slow writers, files appended to for several quiet periods,
+must only be moved once complete. Finally measures the cost of one timer-wheel tick
+with few and with many pending files.
+
+Usage: python benchmarks/watcher_latency.py [--files 20000] [--quiet 0.2] [--workers 4] [--slow-writers 20]
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from watchdog.observers import Observer
+from mtb.utils import logger
+from mtb.utils.watch_pipeline import FileAction, FileFilter, PendingFile, TimerWheel, WatchPipeline
+
+class TimedHandler:
+    """Wraps the pipeline handler to measure the time spent in observer callbacks."""
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+
+    def dispatch(self, event):
+        start = time.perf_counter()
+        self.handler.dispatch(event)
+        elapsed = time.perf_counter() - start
+        self.calls += 1
+        self.seconds += elapsed
+        self.slowest = max(self.slowest, elapsed)
+
+def slow_writers(spool, count, quiet, rounds=6):
+    """Append to `count` files every quiet/2 seconds; returns their final sizes."""
+    files = [open(os.path.join(spool, f"slow-{i:04d}.dat"), "wb", buffering=0) for i in range(count)]
+    for _ in range(rounds):
+        for f in files:
+            f.write(b"y" * 1024)
+        time.sleep(quiet / 2)
+    for f in files:
+        f.close()
+    return {os.path.basename(f.name): rounds * 1024 for f in files}
+
+def wheel_tick_cost(pending, ticks=2000):
+    """Mean seconds per tick of a wheel holding `pending` timers due in one to two hours (later turns)."""
+    wheel = TimerWheel(tick=0.05, slots=1024, now=0.0)
+    st = os.stat(__file__)
+    for i in range(pending):
+        wheel.schedule(PendingFile(f"f{i}", 0.0, st), 3600 + i % 3600, 0.0)
+    start = time.perf_counter()
+    for i in range(1, ticks + 1):
+        wheel.advance(i * 0.05)
+    return (time.perf_counter() - start) / ticks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20000, help="Number of files in the burst.")
+    parser.add_argument("--writes", type=int, default=4, help="Writes per file (modify events).")
+    parser.add_argument("--quiet", type=float, default=0.2, help="Quiet period before a file counts as complete.")
+    parser.add_argument("--workers", type=int, default=4, help="Action worker threads.")
+    parser.add_argument("--slow-writers", type=int, default=20, help="Files written slowly during the burst.")
+    parser.add_argument("--timeout", type=float, default=300, help="Give up after this many seconds.")
+    args = parser.parse_args()
+
+    # Per-file log lines are not what is measured here.
+    logger.get_logger().setLevel(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="mtb-watch-")
+    spool = os.path.join(workdir, "spool")
+    outbox = os.path.join(workdir, "outbox")
+    os.makedirs(spool)
+    os.makedirs(outbox)
+    pipeline = WatchPipeline(FileFilter(), FileAction(move_to=outbox),
+                             quiet=args.quiet, workers=args.workers)
+    timed = TimedHandler(pipeline.handler)
+    expected = {}
+    observer = Observer()
+    observer.schedule(timed, path=spool, recursive=False)
+    pipeline.start()
+    observer.start()
+    try:
+        chunk = b"x" * 256
+        start = time.perf_counter()
+        for i in range(args.files):
+            with open(os.path.join(spool, f"msg-{i:08d}.dat"), "wb", buffering=0) as f:
+                for _ in range(args.writes):
+                    f.write(chunk)
+        written = time.perf_counter() - start
+        expected = slow_writers(spool, args.slow_writers, args.quiet)
+        expected_total = args.files + args.slow_writers
+        deadline = time.monotonic() + args.timeout
+        while pipeline.stats.processed < expected_total and time.monotonic() < deadline:
+            time.sleep(0.05)
+        total = time.perf_counter() - start
+    finally:
+        observer.stop()
+        observer.join()
+        pipeline.stop()
+        moved = len(os.listdir(outbox))
+        truncated = [name for name, size in expected.items()
+                     if os.path.getsize(os.path.join(outbox, name)) != size]
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = pipeline.stats.as_dict()
+    print(f"files {args.files}  written in {written:.2f}s  all handled after {total:.2f}s")
+    print(f"events {stats['events']}  released {stats['released']}  moved {moved}  errors {stats['errors']}")
+    print(f"observer callbacks {timed.calls}  mean {timed.seconds / max(1, timed.calls) * 1e6:.1f}us  "
+          f"slowest {timed.slowest * 1e3:.2f}ms")
+    print(f"latency first event -> moved: p50 {stats.get('latency_p50')}s  "
+          f"p95 {stats.get('latency_p95')}s  max {stats.get('latency_max')}s")
+    print(f"slow writers {args.slow_writers}  moved before complete {len(truncated)}")
+    for pending in (100, 100000):
+        print(f"timer wheel tick with {pending:6d} pending files: {wheel_tick_cost(pending) * 1e6:.1f}us")
+    assert moved == expected_total, f"only {moved} of {expected_total} files were handled"
+    assert not truncated, f"moved before they were complete: {truncated}"
+
+if __name__ == "__main__":
+    main()
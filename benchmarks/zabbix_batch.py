@@ -0,0 +1,48 @@
+"""
+Zabbix sender benchmark: per-metric send_metric() versus MetricBatch for N items,
+against the local fake trapper (benchmarks/fake_trapper.py).
+
+Usage: python benchmarks/zabbix_batch.py [--items N] [--chunk-size N]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_trapper import FakeTrapper
+from mtb.utils import logger, zabbix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=zabbix.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    logger.get_logger().setLevel(logging.WARNING)
+
+    with FakeTrapper() as trapper:
+        settings = zabbix.get_zabbix_settings()
+        zabbix.get_zabbix_settings = lambda: dict(settings, server="127.0.0.1", port=trapper.port)
+
+        start = time.perf_counter()
+        for i in range(args.items):
+            zabbix.send_metric(f"queue.bench.q{i}.messages", i)
+        single = time.perf_counter() - start
+        single_conns = trapper.connections
+        print(f"send_metric  {args.items} items: {single:7.3f}s  {args.items / single:>9.0f} items/s  "
+              f"{single_conns} connections")
+
+        start = time.perf_counter()
+        with zabbix.MetricBatch(chunk_size=args.chunk_size) as batch:
+            for i in range(args.items):
+                batch.add(f"queue.bench.q{i}.messages", i)
+        batched = time.perf_counter() - start
+        ok = sum(1 for r in batch.results if r.ok)
+        print(f"MetricBatch  {args.items} items: {batched:7.3f}s  {args.items / batched:>9.0f} items/s  "
+              f"{trapper.connections - single_conns} connections, {ok} ok")
+        print(f"speedup: {single / batched:.1f}x")
+
+if __name__ == "__main__":
+    main()
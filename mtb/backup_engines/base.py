@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from mtb.backup_engines.chunk_store import ChunkStore
+from mtb.backup_engines.manifest import ManifestChain, hash_file
+from mtb.utils import logger
+
+log = logger.get_logger()
+
+class BackupStats:
+    """Thread-safe counters for one backup run, reported in the command footer."""
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.unchanged = 0
+        self.hashed = 0
+        self.bytes_hashed = 0
+        self.chunks = 0
+        self.new_chunks = 0
+        self.deduplicated = 0
+        self.deleted = 0
+        self.errors = 0
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record_file(self, size):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def record_unchanged(self):
+        with self._lock:
+            self.unchanged += 1
+
+    def record_hashed(self, size):
+        with self._lock:
+            self.hashed += 1
+            self.bytes_hashed += size
+
+    def record_chunks(self, chunks, new_chunks):
+        with self._lock:
+            self.chunks += chunks
+            self.new_chunks += new_chunks
+
+    def record_deduplicated(self):
+        with self._lock:
+            self.deduplicated += 1
+
+    def record_deleted(self):
+        with self._lock:
+            self.deleted += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def as_dict(self):
+        seconds = time.monotonic() - self.start
+        return {
+            "files_sent": self.files,
+            "bytes_sent": self.bytes,
+            "files_unchanged": self.unchanged,
+            "files_hashed": self.hashed,
+            "bytes_hashed": self.bytes_hashed,
+            "chunks": self.chunks,
+            "new_chunks": self.new_chunks,
+            "files_deduplicated": self.deduplicated,
+            "files_deleted": self.deleted,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "mb_per_second": round(self.bytes_hashed / 1024 / 1024 / seconds, 2) if seconds > 0 else 0.0,
+            # Bytes of changed files per byte actually stored.
+            "dedup_ratio": round(self.bytes_hashed / self.bytes, 2) if self.bytes else None,
+        }
+
+def select_files(filepath, min_age=0, max_age=float("inf"), recursive=False, now=None):
+    """
+    Yield (path, stat) for the regular files under filepath (or filepath itself, if it
+    is a file) whose age in seconds is within [min_age, max_age]. Subdirectories are
+    walked only if recursive. Uses os.scandir, so no list of paths is built.
+    """
+    now = time.time() if now is None else now
+    if not os.path.isdir(filepath):
+        st = os.stat(filepath)
+        if min_age <= now - st.st_mtime <= max_age:
+            yield filepath, st
+        return
+    stack = [filepath]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            log.error(f"Error scanning {directory}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    st = entry.stat()
+                except OSError as e:
+                    log.error(f"Error reading {entry.path}: {e}")
+                    continue
+                if min_age <= now - st.st_mtime <= max_age:
+                    yield entry.path, st
+
+def source_key(filepath):
+    """
+    Return the object-key form of a source path: its absolute path without the leading
+    separator and drive, with forward slashes ("/var/log/app" -> "var/log/app").
+    """
+    path = os.path.splitdrive(os.path.abspath(filepath))[1]
+    return path.replace(os.sep, "/").strip("/")
+
+class BackupEngine:
+    """
+    Base class of the backup engines (see registry.ENGINES).
+
+    An engine stores objects under string keys and implements the storage primitives
+    below, which backup() calls from several threads at once; backup() builds on them:
+    file contents go under "<prefix>/objects/..." and the manifests describing each run
+    under "<prefix>/manifests/<source>/...".
+    `settings` is the engine's section of backup_engines in config.yaml (besides the
+    engine's own keys: hash_workers, full_every, and chunking with the ChunkStore
+    settings); `throttle`
+    (mtb.utils.throttle.Throttle) rate-limits reads, and each object stored or looked
+    up counts as one operation (see op()).
+    """
+    name = None
+
+    def __init__(self, settings=None, throttle=None):
+        self.settings = settings or {}
+        self.throttle = throttle
+        self.prefix = str(self.settings.get("prefix", "")).strip("/")
+        self.chunk_store = None
+
+    def op(self):
+        """Account for one storage operation (an object written or looked up) on the throttle."""
+        if self.throttle is not None:
+            self.throttle.op()
+
+    # Storage primitives.
+
+    def put_file(self, src_path, key):
+        """Store the content of src_path under key. Returns the number of bytes sent."""
+        raise NotImplementedError
+
+    def put_bytes(self, data, key):
+        """Store data under key."""
+        raise NotImplementedError
+
+    def get_bytes(self, key):
+        """Return the content stored under key (KeyError if missing)."""
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def list_keys(self, prefix=""):
+        """Yield the keys starting with prefix."""
+        raise NotImplementedError
+
+    def location(self):
+        """Where the objects are (directory, endpoint and bucket...), to tell stores apart."""
+        raise NotImplementedError
+
+    # Backup.
+
+    def key_for(self, *parts):
+        return "/".join(part.strip("/") for part in (self.prefix,) + parts if part and part.strip("/"))
+
+    def content_key(self, digest):
+        """Key of the object holding the content with the given SHA-256 hex digest."""
+        return self.key_for("objects", digest[:2], digest)
+
+    def recipe_key(self, digest):
+        """Key of the chunk recipe of the content with the given SHA-256 hex digest."""
+        return self.key_for("recipes", digest[:2], digest)
+
+    def content_location(self, entry):
+        """Key holding the content of a manifest entry: its object, or its recipe if chunked."""
+        if entry.get("chunked"):
+            return self.recipe_key(entry["hash"])
+        return self.content_key(entry["hash"])
+
+    def backup(self, filepath, min_age=0, max_age=float("inf"), recursive=False, stats=None, full=False):
+        """
+        Incremental backup of filepath, driven by its chain of manifests (see
+        manifest.ManifestChain). Returns the run's BackupStats.
+
+        Files whose size and mtime_ns match the latest manifest are not even read. The
+        others are hashed (SHA-256) and sent on a pool of hash_workers threads, with
+        at most four files per thread in flight; a file is sent only if no object holds its content yet, under content_key(hash), so renamed
+        or copied files and touched-but-identical files cost no transfer. Files gone
+        from the source get a tombstone. The run then stores a manifest of the changes,
+        or of every file when there is no previous manifest, when full=True (which also
+        ignores the previous state and rehashes everything) or when full_every
+        incrementals have accumulated since the last full manifest.
+
+        With the engine setting chunking: true, contents go through a ChunkStore
+        instead of whole objects: only the content-defined chunks not stored yet are
+        written, and the file is recorded as a recipe of chunks.
+
+        A file that cannot be read or sent is logged, counted as an error and left out
+        of the manifest (a previous version of it stays current); the run goes on.
+        """
+        stats = stats or BackupStats()
+        if self.settings.get("chunking") and self.chunk_store is None:
+            self.chunk_store = ChunkStore(self)
+        chain = ManifestChain(self, source_key(filepath))
+        previous, incrementals = ({}, 0) if full else chain.view()
+        write_full = full or not previous or incrementals + 1 >= int(self.settings.get("full_every", 30))
+        workers = int(self.settings.get("hash_workers", os.cpu_count() or 4))
+        root_is_dir = os.path.isdir(filepath)
+        current = {}
+        changes = []
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                relative = pending.pop(future)
+                entry = future.result()
+                if entry is not None:
+                    current[relative] = entry
+                    changes.append(entry)
+                elif relative in previous:
+                    current[relative] = previous[relative]
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mtb-backup") as pool:
+            for path, st in select_files(filepath, min_age, max_age, recursive):
+                relative = os.path.relpath(path, filepath).replace(os.sep, "/") if root_is_dir else os.path.basename(path)
+                known = previous.get(relative)
+                if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                    current[relative] = known
+                    stats.record_unchanged()
+                    continue
+                if len(pending) >= workers * 4:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                pending[pool.submit(self._backup_file, path, relative, st, known, stats)] = relative
+            collect(wait(pending).done)
+
+        for relative, entry in previous.items():
+            if relative in current:
+                continue
+            if os.path.exists(os.path.join(filepath, relative) if root_is_dir else filepath):
+                # Still there, only left out by the age filters.
+                current[relative] = entry
+            else:
+                changes.append({"path": relative, "deleted": True})
+                stats.record_deleted()
+                log.info(f"Recorded deletion of {relative} from {filepath}")
+
+        if self.chunk_store is not None:
+            self.chunk_store.index.commit()
+        if write_full or changes:
+            entries = sorted(current.values(), key=lambda e: e["path"]) if write_full else changes
+            key = chain.write(entries, write_full)
+            log.info(f"Stored {'full' if write_full else 'incremental'} manifest {self.name}:{key} "
+                     f"({len(entries)} entries)")
+        return stats
+
+    def _backup_file(self, path, relative, st, known, stats):
+        """
+        Hash a file and send it unless its content is already stored; return its manifest
+        entry. Runs on the backup's worker threads.
+        """
+        try:
+            digest = hash_file(path, self.throttle)
+            stats.record_hashed(st.st_size)
+            entry = {"path": relative, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+            if self.chunk_store is not None:
+                entry["chunked"] = True
+            if known and known.get("hash") == digest and known.get("chunked") == entry.get("chunked"):
+                return entry
+            key = self.content_location(entry)
+            if self.exists(key):
+                stats.record_deduplicated()
+                return entry
+            if self.chunk_store is not None:
+                chunks, new_chunks, sent = self.chunk_store.store_file(path, digest, self.throttle)
+                stats.record_chunks(chunks, new_chunks)
+            else:
+                sent = self.put_file(path, key)
+        except Exception as e:
+            log.error(f"Error backing up {path} to {self.name}: {e}")
+            stats.record_error()
+            return None
+        log.info(f"Backed up {path} to {self.name}:{key} ({sent} bytes)")
+        stats.record_file(sent)
+        return entry
@@ -0,0 +1 @@
+# This file makes the backup_engines folder a package.
@@ -0,0 +1,83 @@
+import os
+from mtb.backup_engines.base import BackupEngine
+from mtb.utils.transfer import TransferEngine, fsync_directory
+
+class LocalEngine(BackupEngine):
+    """
+    Stores objects as files under a local (or mounted) directory, settings:
+      destination: root directory of the backup store (required)
+      prefix: key prefix (optional)
+      fsync: none (default), file or full, see mtb.utils.transfer.TransferEngine
+    Files are copied by a TransferEngine (copy_file_range/sendfile where possible) under
+    a temporary name and renamed into place, so a partial copy never shows up under its
+    final name; the source mtime is kept.
+    """
+    name = "local"
+
+    def __init__(self, settings=None, throttle=None):
+        super().__init__(settings, throttle)
+        if not self.settings.get("destination"):
+            raise ValueError("The local backup engine needs a destination directory")
+        self.destination = os.path.expanduser(self.settings["destination"])
+        # Files are sent from the backup's hash_workers threads, which bound the concurrency.
+        self.transfer = TransferEngine(self.settings.get("fsync", "none"), concurrency=64, throttle=throttle)
+
+    def path_for(self, key):
+        return os.path.join(self.destination, *key.split("/"))
+
+    def _write(self, key, write):
+        self.op()
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = self.transfer._temp_path(path)
+        try:
+            with open(tmp, "wb") as f_out:
+                write(f_out)
+                if self.transfer.fsync != "none":
+                    f_out.flush()
+                    os.fsync(f_out.fileno())
+            os.replace(tmp, path)
+            if self.transfer.fsync == "full":
+                fsync_directory(os.path.dirname(path))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return path
+
+    def put_file(self, src_path, key):
+        self.op()
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return self.transfer.copy(src_path, path).bytes
+
+    def put_bytes(self, data, key):
+        self._write(key, lambda f_out: f_out.write(data))
+
+    def get_bytes(self, key):
+        try:
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def exists(self, key):
+        self.op()
+        return os.path.isfile(self.path_for(key))
+
+    def location(self):
+        return os.path.abspath(self.destination)
+
+    def list_keys(self, prefix=""):
+        top = self.path_for(prefix.rstrip("/")) if prefix else self.destination
+        # A prefix may end in the middle of a name: walk its directory and filter.
+        start = top if os.path.isdir(top) else os.path.dirname(top)
+        for directory, _, files in os.walk(start):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), self.destination).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    yield key
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import mmap
+import os
+from datetime import datetime, timezone
+
+HASH_BLOCK = 8 * 1024 * 1024
+MANIFEST_SUFFIX = ".jsonl.gz"
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S.%fZ"
+
+def hash_file(path, throttle=None):
+    """
+    Return the SHA-256 hex digest of a file. The file is mapped into memory and hashed
+    in HASH_BLOCK slices (hashlib releases the GIL on large buffers, so several files
+    hash in parallel on a thread pool); files that cannot be mapped are read in
+    HASH_BLOCK buffers instead.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        try:
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        except (OSError, ValueError):
+            view = None
+        if view is not None:
+            with view, memoryview(view) as data:
+                for offset in range(0, size, HASH_BLOCK):
+                    if throttle is not None:
+                        throttle.read(min(HASH_BLOCK, size - offset))
+                    digest.update(data[offset:offset + HASH_BLOCK])
+        else:
+            while True:
+                block = f.read(HASH_BLOCK)
+                if not block:
+                    break
+                if throttle is not None:
+                    throttle.read(len(block))
+                digest.update(block)
+    return digest.hexdigest()
+
+def format_timestamp(when):
+    return when.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+def parse_timestamp(text):
+    return datetime.strptime(text, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+class ManifestChain:
+    """
+    The chain of manifests of one source path in a backup engine, stored as gzipped
+    JSON lines under "<prefix>/manifests/<source>/<UTC timestamp>.jsonl.gz".
+
+    The first line of a manifest is a header ({"type": "full"|"incremental",
+    "created": ...}); each following line is an entry for a path relative to the
+    source: {"path", "size", "mtime_ns", "hash"} for a new or changed file, or
+    {"path", "deleted": true} (a tombstone) for a file that disappeared. A full
+    manifest lists every file; an incremental one only the changes since the previous
+    manifest. The view at any time is the latest full manifest before it with the later
+    incrementals applied in order.
+    """
+    def __init__(self, engine, source_key):
+        self.engine = engine
+        self.source_key = source_key
+        self.prefix = engine.key_for("manifests", source_key) + "/"
+
+    def manifests(self, at=None):
+        """Return the manifest keys, oldest first, created at or before `at` (a datetime) if given."""
+        keys = sorted(key for key in self.engine.list_keys(self.prefix) if key.endswith(MANIFEST_SUFFIX))
+        if at is not None:
+            keys = [key for key in keys if parse_timestamp(self.created(key)) <= at]
+        return keys
+
+    def created(self, key):
+        return key[len(self.prefix):-len(MANIFEST_SUFFIX)]
+
+    def read(self, key):
+        """Return (header, entries) of one manifest."""
+        lines = gzip.decompress(self.engine.get_bytes(key)).decode("utf-8").splitlines()
+        return json.loads(lines[0]), [json.loads(line) for line in lines[1:] if line]
+
+    def view(self, at=None):
+        """
+        Return ({path: entry}, number of incrementals since the last full manifest) as of
+        `at` (default: the latest manifest). Manifests are read newest first, back to the
+        latest full one, then applied oldest first.
+        """
+        chain = []
+        for key in reversed(self.manifests(at)):
+            header, entries = self.read(key)
+            chain.append(entries)
+            if header.get("type") == "full":
+                break
+        state = {}
+        for entries in reversed(chain):
+            for entry in entries:
+                if entry.get("deleted"):
+                    state.pop(entry["path"], None)
+                else:
+                    state[entry["path"]] = entry
+        return state, max(0, len(chain) - 1)
+
+    def write(self, entries, full, when=None):
+        """Store a new manifest with the given entries; returns its key."""
+        when = when or datetime.now(timezone.utc)
+        header = {"type": "full" if full else "incremental", "created": when.isoformat(),
+                  "source": self.source_key}
+        lines = [json.dumps(header)] + [json.dumps(entry, sort_keys=True) for entry in entries]
+        key = f"{self.prefix}{format_timestamp(when)}{MANIFEST_SUFFIX}"
+        self.engine.put_bytes(gzip.compress(("\n".join(lines) + "\n").encode("utf-8")), key)
+        return key
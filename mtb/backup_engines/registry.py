@@ -0,0 +1,42 @@
+import importlib
+from mtb.backup_engines.chunk_store import chunker_settings
+from mtb.utils import config_parser
+
+# Engine name -> "module:class". Engines are imported only when used, so optional
+# dependencies (boto3 for the S3 engines) are needed only by the runs that use them.
+# None marks an engine name that is reserved but not implemented yet.
+ENGINES = {
+    "local": "mtb.backup_engines.local:LocalEngine",
+    "s3": "mtb.backup_engines.s3:S3Engine",
+    "scalitys3": "mtb.backup_engines.s3:S3Engine",
+    "tsm": None,
+    "veeam": None,
+    "rubrik": None,
+}
+
+def get_engine_settings(name):
+    """Return the backup_engines.<name> section of config.yaml (empty if missing)."""
+    config = config_parser.load_config("config.yaml") or {}
+    return (config.get("backup_engines") or {}).get(name) or {}
+
+def get_engine(name, settings=None, throttle=None):
+    """
+    Return an instance of the backup engine registered under name, configured with
+    settings (default: its section of config.yaml).
+    Raises ValueError for unknown names, invalid settings (including the chunk sizes of
+    an engine with chunking) and NotImplementedError for reserved ones.
+    """
+    name = name.lower()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown backup engine: {name} (available: {', '.join(sorted(ENGINES))})")
+    target = ENGINES[name]
+    if target is None:
+        raise NotImplementedError(f"Backup engine {name} is not implemented yet")
+    module_name, class_name = target.split(":")
+    engine_class = getattr(importlib.import_module(module_name), class_name)
+    settings = get_engine_settings(name) if settings is None else settings
+    if settings.get("chunking"):
+        chunker_settings(settings)
+    engine = engine_class(settings, throttle)
+    engine.name = name
+    return engine
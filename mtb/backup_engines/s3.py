@@ -0,0 +1,101 @@
+import os
+from mtb.backup_engines.base import BackupEngine
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+MB = 1024 * 1024
+
+class S3Engine(BackupEngine):
+    """
+    Stores objects in an S3-compatible bucket (AWS, Scality, MinIO...) through boto3,
+    settings:
+      bucket: bucket name (required)
+      prefix: key prefix (optional)
+      endpoint_url: for S3-compatible stores (optional)
+      region_name, aws_access_key_id, aws_secret_access_key: (optional, else the
+        usual boto3 environment/profile lookup)
+      part_size: multipart part size in MB (optional, default 64)
+      max_concurrency: parts uploaded in parallel per file (optional, default 8)
+
+    Files larger than one part are sent as multipart uploads whose parts are read from
+    disk and uploaded by max_concurrency threads, so at most about
+    part_size * max_concurrency bytes of a file are in memory at once. The source
+    mtime is kept in the object metadata ("mtime"). Any S3-compatible endpoint works,
+    including a local stand-in such as MinIO or moto_server for testing.
+    Requires boto3 (optional dependency).
+    """
+    name = "s3"
+
+    def __init__(self, settings=None, throttle=None):
+        super().__init__(settings, throttle)
+        if boto3 is None:
+            raise ImportError("boto3 is not installed: it is required by the S3 backup engines.")
+        if not self.settings.get("bucket"):
+            raise ValueError("The S3 backup engine needs a bucket")
+        self.bucket = self.settings["bucket"]
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=self.settings.get("endpoint_url"),
+            region_name=self.settings.get("region_name"),
+            aws_access_key_id=self.settings.get("aws_access_key_id"),
+            aws_secret_access_key=self.settings.get("aws_secret_access_key"),
+        )
+        part_size = int(self.settings.get("part_size", 64)) * MB
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=int(self.settings.get("max_concurrency", 8)),
+            use_threads=True,
+        )
+
+    def _progress(self, sent):
+        # Called by the upload threads after each block: waiting here throttles them.
+        if self.throttle is not None:
+            self.throttle.read(sent)
+
+    def put_file(self, src_path, key):
+        self.op()
+        st = os.stat(src_path)
+        self.client.upload_file(
+            src_path, self.bucket, key,
+            ExtraArgs={"Metadata": {"mtime": str(st.st_mtime)}},
+            Config=self.transfer_config,
+            Callback=self._progress,
+        )
+        return st.st_size
+
+    def put_bytes(self, data, key):
+        self.op()
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def get_bytes(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise KeyError(key)
+            raise
+
+    def exists(self, key):
+        self.op()
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound"):
+                return False
+            raise
+
+    def location(self):
+        return f"{self.settings.get('endpoint_url') or 's3'}/{self.bucket}"
+
+    def list_keys(self, prefix=""):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"]
@@ -1,6 +1,7 @@
 import click
-from mtb.utils import logger
-from mtb.utils.decorators import log_header_footer
+from mtb.backup_engines.registry import ENGINES, get_engine
+from mtb.utils import logger, throttle
+from mtb.utils.decorators import log_header_footer, add_footer_fields
 
 log = logger.get_logger()
 
@@ -9,17 +10,40 @@ log = logger.get_logger()
 @click.option('--min-age', default=0, type=int, help="Minimum age of files in seconds.")
 @click.option('--max-age', default=float('inf'), type=float, help="Maximum age of files in seconds.")
 @click.option('--recursive', is_flag=True, help="Backup files recursively.")
-@click.option('--engine', default="tsm", help="Backup engine to use (e.g., tsm, scalitys3, veeam, rubrik).")
+@click.option('--engine', default="local", type=click.Choice(sorted(ENGINES)),
+              help="Backup engine to use, configured under backup_engines in config.yaml.")
+@click.option('--bytes-per-second', default=None, help="Cap the read rate, e.g. 20M.")
+@click.option('--ops-per-second', default=None, help="Cap objects stored or looked up per second.")
+@click.option('--idle-io', is_flag=True, help="Use the idle I/O scheduling class (Linux).")
+@click.option('--adaptive-io', is_flag=True, help="Back off while the disk is busy.")
+@click.option('--full', is_flag=True, help="Rehash every file and store a full manifest.")
 @log_header_footer
-def backup_cmd(filepath, min_age, max_age, recursive, engine):
+def backup_cmd(filepath, min_age, max_age, recursive, engine, bytes_per_second, ops_per_second, idle_io, adaptive_io, full):
     """
-    Backup command to archive files using a modular engine system.
+    Backup command to archive files using a modular engine system (see mtb.backup_engines).
+    Files under --filepath whose age in seconds is between --min-age and --max-age are
+    sent to the engine; subdirectories only with --recursive. Backups are incremental:
+    only new or changed files are sent, as recorded by the manifests of the source
+    (see BackupEngine.backup); --full rehashes everything. List what a backup holds
+    with `mtb restore-list`.
+    The I/O options build a Throttle (see mtb.utils.throttle) shared by the engine's reads
+    and its storage operations (objects stored or looked up).
+    Run statistics are added to the footer; the exit code is 1 if any file failed.
     """
     log.info(f"Starting backup for {filepath} using engine {engine}")
+    io_throttle = throttle.from_config({
+        "bytes_per_second": bytes_per_second,
+        "ops_per_second": ops_per_second,
+        "idle": idle_io,
+        "adaptive": adaptive_io,
+    }) if (bytes_per_second or ops_per_second or idle_io or adaptive_io) else None
     
-    # Pseudo-code: call the appropriate backup engine module
-    # from mtb.backup_engines import get_engine
-    # engine_instance = get_engine(engine)
-    # engine_instance.backup(filepath, min_age, max_age, recursive)
-    
-    log.info("Backup completed.")
+    try:
+        engine_instance = get_engine(engine, throttle=io_throttle)
+    except (ValueError, NotImplementedError, ImportError) as e:
+        log.error(f"Cannot use backup engine {engine}: {e}")
+        return 1
+    stats = engine_instance.backup(filepath, min_age, max_age, recursive, full=full)
+    add_footer_fields(backup_stats=stats.as_dict())
+    log.info(f"Backup completed: {stats.as_dict()}")
+    return 1 if stats.errors else 0
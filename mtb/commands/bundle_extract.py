@@ -0,0 +1,41 @@
+import click
+import os
+from mtb.utils import logger
+from mtb.utils.archive_bundle import read_index, extract_member
+from mtb.utils.decorators import log_header_footer
+
+log = logger.get_logger()
+
+@click.command(name="bundle-extract", help="List or extract single files from a purge bundle using its index.")
+@click.argument('bundle', type=click.Path(exists=True, dir_okay=False))
+@click.argument('names', nargs=-1)
+@click.option('-d', '--dest', default=".", type=click.Path(file_okay=False), help="Directory to extract to.")
+@log_header_footer
+def bundle_extract(bundle, names, dest):
+    """
+    Without NAMES, list the files of a bundle written by purge (bundle: day|hour).
+    With NAMES, extract those files only: each one is decompressed from its own gzip
+    member found through the .idx sidecar, without reading the rest of the bundle.
+    """
+    try:
+        index = read_index(bundle)
+    except OSError as e:
+        click.echo(f"Cannot read the index of {bundle}: {e}", err=True)
+        return 1
+    if not names:
+        for entry in index:
+            click.echo(f"{entry['name']}\t{entry['size']}")
+        return
+
+    os.makedirs(dest, exist_ok=True)
+    exit_code = 0
+    for name in names:
+        try:
+            path = extract_member(bundle, name, dest)
+            click.echo(f"Extracted {path}")
+            log.info(f"Extracted {name} from {bundle} to {path}")
+        except Exception as e:
+            click.echo(f"Error extracting {name} from {bundle}: {e}", err=True)
+            log.error(f"Error extracting {name} from {bundle}: {e}")
+            exit_code = 1
+    return exit_code
@@ -1,7 +1,7 @@
 import click
 import psutil
 from mtb.utils.decorators import log_header_footer
-from mtb.utils.zabbix import send_metric
+from mtb.utils.zabbix import MetricBatch
 from mtb.utils import logger
 
 @click.command(name="disk-monitor", help="Monitor disk usage and send metrics to Zabbix.")
@@ -12,6 +12,7 @@ def disk_monitor(partition):
     Monitor disk usage on the system.
     If --partition is provided, only that mount point is checked; otherwise, all partitions are monitored.
     For each partition, the metric key is formatted as: disk.usage[<mountpoint>]
+    All values are sent to Zabbix in a single batch.
     """
     log = logger.get_logger()
     results = {}
@@ -20,16 +21,24 @@ def disk_monitor(partition):
     else:
         parts = psutil.disk_partitions()
     
-    for p in parts:
-        try:
-            usage = psutil.disk_usage(p.mountpoint)
-            usage_percent = usage.percent
-            key = f"disk.usage[{p.mountpoint}]"
-            results[key] = usage_percent
-            send_metric(key, usage_percent)
-            log.info(f"Sent metric {key} = {usage_percent}")
-        except Exception as e:
-            log.error(f"Error monitoring partition {p.mountpoint}: {e}")
+    with MetricBatch() as batch:
+        for p in parts:
+            try:
+                usage = psutil.disk_usage(p.mountpoint)
+                usage_percent = usage.percent
+                key = f"disk.usage[{p.mountpoint}]"
+                results[key] = usage_percent
+                batch.add(key, usage_percent)
+            except Exception as e:
+                log.error(f"Error monitoring partition {p.mountpoint}: {e}")
+
+    for result in batch.results:
+        if result.ok:
+            log.info(f"Sent metric {result.key} = {result.value}")
+        elif result.spooled:
+            log.warning(f"Zabbix unreachable, spooled metric {result.key} = {result.value}")
+        else:
+            log.error(f"Failed to send metric {result.key} = {result.value}: {result.response}")
     
     for k, v in results.items():
         click.echo(f"{k}: {v}")
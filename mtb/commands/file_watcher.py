@@ -1,24 +1,14 @@
 import click
 import time
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 from mtb.utils import logger
-from mtb.utils.decorators import log_header_footer
+from mtb.utils.decorators import log_header_footer, add_footer_fields
 from mtb.utils.time_utils import parse_interval
+from mtb.utils.transfer import FSYNC_POLICIES, TransferEngine
+from mtb.utils.watch_pipeline import FileAction, FileFilter, WatchPipeline
 
 log = logger.get_logger()
 
-class WatcherHandler(FileSystemEventHandler):
-    def __init__(self, min_size, max_size):
-        self.min_size = min_size
-        self.max_size = max_size
-
-    def on_created(self, event):
-        log.info(f"File created: {event.src_path}")
-
-    def on_deleted(self, event):
-        log.info(f"File deleted: {event.src_path}")
-
 @click.command(name="file-watcher", help="Watch a directory for file creation/deletion events with various filters.")
 @click.option('-d', '--directory', default='.', help="Directory to watch.")
 @click.option('-s', '--min-size', default=0, type=int, help="Minimum file size in bytes.")
@@ -31,23 +21,40 @@ class WatcherHandler(FileSystemEventHandler):
 @click.option('-c', '--copy-to', default=None, help="Path to copy the file(s).")
 @click.option('-e', '--remove-extension', is_flag=True, help="Remove the last extension of the file(s).")
 @click.option('-l', '--limit', default="1h", help="Limit to watch for the file (e.g., 1d or 3h30m45s).")
+@click.option('-q', '--quiet-period', default=1.0, type=float, show_default=True,
+              help="Seconds a file must go without events or size/mtime changes to count as complete.")
+@click.option('-w', '--workers', default=4, type=int, show_default=True, help="Threads applying the actions.")
+@click.option('--transfers', default=4, type=int, show_default=True, help="Copies/moves running at once.")
+@click.option('--fsync', type=click.Choice(FSYNC_POLICIES), default="file", show_default=True,
+              help="Sync copied data before renaming it into place (file), and the directory after (full).")
 @log_header_footer
 def file_watcher_cmd(directory, min_size, max_size, min_files, max_files, min_age, max_age,
-                     move_to, copy_to, remove_extension, limit):
+                     move_to, copy_to, remove_extension, limit, quiet_period, workers, transfers, fsync):
     """
-    Watch a directory and log events when files are created or deleted.
+    Watch a directory and handle the files created in it: once a file is complete (no
+    events and the same size and mtime for --quiet-period seconds) and passes the size
+    and age filters, it is copied and/or moved
+    (see mtb.utils.watch_pipeline.WatchPipeline).
     """
-    limit_seconds = parse_interval({limit})
-    event_handler = WatcherHandler(min_size, max_size)
+    limit_seconds = parse_interval(limit)
+    pipeline = WatchPipeline(
+        FileFilter(min_size, max_size, min_age, max_age),
+        FileAction(move_to, copy_to, remove_extension, TransferEngine(fsync, transfers)),
+        quiet=quiet_period, workers=workers, min_files=min_files, max_files=max_files)
+    pipeline.start()
     observer = Observer()
-    observer.schedule(event_handler, path=directory, recursive=False)
+    observer.schedule(pipeline.handler, path=directory, recursive=False)
     observer.start()
     log.info(f"Started file watcher on {directory} with limit {limit}")
 
     try:
         time.sleep(limit_seconds)
     except KeyboardInterrupt:
-        observer.stop()
+        pass
     observer.stop()
     observer.join()
+    pipeline.stop()
+    stats = pipeline.stats.as_dict()
+    add_footer_fields(file_watcher=stats, transfers=pipeline.action.transfer.stats.as_dict())
     log.info("File watcher stopped")
+    return 1 if stats["errors"] else 0
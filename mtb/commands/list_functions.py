@@ -6,14 +6,14 @@ from mtb.utils.decorators import log_header_footer
 def list_cmd():
     """
     Dynamically list all available functionalities.
-    This command inspects the available subcommands in the CLI and prints their help texts.
+    This command reads the command manifest and prints the help text of each command,
+    without importing the command modules themselves.
     """
-    from mtb.mtb.mtb import main
+    from mtb.commands.manifest import COMMANDS
 
     click.echo("Available functionalities:")
-    for command in main.commands:
-        cmd = main.commands[command]
-        click.echo(f"- {command}: {cmd.help}")
+    for command in sorted(COMMANDS):
+        click.echo(f"- {command}: {COMMANDS[command]['help']}")
 
     # Log the listing action
     from mtb.utils import logger
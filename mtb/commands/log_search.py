@@ -0,0 +1,92 @@
+import click
+import json
+import time
+from datetime import datetime
+from mtb.utils import config_parser, logger
+from mtb.utils.decorators import log_header_footer, add_footer_fields
+from mtb.utils.log_scanner import get_patterns
+from mtb.utils.log_search import search_logs
+from mtb.utils.time_utils import parse_interval
+
+log = logger.get_logger()
+
+def parse_time(value, now):
+    """A point in time given as an interval before now ("7d", "3h30m") or in ISO format (local time unless an offset is given)."""
+    try:
+        return now - parse_interval(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise click.BadParameter(f"Not an interval or an ISO time: {value}")
+
+@click.command(name="log-search", help="Count pattern matches per hour in log files and their rotated and compressed archives.")
+@click.option('-f', '--file', 'files', multiple=True, help="Log file of logs.yaml to search (repeatable); default: all of them.")
+@click.option('-p', '--pattern', 'patterns', multiple=True, help="Regex to search instead of the logs.yaml patterns (repeatable).")
+@click.option('--since', default="7d", show_default=True, help="Start of the range: interval before now (e.g., 7d) or ISO time.")
+@click.option('--until', default=None, help="End of the range: interval before now or ISO time; default: now.")
+@click.option('--workers', default=None, type=int, help="Search in N worker processes (default: one per CPU).")
+@click.option('--samples', default=5, show_default=True, type=int, help="Sample matching lines kept per pattern.")
+@click.option('--json', 'as_json', is_flag=True, help="Print the results as JSON.")
+@log_header_footer
+def log_search(files, patterns, since, until, workers, samples, as_json):
+    """
+    Search the log files of logs.yaml together with their rotated and compressed copies
+    (app.log.1, the .gz/.zip/.zst files written by purge) for their patterns, over a
+    time range, and print per-hour match counts and a few sample lines per pattern.
+
+    Archives are streamed through the decompressor, never extracted to disk, in a pool
+    of worker processes. An archive whose mtime window (from the previous archive's
+    mtime to its own) cannot overlap the range is not read. Lines are timed by their
+    own timestamp (ISO, access log or syslog format), else by the closest line above.
+    """
+    now = time.time()
+    start = parse_time(since, now)
+    end = parse_time(until, now) if until else now
+    if start >= end:
+        click.echo("--since must be before --until", err=True)
+        return 1
+
+    logs_config = config_parser.load_config("logs.yaml") or {}
+    targets = {}
+    for file_path in files or logs_config:
+        if file_path not in logs_config and not patterns:
+            log.error(f"{file_path} is not in logs.yaml and no --pattern was given")
+            continue
+        file_patterns = list(patterns) or get_patterns(logs_config.get(file_path))
+        if file_patterns:
+            targets[file_path] = file_patterns
+    if not targets:
+        click.echo("No log file with patterns to search", err=True)
+        return 1
+
+    started = time.monotonic()
+    results = search_logs(targets, start, end, workers=workers, samples=samples)
+    seconds = time.monotonic() - started
+    summary = {path: result.as_dict() for path, result in results.items()}
+    if as_json:
+        click.echo(json.dumps(summary, indent=4))
+    else:
+        for path, result in summary.items():
+            click.echo(f"{path}: {result['files']} files searched, {result['skipped']} skipped")
+            for pattern, found in result["patterns"].items():
+                click.echo(f"  {pattern}: {found['total']} matches")
+                for hour, count in found["hours"].items():
+                    click.echo(f"    {hour}  {count}")
+                for line in found["samples"]:
+                    click.echo(f"    > {line}")
+
+    total_bytes = sum(result.bytes for result in results.values())
+    add_footer_fields(log_search={
+        "files": sum(result.files for result in results.values()),
+        "skipped": sum(result.skipped for result in results.values()),
+        "errors": sum(result.errors for result in results.values()),
+        "bytes": total_bytes,
+        "seconds": round(seconds, 3),
+        "mb_per_second": round(total_bytes / (1024 * 1024) / seconds, 2) if seconds > 0 else 0.0,
+    })
+    return 1 if any(result.errors for result in results.values()) else 0
+
+if __name__ == '__main__':
+    log_search()
@@ -1,31 +1,43 @@
 import click
 import json
-from mtb.utils.decorators import log_header_footer
+import re
+from mtb.utils.decorators import log_header_footer, add_footer_fields
 from mtb.utils import config_parser, logger
+from mtb.utils.log_fields import add_field_metrics, field_aggregator
+from mtb.utils.log_scanner import LogScanner, add_metrics, get_patterns, open_store
+from mtb.utils.pattern_matcher import PatternMatcher
+from mtb.utils.zabbix import MetricBatch, delivered
 
 log = logger.get_logger()
 
 @click.command(name="logfile-monitor", help="Generate LLD JSON for log files defined in logs.yaml using native Zabbix keys for age and pattern.")
+@click.option('--scan', is_flag=True, help="Scan the new lines of each file and send match counts to Zabbix instead of printing LLD JSON.")
 @log_header_footer
-def logfile_monitor():
+def logfile_monitor(scan):
     """
     Reads configuration from logs.yaml, where each key is a log file path and its value may contain:
       - age: a threshold (e.g. "1h")
       - patterns: a list of regex patterns
+      - fields: JSON fields to aggregate with --scan (field name: stats or count)
 
     The script does not calculate the file age or search for patterns—it simply outputs a discovery JSON with macros:
       - {#FILE}: The log file path.
       - {#AGE_THRESHOLD}: The age threshold (if defined).
       - {#PATTERNS}: Semicolon-separated regex patterns (if defined).
+      - {#FIELDS}: Semicolon-separated JSON fields aggregated by --scan (if defined).
 
     You can then create native Zabbix items using keys such as:
       - vfs.file.time[{#FILE}] for file age.
       - log[{#FILE}, {#PATTERN}] for log monitoring.
+
+    With --scan, mtb reads the files itself instead (see scan_logs).
     """
     logs_config = config_parser.load_config("logs.yaml")
     if not logs_config:
         click.echo("No configuration found in logs.yaml", err=True)
         return 1
+    if scan:
+        return scan_logs(logs_config)
 
     discovery = {"data": []}
     for file_path, settings in logs_config.items():
@@ -38,9 +50,62 @@ def logfile_monitor():
                 patterns = [patterns]
             # Join multiple patterns into a single string separated by semicolon.
             entry["{#PATTERNS}"] = ";".join(patterns)
+        if isinstance(settings.get("fields"), dict):
+            entry["{#FIELDS}"] = ";".join(settings["fields"])
         discovery["data"].append(entry)
 
     click.echo(json.dumps(discovery, indent=4))
 
+def scan_logs(logs_config):
+    """
+    Scan what was appended to each file of logs.yaml since the previous scan (see
+    mtb.utils.log_scanner.LogScanner) and send log.bytes, log.age, log.matches and
+    log.last_match for each file and pattern, plus the aggregates of the file's JSON
+    "fields" over the new lines (see mtb.utils.log_fields), in one batch. The offset of
+    each file is saved once its own metrics were sent, spooled or rejected by the server
+    (sending them again would not help); if some could not be delivered, the same lines
+    of that file are scanned again next time. A file seen for the first time is read
+    from its end unless it has "from_start: true".
+    """
+    store = open_store()
+    scanner = LogScanner(store)
+    summary = {}
+    scanned = []
+    errors = 0
+    try:
+        with MetricBatch() as batch:
+            for file_path, settings in logs_config.items():
+                settings = settings or {}
+                try:
+                    patterns = PatternMatcher(get_patterns(settings))
+                    fields = field_aggregator(settings)
+                    result = scanner.scan(file_path, patterns, from_start=bool(settings.get("from_start")),
+                                          fields=fields)
+                except (OSError, ValueError, re.error) as e:
+                    log.error(f"Error scanning {file_path}: {e}")
+                    errors += 1
+                    continue
+                if result is None:
+                    log.warning(f"Log file {file_path} not found")
+                    continue
+                # Results come back in the order items were added: this file's are [first, ...).
+                first = len(batch.results) + len(batch)
+                add_metrics(batch, result, patterns)
+                if fields is not None:
+                    add_field_metrics(batch, file_path, fields)
+                summary[file_path] = result.as_dict(patterns)
+                scanned.append((result, first, len(batch.results) + len(batch)))
+        for result, first, end in scanned:
+            failed = sum(1 for r in batch.results[first:end] if not delivered(r))
+            if failed:
+                log.error(f"Failed to send {failed} metrics of {result.path}, it will be scanned again")
+                errors += 1
+            scanner.save(result, delivered=not failed)
+        store.commit()
+    finally:
+        store.close()
+    add_footer_fields(logs=summary)
+    return 1 if errors else 0
+
 if __name__ == '__main__':
     logfile_monitor()
@@ -0,0 +1,101 @@
+# Command manifest for the mtb CLI.
+#
+# Maps each command name to the module and attribute that define it, plus its help text,
+# so that `mtb --help` and `mtb list` never import the command modules and `mtb <cmd>`
+# imports only the module of the command being run.
+#
+# Regenerate with `mtb build-manifest` whenever a command is added, renamed or has its
+# help text changed.
+
+COMMANDS = {
+    "backup": {
+        "module": "mtb.commands.backup",
+        "attr": "backup_cmd",
+        "help": "Backup/Archive files using various backup engines.",
+    },
+    "bundle-extract": {
+        "module": "mtb.commands.bundle_extract",
+        "attr": "bundle_extract",
+        "help": "List or extract single files from a purge bundle using its index.",
+    },
+    "disk-monitor": {
+        "module": "mtb.commands.disk_monitor",
+        "attr": "disk_monitor",
+        "help": "Monitor disk usage and send metrics to Zabbix.",
+    },
+    "file-watcher": {
+        "module": "mtb.commands.file_watcher",
+        "attr": "file_watcher_cmd",
+        "help": "Watch a directory for file creation/deletion events with various filters.",
+    },
+    "get-password": {
+        "module": "mtb.commands.get_password",
+        "attr": "get_password",
+        "help": "Retrieve a password from a CyberArk safe using pyaim or conjur.",
+    },
+    "list": {
+        "module": "mtb.commands.list_functions",
+        "attr": "list_cmd",
+        "help": "List all available functionalities with descriptions.",
+    },
+    "log-search": {
+        "module": "mtb.commands.log_search",
+        "attr": "log_search",
+        "help": "Count pattern matches per hour in log files and their rotated and compressed archives.",
+    },
+    "logfile-monitor": {
+        "module": "mtb.commands.logfile_monitor",
+        "attr": "logfile_monitor",
+        "help": "Generate LLD JSON for log files defined in logs.yaml using native Zabbix keys for age and pattern.",
+    },
+    "process-monitor": {
+        "module": "mtb.commands.process_monitor",
+        "attr": "process_monitor",
+        "help": "Monitor CPU, memory, threads and open files per process group and send metrics to Zabbix.",
+    },
+    "purge": {
+        "module": "mtb.commands.purge",
+        "attr": "purge_cmd",
+        "help": "Delete old files and compress remaining ones based on age thresholds.",
+    },
+    "queue-discovery": {
+        "module": "mtb.commands.queue_discovery",
+        "attr": "queue_discovery",
+        "help": "Discover queues for all configured queue managers and output LLD JSON for Zabbix.",
+    },
+    "queue-populate": {
+        "module": "mtb.commands.queue_populate",
+        "attr": "queue_populate",
+        "help": "Populate Zabbix items with current message counts for all configured queue managers.",
+    },
+    "restore-list": {
+        "module": "mtb.commands.restore_list",
+        "attr": "restore_list",
+        "help": "List the files of a backed-up path as of any backup time.",
+    },
+    "run": {
+        "module": "mtb.commands.run_exec",
+        "attr": "run_cmd",
+        "help": "Execute an external script or executable with parameters.",
+    },
+    "send-email": {
+        "module": "mtb.commands.send_email",
+        "attr": "send_email",
+        "help": "Send an email with optional attachments and priority.",
+    },
+    "spool-replay": {
+        "module": "mtb.commands.spool_replay",
+        "attr": "spool_replay",
+        "help": "Send the metrics spooled while Zabbix was unreachable.",
+    },
+    "sql-query-monitor": {
+        "module": "mtb.commands.sql_query_monitor",
+        "attr": "sql_config_monitor",
+        "help": "Execute SQL queries from a YAML config and send results to Zabbix repeatedly if specified.",
+    },
+    "watch-daemon": {
+        "module": "mtb.commands.watch_daemon",
+        "attr": "watch_daemon",
+        "help": "Serve every watcher of watchers.yaml from one long-running process.",
+    },
+}
@@ -1,36 +1,51 @@
 import click
-import psutil
-from mtb.utils.decorators import log_header_footer
-from mtb.utils.zabbix import send_metric
-from mtb.utils import logger
+from mtb.utils.decorators import log_header_footer, add_footer_fields
+from mtb.utils.process_sampler import GROUP_METRICS, ProcessSampler, load_groups
+from mtb.utils.time_utils import parse_interval
+from mtb.utils.zabbix import MetricBatch, item_key
+from mtb.utils import config_parser, logger
 
-@click.command(name="process-monitor", help="Monitor peak CPU and RAM usage among processes and send metrics to Zabbix.")
+@click.command(name="process-monitor", help="Monitor CPU, memory, threads and open files per process group and send metrics to Zabbix.")
+@click.option('-i', '--interval', default=None, help="Time between the two passes measuring CPU (default: interval of processes.yaml, else 1s).")
+@click.option('--config', 'config_file', default="processes.yaml", show_default=True, help="Process groups file in the mtb etc directory.")
 @log_header_footer
-def process_monitor():
+def process_monitor(interval, config_file):
     """
-    Monitors running processes to determine:
-      - process.top_cpu: highest CPU usage (%)
-      - process.top_mem: highest memory usage (in MB)
+    Samples the running processes twice, --interval apart (see
+    mtb.utils.process_sampler.ProcessSampler), and sends in one batch:
+      - process.top_cpu: highest CPU usage over the interval (% of one CPU)
+      - process.top_mem: highest memory usage (RSS, in MB)
+      - process.group.<metric>[<group>] for each group of processes.yaml: count, cpu
+        (summed %), rss (bytes), threads and fds (open file descriptors)
     """
     log = logger.get_logger()
-    top_cpu = 0.0
-    top_mem = 0
-    for proc in psutil.process_iter(['cpu_percent', 'memory_info', 'name']):
-        try:
-            cpu = proc.info['cpu_percent']
-            mem = proc.info['memory_info'].rss  # in bytes
-            if cpu > top_cpu:
-                top_cpu = cpu
-            if mem > top_mem:
-                top_mem = mem
-        except Exception as e:
-            log.error(f"Error retrieving process info: {e}")
-    
-    top_mem_mb = top_mem / (1024 * 1024)
-    send_metric("process.top_cpu", top_cpu)
-    send_metric("process.top_mem", top_mem_mb)
-    click.echo(f"Top CPU usage: {top_cpu}%")
+    config = config_parser.load_config(config_file) or {}
+    try:
+        seconds = parse_interval(str(interval or config.get("interval", 1)))
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        return 1
+    sampler = ProcessSampler(load_groups(config))
+    result = sampler.sample(seconds)
+
+    top_mem_mb = result["top_mem"] / (1024 * 1024)
+    with MetricBatch() as batch:
+        batch.add("process.top_cpu", result["top_cpu"])
+        batch.add("process.top_mem", top_mem_mb)
+        for name, values in result["groups"].items():
+            for metric in GROUP_METRICS:
+                batch.add(item_key(f"process.group.{metric}", name), values[metric])
+    failed = [r for r in batch.results if not r.ok and not r.spooled]
+    if failed:
+        log.error(f"Failed to send {len(failed)} process metrics")
+
+    click.echo(f"Top CPU usage: {result['top_cpu']}%")
     click.echo(f"Top Memory usage: {top_mem_mb} MB")
+    for name, values in result["groups"].items():
+        click.echo(f"{name}: " + ", ".join(f"{metric}={values[metric]}" for metric in GROUP_METRICS))
+    add_footer_fields(process_monitor={key: result[key] for key in ("processes", "denied", "seconds")},
+                      groups=result["groups"])
+    return 1 if failed else 0
 
 if __name__ == '__main__':
     process_monitor()
@@ -1,98 +1,426 @@
 import click
+import multiprocessing
 import os
-import re
+import psutil
+import queue
+import threading
 import time
-from mtb.utils import logger, file_utils, config_parser
-from mtb.utils.decorators import log_header_footer
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from mtb.utils import logger, file_utils, config_parser, purge_planner, purge_index, archive_bundle, throttle
+from mtb.utils.decorators import log_header_footer, add_footer_fields
 
 log = logger.get_logger()
 
+# purge.yaml rule keys passed through to file_utils.compress_file().
+COMPRESS_OPTIONS = ("codec", "level", "threads", "verify")
+
+# Files of one bundle group above which the group is written out, so memory stays
+# bounded in huge directories (the next files go to "<prefix>-<period>.1.tar.gz"...).
+BUNDLE_MAX_FILES = 10000
+
+# Compressions submitted to the worker pool and not yet collected, per worker.
+IN_FLIGHT_PER_WORKER = 4
+
+# Compressed files and bundle indexes are only ever deleted.
+NEVER_COMPRESS = file_utils.COMPRESSED_EXTENSIONS + (archive_bundle.BUNDLE_SUFFIX + archive_bundle.INDEX_SUFFIX,)
+
 def get_configs(filepath, compress_days, delete_days, recursive):
     """
     Merge CLI parameters with the purge configuration.
     If CLI parameters are provided, use them; otherwise, load from file.
+    The --recursive flag makes every rule recursive; otherwise each rule keeps its own
+    "recursive" setting from the file.
     """
     if filepath and compress_days is not None and delete_days is not None:
         return {filepath: {"compress": compress_days, "delete": delete_days, "recursive": recursive}}
     else:
         configs = config_parser.load_config("purge.yaml") or {}
-        for pattern in configs:
-            configs[pattern]["recursive"] = recursive
-        return configs
-
-def find_files(pattern, recursive):
-    """Return a list of files matching 'pattern', searching recursively if requested."""
-    if recursive:
-        return [
-            os.path.join(root, f)
-            for root, _, files in os.walk(".")
-            for f in files
-            if re.match(pattern, os.path.join(root, f))
-        ]
-    else:
-        return [
-            os.path.join(".", f)
-            for f in os.listdir(".")
-            if os.path.isfile(os.path.join(".", f)) and re.match(pattern, os.path.join(".", f))
-        ]
-
-def get_file_age(f, current_time):
-    """Return the age of file f in days, or None if error."""
-    try:
-        return (current_time - os.path.getmtime(f)) / (24 * 3600)
-    except Exception as e:
-        log.error(f"Error getting age for {f}: {e}")
-        return None
+        # The loaded configuration is shared process-wide, so build new dicts instead of mutating it.
+        return {
+            pattern: dict(params, recursive=recursive or params.get("recursive", False))
+            for pattern, params in configs.items()
+        }
+
+class PurgeStats:
+    """Thread-safe counters for one purge run, reported in the command footer."""
+    def __init__(self):
+        self.compressed = 0
+        self.bundles = 0
+        self.bundled = 0
+        self.deleted = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record_compress(self, bytes_in, bytes_out):
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def record_bundle(self, files, bytes_in, bytes_out):
+        with self._lock:
+            self.bundles += 1
+            self.bundled += files
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def record_delete(self):
+        with self._lock:
+            self.deleted += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
 
-def try_delete_file(f, age_days):
+    def actions(self):
+        with self._lock:
+            return self.compressed + self.bundled + self.deleted + self.errors
+
+    def as_dict(self):
+        seconds = time.monotonic() - self.start
+        return {
+            "files_compressed": self.compressed,
+            "bundles_written": self.bundles,
+            "files_bundled": self.bundled,
+            "files_deleted": self.deleted,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "seconds": round(seconds, 3),
+            "mb_per_second": round(self.bytes_in / (1024 * 1024) / seconds, 2) if seconds > 0 else 0.0,
+        }
+
+def find_mount(path):
+    """Return the mount point holding path."""
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+def get_file_age(mtime, current_time):
+    """Return the age in days of a file last modified at mtime."""
+    return (current_time - mtime) / (24 * 3600)
+
+class ProgressCounter:
+    """Counts the files matched by the rules and logs progress every `every` files (0: never)."""
+    def __init__(self, every, stats=None):
+        self.every = every
+        self.stats = stats
+        self.files = 0
+
+    def tick(self):
+        self.files += 1
+        if self.every and self.files % self.every == 0:
+            actions = self.stats.actions() if self.stats is not None else "?"
+            log.info(f"Purge progress: {self.files} matching files checked, {actions} handled")
+
+def get_action(candidate, current_time):
+    """
+    Return (action, age in days) for a PurgeCandidate, using the thresholds of its rule:
+      - "delete" if age >= delete threshold.
+      - Otherwise "compress" if age >= compress threshold and the file is not already compressed,
+        or "bundle" instead if the rule sets a bundle period.
+      - Otherwise None.
+    """
+    f = candidate.path
+    age_days = get_file_age(candidate.mtime, current_time)
+    if age_days >= candidate.rule.delete:
+        return "delete", age_days
+    if age_days >= candidate.rule.compress and not f.endswith(NEVER_COMPRESS):
+        return ("bundle" if candidate.rule.options.get("bundle") else "compress"), age_days
+    return None, age_days
+
+def iter_actions(candidates, current_time, progress=None):
+    """
+    Age-filter stage of the purge pipeline: yield (candidate, action, age in days) for
+    the candidates get_action() selects, dropping the others as they stream past.
+    """
+    for candidate in candidates:
+        if progress is not None:
+            progress.tick()
+        action, age_days = get_action(candidate, current_time)
+        if action is not None:
+            yield candidate, action, age_days
+
+def get_compress_options(rule):
+    """Return the compress_file() keyword arguments set on a rule (codec, level, threads, verify)."""
+    return {key: rule.options[key] for key in COMPRESS_OPTIONS if rule.options.get(key) is not None}
+
+def get_throttle(rule, share=1):
+    """Return the shared Throttle for the rule's io_limit (see throttle.from_config), or None."""
+    return throttle.shared(rule.options.get("io_limit"), share)
+
+def try_delete_file(f, age_days, stats=None, io_throttle=None):
     """Attempt to delete the file and log the result."""
     try:
+        if io_throttle is not None:
+            io_throttle.op()
         os.remove(f)
         log.info(f"Deleted {f} (age {age_days:.2f} days)")
+        if stats is not None:
+            stats.record_delete()
     except Exception as e:
         log.error(f"Error deleting {f}: {e}")
+        if stats is not None:
+            stats.record_error()
 
-def try_compress_file(f, age_days):
+def try_compress_file(f, age_days, size=0, stats=None, options=None, io_throttle=None):
     """Attempt to compress the file and log the result."""
     try:
-        compressed = file_utils.compress_file(f)
+        compressed = file_utils.compress_file(f, throttle=io_throttle, **(options or {}))
         log.info(f"Compressed {f} to {compressed} (age {age_days:.2f} days)")
+        if stats is not None:
+            stats.record_compress(size, os.path.getsize(compressed))
     except Exception as e:
         log.error(f"Error compressing {f}: {e}")
+        if stats is not None:
+            stats.record_error()
 
-def process_files(files, current_time, compress_threshold, delete_threshold):
+class Bundler:
     """
-    For each file, compute its age (in days) and:
-      - Delete if age >= delete_threshold.
-      - Otherwise, compress if age >= compress_threshold and if the file is not already compressed.
+    Groups files of rules with a "bundle" period (day or hour, from the file mtime) and
+    writes each group of a directory into one compressed tar with an index sidecar
+    (see archive_bundle). The planner yields a directory's files together, so groups
+    are written whenever the walk moves to another directory, or as soon as one holds
+    BUNDLE_MAX_FILES paths, which bounds memory in huge directories. Originals are removed only after the bundle and its
+    index have been fsynced.
     """
-    for f in files:
-        age_days = get_file_age(f, current_time)
-        if age_days is None:
+    def __init__(self, stats=None, io_share=1):
+        self.stats = stats
+        self.io_share = io_share
+        self.directory = None
+        self.groups = {}
+        self.throttles = {}
+
+    def add(self, candidate):
+        directory = os.path.dirname(candidate.path)
+        if directory != self.directory:
+            self.flush()
+            self.directory = directory
+        options = candidate.rule.options
+        period = archive_bundle.period_key(candidate.mtime, options["bundle"])
+        key = (options.get("bundle_prefix", "bundle"), period, options.get("level", 6))
+        group = self.groups.setdefault(key, [])
+        group.append(candidate.path)
+        self.throttles[key] = get_throttle(candidate.rule, self.io_share)
+        if len(group) >= BUNDLE_MAX_FILES:
+            self._write(key, self.groups.pop(key))
+
+    def flush(self):
+        groups, self.groups = self.groups, {}
+        for key, paths in sorted(groups.items()):
+            self._write(key, paths)
+
+    def _write(self, key, paths):
+        prefix, period, level = key
+        io_throttle = self.throttles.get(key)
+        bundle_path = archive_bundle.bundle_path_for(self.directory, prefix, period)
+        try:
+            bytes_in, bytes_out = archive_bundle.write_bundle(bundle_path, paths, level, io_throttle)
+        except Exception as e:
+            log.error(f"Error bundling {len(paths)} files into {bundle_path}: {e}")
+            if self.stats is not None:
+                self.stats.record_error()
+            return
+        for path in paths:
+            try:
+                if io_throttle is not None:
+                    io_throttle.op()
+                os.remove(path)
+            except OSError as e:
+                log.error(f"Error removing bundled file {path}: {e}")
+        log.info(f"Bundled {len(paths)} files ({bytes_in} bytes) into {bundle_path} ({bytes_out} bytes)")
+        if self.stats is not None:
+            self.stats.record_bundle(len(paths), bytes_in, bytes_out)
+
+def process_files(candidates, current_time, stats=None, progress=None):
+    """Delete, compress or bundle each PurgeCandidate in turn, as decided by get_action()."""
+    bundler = Bundler(stats)
+    for candidate, action, age_days in iter_actions(candidates, current_time, progress):
+        if action == "delete":
+            try_delete_file(candidate.path, age_days, stats, get_throttle(candidate.rule))
+        elif action == "compress":
+            try_compress_file(candidate.path, age_days, candidate.size, stats,
+                              get_compress_options(candidate.rule), get_throttle(candidate.rule))
+        elif action == "bundle":
+            bundler.add(candidate)
+    bundler.flush()
+
+def purge_to_target(rules, mount, target, current_time, heap_size=100000, stats=None):
+    """
+    Free space on mount oldest-file-first until psutil.disk_usage(mount).percent is at
+    or below target. Every file matched by a rule is eligible, whatever its age; it is
+    deleted, or compressed (then removed) if its rule sets target_action: compress and it
+    is not compressed already. Candidates come from purge_planner.oldest_first(), so
+    memory stays bounded by heap_size however many files match.
+    Returns the final usage percentage.
+    """
+    usage = psutil.disk_usage(mount).percent
+    if usage <= target:
+        log.info(f"{mount} is at {usage}%, at or below the {target}% target: nothing to do")
+        return usage
+    log.info(f"{mount} is at {usage}%, freeing space oldest-first down to {target}%")
+    for candidate in purge_planner.oldest_first(rules, heap_size=heap_size):
+        age_days = get_file_age(candidate.mtime, current_time)
+        io_throttle = get_throttle(candidate.rule)
+        if (candidate.rule.options.get("target_action") == "compress"
+                and not candidate.path.endswith(NEVER_COMPRESS)):
+            try_compress_file(candidate.path, age_days, candidate.size, stats,
+                              get_compress_options(candidate.rule), io_throttle)
+            if os.path.exists(file_utils.compressed_path(candidate.path, candidate.rule.options.get("codec"))):
+                try_delete_file(candidate.path, age_days, io_throttle=io_throttle)
+        else:
+            try_delete_file(candidate.path, age_days, stats, io_throttle)
+        usage = psutil.disk_usage(mount).percent
+        if usage <= target:
+            log.info(f"{mount} reached {usage}% (target {target}%)")
+            return usage
+    log.warning(f"No more eligible files: {mount} is still at {usage}% (target {target}%)")
+    return usage
+
+def _run_deletions(deletions, stats):
+    """Deletion thread: unlink the (path, age, throttle) items put on the queue until None arrives."""
+    while True:
+        item = deletions.get()
+        if item is None:
+            return
+        try_delete_file(item[0], item[1], stats, item[2])
+
+def _collect_compressions(done, futures, stats):
+    """Log the outcome of finished compression futures and forget them."""
+    for future in done:
+        candidate, age_days, options = futures.pop(future)
+        try:
+            compressed, bytes_out = future.result()
+        except Exception as e:
+            file_utils.remove_partial(file_utils.compressed_path(candidate.path, options.get("codec")))
+            log.error(f"Error compressing {candidate.path}: {e}")
+            if stats is not None:
+                stats.record_error()
             continue
-        if age_days >= delete_threshold:
-            try_delete_file(f, age_days)
-        elif age_days >= compress_threshold and not (f.endswith('.zip') or f.endswith('.gz')):
-            try_compress_file(f, age_days)
+        log.info(f"Compressed {candidate.path} to {compressed} (age {age_days:.2f} days)")
+        if stats is not None:
+            stats.record_compress(candidate.size, bytes_out)
+
+def process_files_parallel(candidates, current_time, workers, stats=None, progress=None):
+    """
+    Same decisions as process_files(), but compressions run in a pool of worker
+    processes while deletions are done by a separate I/O thread, so neither waits for
+    the other. Results are logged here, in the parent process. If a compression fails
+    (including a crashed worker), its partial output is removed. A rule's io_limit caps
+    are split evenly into workers + 1 shares: one per worker, and one for this process,
+    whose bundling and deletions draw from the same Throttle.
+
+    At most IN_FLIGHT_PER_WORKER compressions per worker are pending at a time (and the
+    deletion queue is bounded too), so the walk waits for the workers instead of
+    queueing up every candidate in memory.
+    """
+    deletions = queue.Queue(maxsize=10000)
+    deleter = threading.Thread(target=_run_deletions, args=(deletions, stats), name="mtb-purge-delete")
+    deleter.start()
+    io_share = workers + 1
+    bundler = Bundler(stats, io_share)
+    futures = {}
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for candidate, action, age_days in iter_actions(candidates, current_time, progress):
+                if action == "delete":
+                    deletions.put((candidate.path, age_days, get_throttle(candidate.rule, io_share)))
+                elif action == "compress":
+                    if len(futures) >= max_in_flight:
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        _collect_compressions(done, futures, stats)
+                    options = get_compress_options(candidate.rule)
+                    future = pool.submit(file_utils.compress_worker, candidate.path,
+                                         io_limit=candidate.rule.options.get("io_limit"), io_share=io_share,
+                                         **options)
+                    futures[future] = (candidate, age_days, options)
+                elif action == "bundle":
+                    bundler.add(candidate)
+            bundler.flush()
+            _collect_compressions(wait(futures).done, futures, stats)
+    finally:
+        deletions.put(None)
+        deleter.join()
 
 @click.command(name="purge", help="Delete old files and compress remaining ones based on age thresholds.")
 @click.option('--filepath', default=None, help="Path to target files (overrides config).")
 @click.option('--compress-days', default=None, type=int, help="File age in days to compress (overrides config).")
 @click.option('--delete-days', default=None, type=int, help="File age in days to delete (overrides config).")
 @click.option('--recursive', is_flag=True, help="Search for matching files recursively.")
+@click.option('--workers', default=1, type=int, help="Compress in a pool of N worker processes (deletions run in their own thread).")
+@click.option('--codec', default=None, type=click.Choice(file_utils.available_codecs()),
+              help="Compression codec for every rule (default: per rule, else gzip/zip).")
+@click.option('--level', default=None, type=int, help="Compression level for every rule.")
+@click.option('--full', is_flag=True, help="Read every directory, ignoring the state kept from previous runs.")
+@click.option('--target-usage', default=None, type=click.FloatRange(0, 100),
+              help="Instead of age thresholds, free space oldest-first until the mount is at this usage percent.")
+@click.option('--mount', default=None, help="Mount point checked by --target-usage (default: the one holding the current directory).")
+@click.option('--heap-size', default=100000, type=int, help="Candidates held in memory at once by --target-usage.")
+@click.option('--progress-every', default=100000, type=int, help="Log progress every N matching files (0: never).")
 @log_header_footer
-def purge_cmd(filepath, compress_days, delete_days, recursive):
+def purge_cmd(filepath, compress_days, delete_days, recursive, workers, codec, level, full,
+              target_usage, mount, heap_size, progress_every):
     """
     Purge command: delete files older than a delete threshold and compress files older than a compress threshold.
     
     CLI options override the configuration loaded from the purge config file.
+    All patterns are compiled once and the tree is walked a single time; each file is
+    handled by the first matching rule (rules with a higher "priority" are tried first,
+    then in file order).
+
+    With --workers N (N > 1), compression runs in N worker processes.
+    Run statistics (files, bytes in/out, seconds) are added to the footer.
+
+    The run is a streaming pipeline (scandir walk -> rule match -> age filter -> action):
+    no list of files is ever built, so memory stays flat whatever the directory size.
+    Progress is logged every --progress-every matching files.
+
+    Purges are incremental: the state database set by purge_state_db in config.yaml
+    (default ~/.mtb/purge_state.db) records each directory's mtime and when its files
+    next cross a threshold, and unchanged directories with nothing due are not read.
+    Directories changed by a run are read again on the next one. --full reads everything.
+
+    With --target-usage PCT, files matched by the rules are deleted (or compressed, for
+    rules with target_action: compress) from the oldest down until the mount is at or
+    below PCT percent used; age thresholds are not applied.
     """
     current_time = time.time()
     configs = get_configs(filepath, compress_days, delete_days, recursive)
-    for pattern, params in configs.items():
-        files = find_files(pattern, params.get("recursive", False))
-        process_files(files, current_time, params["compress"], params["delete"])
-    log.info("Purge command completed.")
+    overrides = {key: value for key, value in (("codec", codec), ("level", level)) if value is not None}
+    configs = {pattern: dict(params, **overrides) for pattern, params in configs.items()}
+    rules = purge_planner.build_rules(configs)
+    stats = PurgeStats()
+    if target_usage is not None:
+        mount = mount or find_mount(".")
+        if os.stat(".").st_dev != os.stat(mount).st_dev:
+            log.error(f"The current directory is not on {mount}: purging it would not free space there")
+            return 1
+        try:
+            usage = purge_to_target(rules, mount, target_usage, current_time, heap_size, stats)
+        finally:
+            add_footer_fields(purge_stats=stats.as_dict())
+        add_footer_fields(disk_usage={mount: usage})
+        log.info(f"Purge command completed: {stats.as_dict()}")
+        return 0 if usage <= target_usage else 1
+    index = purge_index.open_index(rules, full=full)
+    candidates = purge_planner.plan(rules, index=index, now=current_time)
+    progress = ProgressCounter(progress_every, stats)
+    try:
+        if workers > 1:
+            process_files_parallel(candidates, current_time, workers, stats, progress)
+        else:
+            process_files(candidates, current_time, stats, progress)
+    finally:
+        if index is not None:
+            index.close()
+            add_footer_fields(purge_index=index.stats())
+        add_footer_fields(purge_stats=stats.as_dict())
+    log.info(f"Purge command completed: {stats.as_dict()}")
 
 if __name__ == "__main__":
     purge_cmd()
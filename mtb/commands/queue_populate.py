@@ -2,7 +2,7 @@ import click
 import requests
 from mtb.utils.decorators import log_header_footer
 from mtb.utils import config_parser, logger
-from mtb.utils.zabbix import send_metric
+from mtb.utils.zabbix import MetricBatch
 
 log = logger.get_logger()
 
@@ -134,11 +134,22 @@ def queue_populate():
         overall.update(populate_activemq(config))
     if config.get("ibmmq"):
         overall.update(populate_ibmmq(config))
-    # Send each metric to Zabbix.
-    for key, value in overall.items():
-        send_metric(key, value)
-        click.echo(f"Sent metric {key}: {value}")
-        log.info(f"Sent metric {key} = {value}")
+    # Send the metrics to Zabbix in batches, one connection per chunk.
+    with MetricBatch() as batch:
+        for key, value in overall.items():
+            batch.add(key, value)
+    failed = spooled = 0
+    for result in batch.results:
+        if result.ok:
+            click.echo(f"Sent metric {result.key}: {result.value}")
+        elif result.spooled:
+            spooled += 1
+            click.echo(f"Spooled metric {result.key}: {result.value}", err=True)
+        else:
+            failed += 1
+            click.echo(f"Failed to send metric {result.key}: {result.value}", err=True)
+    sent = len(batch.results) - failed - spooled
+    log.info(f"Sent {sent} metrics in {batch.chunks_sent} chunk(s), {spooled} spooled, {failed} failed")
 
 if __name__ == '__main__':
     queue_populate()
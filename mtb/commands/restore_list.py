@@ -0,0 +1,55 @@
+import click
+from datetime import datetime, timezone
+from mtb.backup_engines.base import source_key
+from mtb.backup_engines.manifest import ManifestChain
+from mtb.backup_engines.registry import ENGINES, get_engine
+from mtb.utils import logger
+from mtb.utils.decorators import log_header_footer
+
+log = logger.get_logger()
+
+@click.command(name="restore-list", help="List the files of a backed-up path as of any backup time.")
+@click.option('--filepath', default=".", help="Source path that was backed up.")
+@click.option('--engine', default="local", type=click.Choice(sorted(ENGINES)), help="Backup engine holding the backups.")
+@click.option('--at', 'at', default=None, help="Point in time (ISO format, local time unless an offset is given); default: latest.")
+@click.option('--manifests', is_flag=True, help="List the manifests of the path instead of its files.")
+@log_header_footer
+def restore_list(filepath, engine, at, manifests):
+    """
+    Rebuild the view of a backed-up path from its chain of manifests (the latest full
+    manifest at or before --at, plus the incrementals after it) and print one line per
+    file: path, size, mtime and the key of the object (or chunk recipe) holding its content.
+    """
+    try:
+        engine_instance = get_engine(engine)
+    except (ValueError, NotImplementedError, ImportError) as e:
+        log.error(f"Cannot use backup engine {engine}: {e}")
+        return 1
+    when = None
+    if at:
+        try:
+            when = datetime.fromisoformat(at)
+        except ValueError:
+            click.echo(f"Invalid --at time: {at}", err=True)
+            return 1
+        if when.tzinfo is None:
+            when = when.astimezone()
+        when = when.astimezone(timezone.utc)
+
+    chain = ManifestChain(engine_instance, source_key(filepath))
+    if manifests:
+        for key in chain.manifests(when):
+            header, entries = chain.read(key)
+            click.echo(f"{header['created']}\t{header['type']}\t{len(entries)} entries\t{key}")
+        return 0
+
+    state, incrementals = chain.view(when)
+    if not state and not chain.manifests(when):
+        click.echo(f"No backup of {filepath} in {engine}" + (f" at or before {at}" if at else ""), err=True)
+        return 1
+    for path in sorted(state):
+        entry = state[path]
+        mtime = datetime.fromtimestamp(entry["mtime_ns"] / 1e9).isoformat(timespec="seconds")
+        click.echo(f"{path}\t{entry['size']}\t{mtime}\t{engine_instance.content_location(entry)}")
+    log.info(f"Listed {len(state)} files of {filepath} from {engine} ({incrementals} incrementals after the full manifest)")
+    return 0
@@ -0,0 +1,31 @@
+import click
+from mtb.utils.decorators import log_header_footer
+from mtb.utils import logger
+from mtb.utils.zabbix import MetricBatch
+
+@click.command(name="spool-replay", help="Send the metrics spooled while Zabbix was unreachable.")
+@click.option('--status', is_flag=True, help="Only show the spool size, do not send anything.")
+@log_header_footer
+def spool_replay(status):
+    """
+    Drains the local metric spool (zabbix_spool_dir in config.yaml) oldest-first, in
+    batches of zabbix_replay_batch_size items, keeping the original timestamps.
+    Only sealed segments (values spooled before the current minute) are sent.
+    """
+    log = logger.get_logger()
+    batch = MetricBatch()
+    if batch.spool is None:
+        click.echo("Metric spooling is disabled (zabbix_spool_dir is empty).", err=True)
+        return 1
+
+    segments = batch.spool.segments()
+    click.echo(f"Spool {batch.spool.directory}: {len(segments)} segment(s), {batch.spool.size()} bytes")
+    if status:
+        return
+
+    sent = batch.replay_spool()
+    remaining = len(batch.spool.sealed_segments())
+    click.echo(f"Replayed {sent} metrics, {remaining} sealed segment(s) left")
+    log.info(f"Spool replay sent {sent} metrics, {remaining} sealed segment(s) left")
+    if remaining:
+        return 1
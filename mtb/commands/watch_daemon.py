@@ -0,0 +1,36 @@
+import click
+import signal
+from mtb.utils import logger
+from mtb.utils.decorators import log_header_footer, add_footer_fields
+from mtb.utils.time_utils import parse_interval
+from mtb.utils.watch_daemon import CONFIG_FILE, WatcherDaemon
+
+log = logger.get_logger()
+
+@click.command(name="watch-daemon", help="Serve every watcher of watchers.yaml from one long-running process.")
+@click.option('--config', 'config_file', default=CONFIG_FILE, show_default=True, help="Watchers file in the mtb etc directory.")
+@click.option('-l', '--limit', default=None, help="Stop after this long (e.g., 1d or 3h30m45s); default: run until stopped.")
+@log_header_footer
+def watch_daemon(config_file, limit):
+    """
+    Run the watchers of watchers.yaml (see mtb.utils.watch_daemon.WatcherDaemon) until
+    SIGTERM, Ctrl-C or --limit. The file is reloaded when it changes; per-watcher
+    counters and queue depths are sent to Zabbix periodically and reported in the footer.
+    """
+    daemon = WatcherDaemon(config_file)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run(parse_interval(limit) if limit else None)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        log.error(str(e))
+        return 1
+    watchers = daemon.metrics()
+    add_footer_fields(watchers=watchers, reloads=daemon.reloads,
+                      transfers=daemon.transfer.stats.as_dict() if daemon.transfer else None)
+    log.info("Watch daemon stopped")
+    return 1 if any(values["errors"] for values in watchers.values()) else 0
+
+if __name__ == '__main__':
+    watch_daemon()
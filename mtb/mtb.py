@@ -1,36 +1,126 @@
 import click
 import importlib
+import json
+import os
 import pkgutil
+from mtb.commands.manifest import COMMANDS
 from mtb.utils import config_parser, logger
 
 log = logger.get_logger()
 
-@click.group()
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "commands", "manifest.py")
+
+MANIFEST_HEADER = """# Command manifest for the mtb CLI.
+#
+# Maps each command name to the module and attribute that define it, plus its help text,
+# so that `mtb --help` and `mtb list` never import the command modules and `mtb <cmd>`
+# imports only the module of the command being run.
+#
+# Regenerate with `mtb build-manifest` whenever a command is added, renamed or has its
+# help text changed.
+"""
+
+class LazyGroup(click.Group):
+    """
+    A click Group whose subcommands are resolved from the command manifest.
+    Listing commands and rendering --help only read the manifest; a command module
+    is imported the first time that command is requested.
+    """
+    def __init__(self, *args, manifest=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest if manifest is not None else {}
+
+    def list_commands(self, ctx):
+        return sorted(set(self.commands) | set(self.manifest))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.manifest:
+            entry = self.manifest[cmd_name]
+            module = importlib.import_module(entry["module"])
+            self.add_command(getattr(module, entry["attr"]), cmd_name)
+            log.debug(f"Loaded command: {cmd_name} from module {entry['module']}")
+        return self.commands.get(cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        """Write the command list from the manifest, without importing any command module."""
+        names = [
+            name for name in self.list_commands(ctx)
+            if name not in self.commands or not self.commands[name].hidden
+        ]
+        if not names:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        rows = []
+        for name in names:
+            if name in self.commands:
+                help_text = self.commands[name].get_short_help_str(limit)
+            else:
+                help_text = click.utils.make_default_short_help(self.manifest[name].get("help") or "", limit)
+            rows.append((name, help_text))
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
+
+@click.group(cls=LazyGroup, manifest=COMMANDS)
 def main():
     """
     mtb: Maximus Toolbox is a set of tools for application support.
     """
     pass
 
-def load_commands():
+def scan_commands(previous=None):
     """
-    Dynamically load all commands from the mtb.commands package.
-    Any attribute in a module that is a Click Command instance will be registered.
+    Import every module of the mtb.commands package and collect its Click commands.
+    Returns a manifest dict: {command name: {"module", "attr", "help"}}.
+    Entries of modules that fail to import (e.g. a missing optional dependency on the
+    build host) are carried over from the previous manifest instead of being dropped.
     """
+    previous = previous or {}
     import mtb.commands
     package = mtb.commands
     package_path = package.__path__
     commands_pkg = package.__name__
 
+    manifest = {}
     for _, module_name, _ in pkgutil.iter_modules(package_path):
-        module = importlib.import_module(f"{commands_pkg}.{module_name}")
+        if module_name in ("init", "manifest"):
+            continue
+        try:
+            module = importlib.import_module(f"{commands_pkg}.{module_name}")
+        except Exception as e:
+            log.error(f"Error importing command module {module_name}: {e}")
+            for name, entry in previous.items():
+                if entry["module"] == f"{commands_pkg}.{module_name}":
+                    manifest[name] = entry
+            continue
         for attr_name in dir(module):
             attr = getattr(module, attr_name)
             if isinstance(attr, click.core.Command):
-                main.add_command(attr)
-                log.info(f"Loaded command: {attr.name} from module {module_name}")
+                manifest[attr.name] = {
+                    "module": f"{commands_pkg}.{module_name}",
+                    "attr": attr_name,
+                    "help": attr.help or "",
+                }
+    return manifest
+
+def write_manifest(manifest, path=MANIFEST_PATH):
+    """Write the manifest dict as an importable Python module."""
+    lines = [MANIFEST_HEADER, "COMMANDS = {"]
+    for name in sorted(manifest):
+        entry = manifest[name]
+        lines.append(f"    {json.dumps(name)}: {{")
+        for field in ("module", "attr", "help"):
+            lines.append(f"        {json.dumps(field)}: {json.dumps(entry[field])},")
+        lines.append("    },")
+    lines.append("}")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
 
-load_commands()
+@main.command(name="build-manifest", hidden=True, help="Regenerate the command manifest from the mtb.commands package.")
+def build_manifest():
+    manifest = scan_commands(previous=COMMANDS)
+    write_manifest(manifest)
+    click.echo(f"Wrote {len(manifest)} commands to {MANIFEST_PATH}")
+    log.info(f"Command manifest rebuilt with {len(manifest)} commands")
 
 if __name__ == "__main__":
     config = config_parser.load_config("config.yaml")
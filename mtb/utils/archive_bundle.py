@@ -0,0 +1,138 @@
+import gzip
+import json
+import os
+import tarfile
+import time
+import zlib
+from mtb.utils.transfer import fsync_directory
+
+BUNDLE_SUFFIX = ".tar.gz"
+INDEX_SUFFIX = ".idx"
+READ_BUFFER = 1024 * 1024
+TAR_BLOCK = tarfile.BLOCKSIZE
+
+def period_key(mtime, granularity):
+    """Return the bundle period of an mtime: YYYYMMDD for "day", YYYYMMDDHH for "hour"."""
+    if granularity == "hour":
+        return time.strftime("%Y%m%d%H", time.localtime(mtime))
+    if granularity == "day":
+        return time.strftime("%Y%m%d", time.localtime(mtime))
+    raise ValueError(f"Unsupported bundle period: {granularity}")
+
+def bundle_path_for(directory, prefix, period):
+    """Return a bundle path for the period that does not exist yet."""
+    path = os.path.join(directory, f"{prefix}-{period}{BUNDLE_SUFFIX}")
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{prefix}-{period}.{n}{BUNDLE_SUFFIX}")
+        n += 1
+    return path
+
+class _MemberWriter:
+    """Writes one gzip member to an open file and reports its offset and length."""
+    def __init__(self, f, level):
+        self.f = f
+        self.offset = f.tell()
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def write(self, data):
+        self.f.write(self.compressor.compress(data))
+
+    def close(self):
+        self.f.write(self.compressor.flush())
+        return self.offset, self.f.tell() - self.offset
+
+def write_bundle(bundle_path, paths, level=6, throttle=None):
+    """
+    Stream the files in paths into a compressed tar at bundle_path, plus an index sidecar
+    (bundle_path + ".idx", one JSON line per file).
+
+    Every tar member is written as its own gzip member, so the bundle is an ordinary
+    .tar.gz for tar/gunzip while the index's offset lets extract_member() decompress a
+    single file. Both files are written under temporary names, fsynced, renamed into
+    place and given the newest member mtime, so the bundle ages like its content.
+    The originals are left alone: the caller removes them once this returns.
+    Reads are rate-limited by the optional throttle (mtb.utils.throttle.Throttle).
+    Returns (bytes in, bytes out).
+    """
+    tmp_bundle = f"{bundle_path}.tmp"
+    index_path = f"{bundle_path}{INDEX_SUFFIX}"
+    tmp_index = f"{index_path}.tmp"
+    bytes_in = 0
+    newest = 0
+    try:
+        with open(tmp_bundle, "wb") as out, open(tmp_index, "w") as index:
+            for path in paths:
+                st = os.stat(path)
+                info = tarfile.TarInfo(os.path.basename(path))
+                info.size = st.st_size
+                info.mtime = st.st_mtime
+                info.mode = st.st_mode & 0o7777
+                member = _MemberWriter(out, level)
+                member.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+                remaining = st.st_size
+                with open(path, "rb") as f_in:
+                    while remaining > 0:
+                        block = f_in.read(min(READ_BUFFER, remaining))
+                        if not block:
+                            raise IOError(f"{path} shrank while being bundled")
+                        if throttle is not None:
+                            throttle.read(len(block))
+                        member.write(block)
+                        remaining -= len(block)
+                if st.st_size % TAR_BLOCK:
+                    member.write(b"\0" * (TAR_BLOCK - st.st_size % TAR_BLOCK))
+                offset, length = member.close()
+                index.write(json.dumps({"name": info.name, "offset": offset, "length": length,
+                                        "size": st.st_size, "mtime": st.st_mtime}) + "\n")
+                bytes_in += st.st_size
+                newest = max(newest, st.st_mtime)
+            end = _MemberWriter(out, level)
+            end.write(b"\0" * (TAR_BLOCK * 2))
+            end.close()
+            out.flush()
+            os.fsync(out.fileno())
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(tmp_bundle, bundle_path)
+        os.replace(tmp_index, index_path)
+        os.utime(bundle_path, (newest, newest))
+        os.utime(index_path, (newest, newest))
+        fsync_directory(os.path.dirname(os.path.abspath(bundle_path)))
+    except BaseException:
+        for path in (tmp_bundle, tmp_index):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    return bytes_in, os.path.getsize(bundle_path)
+
+def read_index(bundle_path):
+    """Return the index entries of a bundle as a list of dicts, in archive order."""
+    with open(f"{bundle_path}{INDEX_SUFFIX}") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def extract_member(bundle_path, name, dest_dir="."):
+    """
+    Extract the single file `name` from a bundle to dest_dir, decompressing only its own
+    gzip member. Returns the extracted path.
+    """
+    entry = next((e for e in read_index(bundle_path) if e["name"] == name), None)
+    if entry is None:
+        raise KeyError(f"{name} is not in {bundle_path}")
+    dest = os.path.join(dest_dir, os.path.basename(entry["name"]))
+    with open(bundle_path, "rb") as f:
+        f.seek(entry["offset"])
+        with gzip.GzipFile(fileobj=f, mode="rb") as gz, tarfile.open(fileobj=gz, mode="r|") as tar:
+            info = tar.next()
+            if info is None or info.name != name:
+                raise IOError(f"Index of {bundle_path} does not match the archive at offset {entry['offset']}")
+            with tar.extractfile(info) as src, open(dest, "wb") as out:
+                while True:
+                    block = src.read(READ_BUFFER)
+                    if not block:
+                        break
+                    out.write(block)
+    os.utime(dest, (entry["mtime"], entry["mtime"]))
+    return dest
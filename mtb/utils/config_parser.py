@@ -1,20 +1,129 @@
 import yaml
 import os
-from mtb.utils import logger
+import pickle
+import logging
+import threading
 
-log = logger.get_logger()
+# The logger module reads its level from config.yaml through this module, so the "mtb"
+# logger is looked up directly here instead of through logger.get_logger().
+log = logging.getLogger("mtb")
 
 # CONFIG_DIR is set relative to this file. Since this file is at mtb/mtb/utils,
 # "../etc" will resolve to mtb/mtb/etc.
 CONFIG_DIR = os.path.join(os.path.dirname(__file__), "../etc")
 
-def load_config(filename):
-    filepath = os.path.join(CONFIG_DIR, filename)
-    try:
+# Set MTB_CONFIG_CACHE=1 to keep a precompiled (pickled) copy of each YAML file next to it,
+# named .<file>.cache, which makes cold loads in new processes skip YAML parsing.
+CACHE_ENV_VAR = "MTB_CONFIG_CACHE"
+
+# Use the libyaml parser when PyYAML was built with it.
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+class ConfigStore:
+    """
+    Process-wide store of parsed configuration files.
+
+    Each file is parsed once and kept in memory together with its (mtime, size) stamp;
+    it is parsed again only when the stamp on disk changes. The returned objects are
+    shared between callers and must be treated as read-only.
+    """
+    def __init__(self, config_dir=CONFIG_DIR, use_cache_file=None):
+        self.config_dir = config_dir
+        if use_cache_file is None:
+            use_cache_file = os.environ.get(CACHE_ENV_VAR, "").lower() in ("1", "true", "yes")
+        self.use_cache_file = use_cache_file
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def get(self, filename):
+        """Return the parsed content of filename, or {} if it cannot be loaded."""
+        filepath = os.path.join(self.config_dir, filename)
+        try:
+            st = os.stat(filepath)
+        except OSError as e:
+            log.error(f"Error loading config file {filepath}: {e}")
+            return {}
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        entry = self._entries.get(filepath)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        with self._lock:
+            # Another thread may have reloaded the file while we waited for the lock.
+            entry = self._entries.get(filepath)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+            try:
+                config = self._load(filepath, stamp)
+            except Exception as e:
+                log.error(f"Error loading config file {filepath}: {e}")
+                return {}
+            self._entries[filepath] = (stamp, config)
+            return config
+
+    def stamp(self, filename):
+        """Return the (mtime_ns, size) stamp of the cached copy of filename, or None."""
+        entry = self._entries.get(os.path.join(self.config_dir, filename))
+        return entry[0] if entry is not None else None
+
+    def clear(self):
+        """Forget every cached file; the next get() parses from disk again."""
+        with self._lock:
+            self._entries.clear()
+
+    def _cache_path(self, filepath):
+        directory, name = os.path.split(filepath)
+        return os.path.join(directory, f".{name}.cache")
+
+    def _load(self, filepath, stamp):
+        if self.use_cache_file:
+            config = self._read_cache_file(filepath, stamp)
+            if config is not None:
+                log.debug(f"Configuration loaded from cache of {filepath}")
+                return config
+
         with open(filepath, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=YamlLoader)
+        if config is None:
+            config = {}
         log.info(f"Configuration loaded from {filepath}")
+
+        if self.use_cache_file:
+            self._write_cache_file(filepath, stamp, config)
         return config
-    except Exception as e:
-        log.error(f"Error loading config file {filepath}: {e}")
-        return {}
+
+    def _read_cache_file(self, filepath, stamp):
+        try:
+            with open(self._cache_path(filepath), 'rb') as f:
+                cached_stamp, config = pickle.load(f)
+        except Exception:
+            return None
+        return config if tuple(cached_stamp) == stamp else None
+
+    def _write_cache_file(self, filepath, stamp, config):
+        cache_path = self._cache_path(filepath)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((stamp, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            log.debug(f"Could not write config cache {cache_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+_store = ConfigStore()
+
+def get_store():
+    """Return the process-wide ConfigStore."""
+    return _store
+
+def load_config(filename):
+    """
+    Return the parsed content of a configuration file from CONFIG_DIR.
+    The file is parsed once per process and reloaded only when it changes on disk.
+    """
+    return _store.get(filename)
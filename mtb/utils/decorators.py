@@ -5,6 +5,17 @@ from mtb.utils import logger
 
 log = logger.get_logger()
 
+FOOTER_FIELDS_KEY = "mtb.footer_fields"
+
+def add_footer_fields(**fields):
+    """
+    Add fields (e.g. run statistics) to the footer that log_header_footer emits for the
+    command currently running. Does nothing outside of a click context.
+    """
+    ctx = click.get_current_context(silent=True)
+    if ctx is not None:
+        ctx.meta.setdefault(FOOTER_FIELDS_KEY, {}).update(fields)
+
 def log_header_footer(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
@@ -45,6 +56,8 @@ def log_header_footer(func):
                 "end_time": end_time.isoformat(),
                 "exit_code": exit_code
             }
+            if ctx is not None:
+                footer.update(ctx.meta.get(FOOTER_FIELDS_KEY, {}))
             # Print footer to stdout and log it
             click.echo("--- FOOTER ---")
             click.echo(footer)
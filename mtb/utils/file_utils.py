@@ -1,33 +1,276 @@
+import contextlib
 import os
 import platform
-import shutil
 import gzip
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from mtb.utils.throttle import shared as shared_throttle
 
-def compress_file(filepath):
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COPY_BUFFER = 1024 * 1024
+
+# Extensions of files written by the codecs below; purge never recompresses them.
+COMPRESSED_EXTENSIONS = ('.gz', '.zip', '.zst')
+
+class Codec:
     """
-    Compress the file using gzip for Linux and zip for Windows.
+    Base class of the compression codecs used by compress_file().
+    compress() writes src_path to dst_path and returns the CRC32 of the input, which
+    verify() uses to check the written file. Input is read through read_blocks(), which
+    applies the optional throttle (mtb.utils.throttle.Throttle) to every block.
+    available is False when the codec's optional dependency is not installed.
+    """
+    name = None
+    extension = None
+    available = True
+
+    def __init__(self, level=None, threads=None, throttle=None):
+        self.level = level
+        self.threads = threads
+        self.throttle = throttle
+
+    def read_blocks(self, f_in, size=COPY_BUFFER):
+        """Yield the blocks of f_in, waiting on the throttle before each one."""
+        while True:
+            block = f_in.read(size)
+            if not block:
+                return
+            if self.throttle is not None:
+                self.throttle.read(len(block))
+            yield block
+
+    def compress(self, src_path, dst_path, mtime):
+        raise NotImplementedError
+
+    def open_reader(self, path):
+        """Return a binary file object yielding the decompressed content of path."""
+        raise NotImplementedError
+
+    def original_mtime(self, path):
+        """Return the mtime of the file compressed into path, as kept by compress()."""
+        return os.path.getmtime(path)
+
+    def verify(self, dst_path, crc, size):
+        """Decompress dst_path and check its length and CRC32 against the input's."""
+        out_crc, out_size = 0, 0
+        with self.open_reader(dst_path) as f:
+            while True:
+                block = f.read(COPY_BUFFER)
+                if not block:
+                    break
+                out_crc = zlib.crc32(block, out_crc)
+                out_size += len(block)
+        if (out_crc, out_size) != (crc, size):
+            raise IOError(f"Integrity check failed for {dst_path}: "
+                          f"{out_size} bytes crc {out_crc:08x}, expected {size} bytes crc {crc:08x}")
+
+class GzipCodec(Codec):
+    """Single-threaded gzip; the original file's mtime goes in the gzip header."""
+    name = "gzip"
+    extension = ".gz"
+
+    def compress(self, src_path, dst_path, mtime):
+        crc = 0
+        level = 9 if self.level is None else self.level
+        with open(src_path, 'rb') as f_in, open(dst_path, 'wb') as raw_out, \
+                gzip.GzipFile(filename=os.path.basename(src_path), mode='wb', fileobj=raw_out,
+                              compresslevel=level, mtime=mtime) as f_out:
+            for block in self.read_blocks(f_in):
+                crc = zlib.crc32(block, crc)
+                f_out.write(block)
+        return crc
+
+    def open_reader(self, path):
+        return gzip.open(path, 'rb')
+
+    def original_mtime(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(8)
+        mtime = int.from_bytes(header[4:8], 'little') if header[:2] == b'\x1f\x8b' else 0
+        return mtime or os.path.getmtime(path)
+
+class ParallelGzipCodec(GzipCodec):
+    """
+    Block-parallel gzip: the input is cut into block_size chunks that are compressed
+    as independent gzip members on a thread pool (zlib releases the GIL) and written
+    in order. Concatenated members are a valid gzip file for gunzip and gzip.open;
+    every member header carries the original mtime.
+    """
+    name = "pgzip"
+
+    def __init__(self, level=None, threads=None, throttle=None, block_size=4 * 1024 * 1024):
+        super().__init__(level, threads, throttle)
+        self.block_size = block_size
+
+    def compress(self, src_path, dst_path, mtime):
+        crc = 0
+        level = 6 if self.level is None else self.level
+        threads = self.threads or os.cpu_count() or 1
+        pending = []
+        with open(src_path, 'rb') as f_in, open(dst_path, 'wb') as f_out, \
+                ThreadPoolExecutor(max_workers=threads) as pool:
+            for block in self.read_blocks(f_in, self.block_size):
+                crc = zlib.crc32(block, crc)
+                pending.append(pool.submit(gzip.compress, block, level, mtime=int(mtime)))
+                # Keep at most two blocks per thread in memory.
+                if len(pending) >= threads * 2:
+                    f_out.write(pending.pop(0).result())
+            for future in pending:
+                f_out.write(future.result())
+            if f_out.tell() == 0:
+                # Empty input: still write one (empty) member.
+                f_out.write(gzip.compress(b"", level, mtime=int(mtime)))
+        return crc
+
+class ZstdCodec(Codec):
+    """zstd through the optional zstandard package; the output file keeps the original mtime."""
+    name = "zstd"
+    extension = ".zst"
+    available = zstandard is not None
+
+    def compress(self, src_path, dst_path, mtime):
+        if zstandard is None:
+            raise ImportError("zstandard is not installed.")
+        crc = 0
+        level = 3 if self.level is None else self.level
+        cctx = zstandard.ZstdCompressor(level=level, threads=self.threads or 0, write_checksum=True)
+        with open(src_path, 'rb') as f_in, open(dst_path, 'wb') as raw_out:
+            with cctx.stream_writer(raw_out, size=os.path.getsize(src_path), closefd=False) as f_out:
+                for block in self.read_blocks(f_in):
+                    crc = zlib.crc32(block, crc)
+                    f_out.write(block)
+        os.utime(dst_path, (mtime, mtime))
+        return crc
+
+    def open_reader(self, path):
+        if zstandard is None:
+            raise ImportError("zstandard is not installed.")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+class ZipCodec(Codec):
+    """
+    Deflate in a zip archive (the Windows default); the entry keeps the original timestamp.
+    The entry is written by ZipFile.write(), the only public API taking a compression
+    level before Python 3.13, which reads the file itself: the throttle is charged for
+    the whole file, block by block, before it is compressed.
+    """
+    name = "zip"
+    extension = ".zip"
+
+    def compress(self, src_path, dst_path, mtime):
+        level = 9 if self.level is None else self.level
+        name = os.path.basename(src_path)
+        if self.throttle is not None:
+            size = os.path.getsize(src_path)
+            for offset in range(0, size, COPY_BUFFER):
+                self.throttle.read(min(COPY_BUFFER, size - offset))
+        with zipfile.ZipFile(dst_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=level) as zipf:
+            # The entry's timestamp is the mtime of src_path, which is mtime.
+            zipf.write(src_path, name)
+            return zipf.getinfo(name).CRC
+
+    @contextlib.contextmanager
+    def open_reader(self, path):
+        with zipfile.ZipFile(path) as zipf, zipf.open(zipf.namelist()[0]) as reader:
+            yield reader
+
+    def original_mtime(self, path):
+        with zipfile.ZipFile(path) as zipf:
+            return datetime(*zipf.infolist()[0].date_time).timestamp()
+
+CODECS = {
+    "gzip": GzipCodec,
+    "pgzip": ParallelGzipCodec,
+    "zstd": ZstdCodec,
+    "zip": ZipCodec,
+}
+
+def available_codecs():
+    """Names of the codecs that can compress here (zstd needs zstandard), sorted."""
+    return sorted(name for name, codec in CODECS.items() if codec.available)
+
+def default_codec_name():
+    """zip on Windows, gzip elsewhere."""
+    return "zip" if platform.system() == "Windows" else "gzip"
+
+def get_codec(name=None, level=None, threads=None, throttle=None):
+    """Return a codec instance by name (see CODECS); None selects the platform default."""
+    name = (name or default_codec_name()).lower()
+    if name not in CODECS:
+        raise ValueError(f"Unsupported codec: {name}")
+    return CODECS[name](level=level, threads=threads, throttle=throttle)
+
+def codec_for_path(path):
+    """Return the codec that wrote path, by extension, or None if it is not compressed."""
+    for codec in CODECS.values():
+        if path.endswith(codec.extension):
+            return codec()
+    return None
+
+def open_compressed(path):
+    """
+    Return a binary reader of the decompressed content of path (a file written by
+    compress_file()), or of path itself if it is not compressed. Use it as a context
+    manager.
+    """
+    codec = codec_for_path(path)
+    return codec.open_reader(path) if codec is not None else open(path, 'rb')
+
+def original_mtime(path):
+    """Return the mtime of path, or for a compressed file the one of the file it holds."""
+    codec = codec_for_path(path)
+    return codec.original_mtime(path) if codec is not None else os.path.getmtime(path)
+
+def compressed_path(filepath, codec=None):
+    """Return the path compress_file() writes for filepath with the given codec."""
+    return f"{filepath}{get_codec(codec).extension}"
+
+def remove_partial(path):
+    """Remove a partially written output file, ignoring errors."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def compress_file(filepath, codec=None, level=None, threads=None, verify=False, throttle=None):
+    """
+    Compress the file using gzip for Linux and zip for Windows, or the given codec:
+      - gzip: single-threaded gzip (default level 9)
+      - pgzip: block-parallel multi-member gzip on `threads` threads (default level 6)
+      - zstd: zstandard, if installed (default level 3)
+      - zip: deflate in a zip archive (default level 9)
     Keeps the timestamp from the original file in the compressed file.
-    Returns the path to the compressed file.
+    With verify=True the output is decompressed and checked against the input's CRC32.
+    With a throttle (mtb.utils.throttle.Throttle), reads are rate-limited by it.
+    Returns the path to the compressed file. If compression fails, the partial
+    output is removed and the exception is re-raised.
     """
+    codec = get_codec(codec, level, threads, throttle)
     original_timestamp = os.path.getmtime(filepath)
-    system = platform.system()
-    
-    if system == "Windows":
-        # Use zip compression on Windows.
-        zip_path = f"{filepath}.zip"
-        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
-            info = zipfile.ZipInfo(os.path.basename(filepath))
-            dt = datetime.fromtimestamp(original_timestamp)
-            info.date_time = (dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
-            with open(filepath, 'rb') as f:
-                data = f.read()
-            zipf.writestr(info, data)
-        return zip_path
-    else:
-        # Use gzip compression on Linux.
-        gz_path = f"{filepath}.gz"
-        with open(filepath, 'rb') as f_in, gzip.open(gz_path, 'wb', mtime=original_timestamp) as f_out:
-            shutil.copyfileobj(f_in, f_out)
-        return gz_path
+    out_path = f"{filepath}{codec.extension}"
+
+    try:
+        size = os.path.getsize(filepath)
+        crc = codec.compress(filepath, out_path, original_timestamp)
+        if verify:
+            codec.verify(out_path, crc, size)
+    except BaseException:
+        remove_partial(out_path)
+        raise
+    return out_path
+
+def compress_worker(filepath, io_limit=None, io_share=1, **options):
+    """
+    compress_file() entry point for worker processes. io_limit is a throttle
+    configuration (see throttle.from_config) turned into one Throttle per process,
+    with its caps divided by io_share (see purge.process_files_parallel).
+    Returns (compressed path, compressed size in bytes).
+    """
+    out_path = compress_file(filepath, throttle=shared_throttle(io_limit, io_share), **options)
+    return out_path, os.path.getsize(out_path)
@@ -0,0 +1,194 @@
+import json
+import math
+import re
+from collections import Counter
+from mtb.utils.zabbix import item_key
+
+# Relative accuracy of the quantiles of LogSketch: a reported p99 is within 1% of a
+# value that really is at that rank.
+ACCURACY = 0.01
+# Buckets kept by a LogSketch; past this the lowest ones are merged (high quantiles,
+# the ones that matter for latencies, keep their accuracy). 2048 buckets at 1% cover
+# values from 1 to about 4e17.
+MAX_BUCKETS = 2048
+# Distinct values counted per "count" field; the others are counted as OTHER.
+MAX_VALUES = 100
+OTHER = "other"
+
+QUANTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+KINDS = ("stats", "count")
+
+class LogSketch:
+    """
+    Mergeable quantile sketch with logarithmic buckets (as DDSketch): a positive value v
+    is counted in bucket ceil(log(v) / log(gamma)), gamma = (1 + a) / (1 - a), and a
+    quantile is answered with the middle of its bucket, within a relative error a of
+    the true value. Memory is bounded by max_buckets whatever the number of values;
+    values <= 0 share one bucket. Count, min, max and sum are exact.
+    """
+    def __init__(self, accuracy=ACCURACY, max_buckets=MAX_BUCKETS):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.multiplier = 1 / math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = Counter()
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        """Add a list of floats."""
+        if not values:
+            return
+        self.count += len(values)
+        self.sum += math.fsum(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        log, ceil, multiplier = math.log, math.ceil, self.multiplier
+        positive = [ceil(log(v) * multiplier) for v in values if v > 0]
+        self.zero += len(values) - len(positive)
+        self.buckets.update(positive)
+        self._collapse()
+
+    def merge(self, other):
+        """Add the values of another sketch with the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches of different accuracy")
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero += other.zero
+        self.buckets.update(other.buckets)
+        self._collapse()
+
+    def _collapse(self):
+        if len(self.buckets) <= self.max_buckets:
+            return
+        keys = sorted(self.buckets)
+        excess = keys[:len(keys) - self.max_buckets + 1]
+        self.buckets[excess[-1]] += sum(self.buckets.pop(key) for key in excess[:-1])
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0..1), or None if the sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return min(max(0.0, self.min), self.max)
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def as_dict(self):
+        if not self.count:
+            return {"count": 0}
+        values = {"count": self.count, "min": self.min, "max": self.max, "mean": round(self.mean(), 3)}
+        values.update((name, round(self.quantile(q), 3)) for name, q in QUANTILES)
+        return values
+
+def field_regex(name):
+    """
+    Regex finding the value of a JSON key anywhere in a chunk of lines: a quoted string
+    (group 1, without unescaping) or a bare number/true/false/null (group 2). A key that
+    occurs in a nested object too is found there as well.
+    """
+    key = b'"' + re.escape(name.encode("utf-8")) + b'"'
+    # The key comes first so the regex engine can look for it as a literal; the
+    # lookbehind then rejects an escaped key inside a string value.
+    return re.compile(key + rb'(?<!\\' + key + rb')\s*:\s*(?:"([^"\\]*(?:\\.[^"\\]*)*)"|([^\s,}\]]+))')
+
+class FieldAggregator:
+    """
+    Aggregates of JSON log fields over an interval (one scan): for each "stats" field,
+    a LogSketch of its numeric values; for each "count" field, the count of each value
+    (at most MAX_VALUES distinct ones, then OTHER).
+
+    Values are taken from whole chunks with one regex per field (field_regex): lines
+    are never split or decoded and no dict is built, so the cost is a C-level search
+    per field plus a float() per value. Lines that are not JSON, or lack the field, and
+    non-numeric values of stats fields are simply not counted.
+    """
+    def __init__(self, fields):
+        self.fields = {}
+        for name, kind in fields.items():
+            if kind not in KINDS:
+                raise ValueError(f"Unknown aggregate {kind!r} for field {name} (expected one of {', '.join(KINDS)})")
+            self.fields[name] = (kind, field_regex(name))
+        self.sketches = {name: LogSketch() for name, (kind, _) in self.fields.items() if kind == "stats"}
+        self.counts = {name: Counter() for name, (kind, _) in self.fields.items() if kind == "count"}
+
+    def __bool__(self):
+        return bool(self.fields)
+
+    def feed(self, chunk):
+        """Add the values found in a chunk of complete lines."""
+        for name, (kind, regex) in self.fields.items():
+            found = regex.findall(chunk)
+            if not found:
+                continue
+            if kind == "count":
+                values = Counter()
+                for (quoted, bare), n in Counter(found).items():
+                    values[(quoted or bare).decode("utf-8", errors="replace")] += n
+                self._count(name, values)
+                continue
+            values = []
+            for quoted, bare in found:
+                try:
+                    value = float(quoted or bare)
+                except ValueError:
+                    continue    # null, true, a string
+                if math.isfinite(value):
+                    values.append(value)
+            self.sketches[name].update(values)
+
+    def _count(self, name, found):
+        counts = self.counts[name]
+        for value, n in found.items():
+            if value not in counts and len(counts) >= MAX_VALUES:
+                value = OTHER
+            counts[value] += n
+
+    def merge(self, other):
+        """Add the aggregates of another FieldAggregator over the same fields."""
+        for name, sketch in other.sketches.items():
+            self.sketches[name].merge(sketch)
+        for name, found in other.counts.items():
+            self._count(name, found)
+
+    def as_dict(self):
+        values = {name: sketch.as_dict() for name, sketch in self.sketches.items()}
+        values.update((name, dict(counts)) for name, counts in self.counts.items())
+        return values
+
+def field_aggregator(settings):
+    """Return a FieldAggregator for the "fields" of a logs.yaml entry (field name: stats or count), or None."""
+    fields = (settings or {}).get("fields")
+    if not fields:
+        return None
+    if not isinstance(fields, dict):
+        raise ValueError("fields must map each field name to stats or count")
+    return FieldAggregator(fields)
+
+def add_field_metrics(batch, path, aggregator):
+    """
+    Queue the aggregates of one scan: log.field.<stat>[<file>,<field>] for stats fields
+    (count, and min, max, mean, p50, p95, p99 when there were values) and, for count
+    fields, log.field.values[<file>,<field>]: one JSON object {value: count}, split in
+    Zabbix with dependent items (JSONPath $["500"]). The values are not known in
+    advance, so an item per value could not be discovered and the server would reject it.
+    """
+    for name, sketch in aggregator.sketches.items():
+        for stat, value in sketch.as_dict().items():
+            batch.add(item_key(f"log.field.{stat}", path, name), value)
+    for name, counts in aggregator.counts.items():
+        batch.add(item_key("log.field.values", path, name), json.dumps(counts, sort_keys=True))
@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import time
+from mtb.utils import config_parser, logger
+from mtb.utils.zabbix import item_key
+
+log = logger.get_logger()
+
+READ_SIZE = 4 * 1024 * 1024
+# Bytes at the start of a file remembered to tell a file rewritten in place (copytruncate
+# followed by new writes past the old offset) from the same file grown.
+HEAD_BYTES = 256
+# A "line" longer than this without a newline is scanned as it is.
+MAX_LINE = 1024 * 1024
+LAST_MATCH_CHARS = 2048
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    head BLOB NOT NULL
+);
+"""
+
+class OffsetStore:
+    """Persisted read position of each scanned log file: device, inode, offset and head bytes."""
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.executescript(SCHEMA)
+
+    def get(self, path):
+        """Return (device, inode, offset, head) of path, or None if never scanned."""
+        return self.db.execute("SELECT device, inode, offset, head FROM files WHERE path = ?", (path,)).fetchone()
+
+    def set(self, path, device, inode, offset, head):
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (path, device, inode, offset, head))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        """Close the store; offsets set since the last commit() are discarded."""
+        self.db.close()
+
+def open_store(path=None):
+    """Open the offset store configured in config.yaml (logfile_state_db, default ~/.mtb/logfile_state.db)."""
+    if path is None:
+        config = config_parser.load_config("config.yaml") or {}
+        path = config.get("logfile_state_db") or os.path.join("~", ".mtb", "logfile_state.db")
+    return OffsetStore(os.path.expanduser(path))
+
+def get_patterns(settings):
+    """Return the patterns of one logs.yaml entry as a list."""
+    patterns = (settings or {}).get("patterns") or []
+    return patterns if isinstance(patterns, list) else [patterns]
+
+class ScanResult:
+    """What one scan of a log file found: bytes and lines read, matches and last matching line per pattern."""
+    def __init__(self, path, patterns):
+        self.path = path
+        self.bytes = 0
+        self.lines = 0
+        self.counts = [0] * len(patterns)
+        self.last = [None] * len(patterns)
+        self.rotated = False
+        self.truncated = False
+        self.mtime = None
+        self.fields = None
+        # (device, inode, offset, head) reached by the scan, and for a file seen for the
+        # first time the one it started from (see LogScanner.save).
+        self.state = None
+        self.start_state = None
+
+    def as_dict(self, patterns):
+        return {
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "rotated": self.rotated,
+            "truncated": self.truncated,
+            "matches": dict(zip(patterns.patterns, self.counts)),
+            "fields": self.fields.as_dict() if self.fields is not None else None,
+        }
+
+def _read_head(f):
+    f.seek(0)
+    return f.read(HEAD_BYTES)
+
+def find_rotated(path, device, inode):
+    """Return the file next to path that has the given inode (the rotated log), or None."""
+    directory, name = os.path.split(path)
+    try:
+        with os.scandir(directory or ".") as entries:
+            for entry in entries:
+                if entry.name != name and entry.name.startswith(name) and entry.inode() == inode:
+                    if entry.stat().st_dev == device:
+                        return entry.path
+    except OSError:
+        pass
+    return None
+
+class LogScanner:
+    """
+    Incremental log scanner: reads only what was appended to each file since the last
+    scan, in READ_SIZE blocks, so the cost of a scan follows the new data, not the file
+    size. Only complete lines are consumed; a partial last line is read again next time.
+
+    The position is kept per path in an OffsetStore, with the device, inode and first
+    HEAD_BYTES of the file:
+      - another inode at the path means the file was rotated: the rest of the old file
+        is read first if it can be found next to it (same inode, e.g. app.log.1; a
+        file compressed at rotation is a new inode and cannot be resumed), then the new
+        file from the start;
+      - a file shorter than the offset, or whose first bytes changed, was truncated or
+        rewritten: it is read from the start.
+    A file seen for the first time is read from its end (only new lines count), or from
+    the start with from_start=True.
+
+    scan() does not move the stored position: save() does, once the caller knows what
+    became of the metrics of the scan.
+    """
+    def __init__(self, store, read_size=READ_SIZE):
+        self.store = store
+        self.read_size = read_size
+
+    def scan(self, path, patterns, from_start=False, fields=None):
+        """
+        Scan the new lines of path with patterns (a mtb.utils.pattern_matcher.PatternMatcher)
+        and, if given, feed them to fields (a mtb.utils.log_fields.FieldAggregator);
+        returns a ScanResult, or None if the file does not exist. The position reached
+        is only stored by save().
+        """
+        result = ScanResult(path, patterns)
+        result.fields = fields
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            st = os.fstat(f.fileno())
+            result.mtime = st.st_mtime
+            head = _read_head(f)
+            state = self.store.get(path)
+            if state is None:
+                offset = 0 if from_start else st.st_size
+                result.start_state = (st.st_dev, st.st_ino, offset, head)
+            else:
+                device, inode, offset, old_head = state
+                if (device, inode) != (st.st_dev, st.st_ino):
+                    result.rotated = True
+                    self._scan_rotated(path, device, inode, offset, patterns, result)
+                    offset = 0
+                elif st.st_size < offset or head[:len(old_head)] != old_head:
+                    result.truncated = True
+                    offset = 0
+            offset = self._scan_from(f, offset, patterns, result)
+        result.state = (st.st_dev, st.st_ino, offset, head)
+        return result
+
+    def save(self, result, delivered=True):
+        """
+        Store the position reached by a scan if its metrics were delivered. Otherwise
+        the previous position stays and the same lines are scanned again next time; a
+        file seen for the first time keeps the position it was first seen at, so the
+        lines written in the meantime are not skipped.
+        """
+        if delivered:
+            self.store.set(result.path, *result.state)
+        elif result.start_state is not None:
+            self.store.set(result.path, *result.start_state)
+
+    def _scan_rotated(self, path, device, inode, offset, patterns, result):
+        rotated = find_rotated(path, device, inode)
+        if rotated is None:
+            log.warning(f"{path} was rotated and its previous file was not found, lines after offset {offset} are skipped")
+            return
+        log.info(f"{path} was rotated, reading the rest of {rotated}")
+        try:
+            with open(rotated, "rb") as f:
+                self._scan_from(f, offset, patterns, result, final=True)
+        except OSError as e:
+            log.error(f"Error reading rotated log {rotated}: {e}")
+
+    def _scan_from(self, f, offset, patterns, result, final=False):
+        """Scan complete lines from offset on; returns the offset after the last complete line."""
+        f.seek(offset)
+        carry = b""
+        while True:
+            block = f.read(self.read_size)
+            if not block:
+                break
+            data = carry + block if carry else block
+            end = data.rfind(b"\n") + 1
+            if not end:
+                if len(data) < MAX_LINE:
+                    carry = data
+                    continue
+                end = len(data)
+            self._scan_chunk(data[:end] if end < len(data) else data, patterns, result)
+            offset += end
+            carry = data[end:]
+        if final and carry:
+            self._scan_chunk(carry, patterns, result)
+            offset += len(carry)
+        return offset
+
+    def _scan_chunk(self, chunk, patterns, result):
+        result.bytes += len(chunk)
+        result.lines += chunk.count(b"\n")
+        if result.fields is not None:
+            result.fields.feed(chunk)
+        for index, line in patterns.search(chunk):
+            result.counts[index] += 1
+            result.last[index] = line
+
+def add_metrics(batch, result, patterns, now=None):
+    """
+    Queue the metrics of one scan: log.bytes[<file>], log.age[<file>] (seconds since the
+    last write) and, per pattern, log.matches[<file>,<pattern>] (lines matched by this
+    scan) and log.last_match[<file>,<pattern>] when it matched.
+    """
+    now = time.time() if now is None else now
+    batch.add(item_key("log.bytes", result.path), result.bytes)
+    batch.add(item_key("log.age", result.path), int(now - result.mtime))
+    for pattern, count, line in zip(patterns.patterns, result.counts, result.last):
+        batch.add(item_key("log.matches", result.path, pattern), count)
+        if line is not None:
+            text = line.rstrip(b"\r").decode("utf-8", errors="replace")
+            batch.add(item_key("log.last_match", result.path, pattern), text[:LAST_MATCH_CHARS])
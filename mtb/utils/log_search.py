@@ -0,0 +1,252 @@
+import calendar
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mtb.utils import logger
+from mtb.utils.archive_bundle import BUNDLE_SUFFIX, INDEX_SUFFIX
+from mtb.utils.file_utils import open_compressed, original_mtime
+from mtb.utils.log_scanner import MAX_LINE, READ_SIZE
+from mtb.utils.pattern_matcher import PatternMatcher
+
+log = logger.get_logger()
+
+# An archive's mtime is the time of its last line, and the previous archive's mtime
+# bounds its first one; lines written slightly out of order are allowed this much.
+SLACK = 300
+# A matched line without a timestamp (a stack trace line) takes the one of the closest
+# line above it within this many lines.
+LOOKBACK_LINES = 50
+SAMPLE_CHARS = 512
+
+MONTHS = {month.encode(): number for number, month in enumerate(calendar.month_abbr) if month}
+
+# "2026-10-18 10:05" / "2026-10-18T10:05" (local time), "18/Oct/2026:10:05:00 +0200"
+# (access logs) and "Oct 18 10:05" (syslog, no year), near the start of a line.
+TIMESTAMP = re.compile(rb"(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d)"
+                       rb"|(\d\d)/([A-Z][a-z]{2})/(\d{4}):(\d\d):(\d\d):\d\d ([+-])(\d\d)(\d\d)"
+                       rb"|([A-Z][a-z]{2}) ([ \d]\d) (\d\d):(\d\d)")
+TIMESTAMP_WINDOW = 64
+
+def find_archives(log_path):
+    """
+    Return [(path, mtime, size)] of log_path and its rotated and compressed copies
+    (files of the same directory whose name starts with its name: app.log.1,
+    app.log.2026-10-11.gz...), oldest first. The mtime of a compressed file is the one
+    of the file it holds (see file_utils.original_mtime). Purge bundles are not searched.
+    """
+    directory, name = os.path.split(log_path)
+    files = []
+    try:
+        with os.scandir(directory or ".") as entries:
+            for entry in entries:
+                if not entry.name.startswith(name) or entry.name.endswith((BUNDLE_SUFFIX, INDEX_SUFFIX)):
+                    continue
+                try:
+                    if entry.is_file():
+                        files.append((entry.path, original_mtime(entry.path), entry.stat().st_size))
+                except (OSError, zipfile.BadZipFile) as e:
+                    log.error(f"Cannot read {entry.path}: {e}")
+    except OSError as e:
+        log.error(f"Cannot list {directory or '.'}: {e}")
+    return sorted(files, key=lambda f: f[1])
+
+def select_archives(files, since, until, slack=SLACK):
+    """
+    Keep the files of find_archives() whose lines can fall in [since, until): a file
+    holds the lines written between the previous file's mtime and its own, so it is
+    skipped when its mtime is before since or the previous mtime is after until.
+    Returns (selected, skipped).
+    """
+    selected, skipped = [], []
+    previous = float("-inf")
+    for path, mtime, size in files:
+        if mtime + slack < since or previous - slack >= until:
+            skipped.append(path)
+        else:
+            selected.append((path, mtime, size))
+        previous = mtime
+    return selected, skipped
+
+class LineClock:
+    """Epoch seconds (to the minute) of log lines, from the timestamp near their start."""
+    def __init__(self, mtime):
+        self.mtime = mtime
+        self.year = time.localtime(mtime).tm_year
+        self.cache = {}
+
+    def parse(self, line):
+        m = TIMESTAMP.search(line, 0, TIMESTAMP_WINDOW)
+        if m is None:
+            return None
+        key = m.group()
+        when = self.cache.get(key)
+        if when is None:
+            when = self._epoch(m)
+            if len(self.cache) > 100000:
+                self.cache.clear()
+            self.cache[key] = when
+        return when
+
+    def _epoch(self, m):
+        g = m.groups()
+        if g[0] is not None:
+            return time.mktime((int(g[0]), int(g[1]), int(g[2]), int(g[3]), int(g[4]), 0, 0, 0, -1))
+        if g[5] is not None:
+            month = MONTHS.get(g[6])
+            if month is None:
+                return None
+            offset = (int(g[11]) * 3600 + int(g[12]) * 60) * (-1 if g[10] == b"-" else 1)
+            return calendar.timegm((int(g[7]), month, int(g[5]), int(g[8]), int(g[9]), 0)) - offset
+        month = MONTHS.get(g[13])
+        if month is None:
+            return None
+        when = time.mktime((self.year, month, int(g[14]), int(g[15]), int(g[16]), 0, 0, 0, -1))
+        # No year in syslog lines: a date after the file's last write is from the year before.
+        if when > self.mtime + 86400:
+            when = time.mktime((self.year - 1, month, int(g[14]), int(g[15]), int(g[16]), 0, 0, 0, -1))
+        return when
+
+    def at(self, chunk, start):
+        """Time of the line starting at start, else of the closest timestamped line above it."""
+        for _ in range(LOOKBACK_LINES):
+            end = chunk.find(b"\n", start)
+            when = self.parse(chunk[start:end if end >= 0 else len(chunk)])
+            if when is not None or start == 0:
+                return when
+            start = chunk.rfind(b"\n", 0, start - 1) + 1
+        return None
+
+def search_file(path, patterns, since, until, samples=5):
+    """
+    Search one (possibly compressed) log file, streamed in READ_SIZE blocks, for the
+    patterns; only lines timed in [since, until) count, lines without a usable
+    timestamp take the file's mtime. Returns a dict with bytes, lines, counts
+    ({pattern index: {hour epoch: count}}), samples ({pattern index: [(epoch, line)]},
+    the first ones found) and error (None or the message). Runs in worker processes.
+    """
+    result = {"path": path, "bytes": 0, "lines": 0, "counts": {}, "samples": {}, "error": None}
+    try:
+        mtime = original_mtime(path)
+        matcher = PatternMatcher(patterns)
+        clock = LineClock(mtime)
+        with open_compressed(path) as f:
+            carry = b""
+            while True:
+                block = f.read(READ_SIZE)
+                data = carry + block if carry else block
+                if not block:
+                    chunk, carry = data, b""
+                else:
+                    end = data.rfind(b"\n") + 1
+                    if not end and len(data) < MAX_LINE:
+                        carry = data
+                        continue
+                    end = end or len(data)
+                    chunk, carry = data[:end], data[end:]
+                if chunk:
+                    _search_chunk(chunk, matcher, clock, since, until, samples, result)
+                if not block:
+                    break
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+def _search_chunk(chunk, matcher, clock, since, until, samples, result):
+    result["bytes"] += len(chunk)
+    result["lines"] += chunk.count(b"\n")
+    for index, start, end in matcher.spans(chunk):
+        line = chunk[start:end]
+        when = clock.parse(line)
+        if when is None and start > 0:
+            when = clock.at(chunk, start)
+        if when is None:
+            when = clock.mtime
+        if not since <= when < until:
+            continue
+        hours = result["counts"].setdefault(index, {})
+        hour = int(when // 3600 * 3600)
+        hours[hour] = hours.get(hour, 0) + 1
+        found = result["samples"].setdefault(index, [])
+        if len(found) < samples:
+            found.append((when, line.rstrip(b"\r").decode("utf-8", errors="replace")[:SAMPLE_CHARS]))
+
+class SearchResult:
+    """Per-hour match counts and sample lines of one log and its archives, merged over files."""
+    def __init__(self, log_path, patterns, samples=5):
+        self.log_path = log_path
+        self.patterns = list(patterns)
+        self.sample_limit = samples
+        self.counts = [{} for _ in self.patterns]
+        self.samples = [[] for _ in self.patterns]
+        self.files = 0
+        self.skipped = 0
+        self.errors = 0
+        self.bytes = 0
+        self.lines = 0
+
+    def merge(self, file_result):
+        if file_result["error"]:
+            log.error(f"Error searching {file_result['path']}: {file_result['error']}")
+            self.errors += 1
+            return
+        self.files += 1
+        self.bytes += file_result["bytes"]
+        self.lines += file_result["lines"]
+        for index, hours in file_result["counts"].items():
+            merged = self.counts[index]
+            for hour, count in hours.items():
+                merged[hour] = merged.get(hour, 0) + count
+        for index, found in file_result["samples"].items():
+            self.samples[index] = sorted(self.samples[index] + found)[:self.sample_limit]
+
+    def total(self, index):
+        return sum(self.counts[index].values())
+
+    def as_dict(self):
+        return {
+            "files": self.files,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "patterns": {
+                pattern: {
+                    "total": self.total(index),
+                    "hours": {time.strftime("%Y-%m-%d %H:00", time.localtime(hour)): count
+                              for hour, count in sorted(self.counts[index].items())},
+                    "samples": [line for _, line in self.samples[index]],
+                }
+                for index, pattern in enumerate(self.patterns)
+            },
+        }
+
+def search_logs(targets, since, until, workers=None, samples=5):
+    """
+    Search the archives of several logs: targets is {log path: [patterns]}. Files are
+    selected with select_archives() and searched in a pool of `workers` processes
+    (default: one per CPU; 1 searches in this process), largest first so the pool stays
+    busy. Returns {log path: SearchResult}.
+    """
+    results = {}
+    jobs = []
+    for log_path, patterns in targets.items():
+        result = results[log_path] = SearchResult(log_path, patterns, samples)
+        selected, skipped = select_archives(find_archives(log_path), since, until)
+        result.skipped = len(skipped)
+        jobs.extend((size, path, log_path) for path, _, size in selected)
+    jobs.sort(reverse=True)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        for _, path, log_path in jobs:
+            results[log_path].merge(search_file(path, results[log_path].patterns, since, until, samples))
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(search_file, path, results[log_path].patterns, since, until, samples): log_path
+                   for _, path, log_path in jobs}
+        for future in as_completed(futures):
+            results[futures[future]].merge(future.result())
+    return results
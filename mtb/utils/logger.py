@@ -1,63 +1,307 @@
+import atexit
 import logging
-from pythonjsonlogger import jsonlogger
-
-def get_logger():
-    logger = logging.getLogger("mtb")
-    if not logger.handlers:
-        handler = logging.StreamHandler()
-        formatter = jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(message)s')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
-    return logger
-
-
-import logging
+import logging.handlers
+import os
+import queue
+import re
 import sys
+import threading
+import time
+from datetime import date
 from pythonjsonlogger import jsonlogger
 import colorlog
 from mtb.utils import config_parser
 
-def get_global_log_level():
+JSON_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+DAILY_SUFFIX = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# Logging settings read from config.yaml, with their defaults.
+DEFAULT_SETTINGS = {
+    "log_level": "INFO",
+    "log_file": "mtb.log",
+    "log_console": True,
+    # Rotation (both modes): rotate when the file reaches log_max_bytes (0 = never) and/or
+    # when the day changes, keeping log_backup_count old files.
+    "log_max_bytes": 0,
+    "log_rotate_daily": False,
+    "log_backup_count": 7,
+    # Asynchronous mode: records go through a queue to a background writer that appends
+    # JSON lines in batches. It does not raise throughput (formatting still holds the
+    # GIL; benchmarks/logging_throughput.py measures it slightly below the synchronous
+    # mode), it keeps slow or stalled log writes off the threads that log.
+    "log_async": False,
+    "log_queue_size": 10000,
+    "log_batch_size": 512,
+    "log_flush_bytes": 256 * 1024,
+    "log_flush_interval": 1.0,
+    # When the queue is more than 80% full, keep only 1 DEBUG record out of
+    # log_debug_sample (0 drops them all). INFO and above are never dropped.
+    "log_debug_sample": 100,
+}
+
+_configure_lock = threading.Lock()
+_configured = False
+
+def get_log_settings():
+    """Return DEFAULT_SETTINGS overridden by the log_* keys of config.yaml."""
+    config = config_parser.load_config("config.yaml")
+    return {key: config.get(key, default) for key, default in DEFAULT_SETTINGS.items()}
+
+def _console_handler():
+    """Plain text handler with colored output to stdout."""
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_formatter = colorlog.ColoredFormatter(
+        fmt="%(log_color)s%(message)s%(reset)s",
+        log_colors={
+            "DEBUG": "grey",
+            "INFO": "white",
+            "WARNING": "yellow",
+            "ERROR": "red",
+            "CRITICAL": "red",
+        }
+    )
+    console_handler.setFormatter(console_formatter)
+    return console_handler
+
+def _file_handler(settings):
+    """Synchronous JSON file handler, rotating if rotation is configured."""
+    filename = settings["log_file"]
+    if settings["log_max_bytes"]:
+        handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=settings["log_max_bytes"], backupCount=settings["log_backup_count"])
+    elif settings["log_rotate_daily"]:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            filename, when="midnight", backupCount=settings["log_backup_count"])
+    else:
+        handler = logging.FileHandler(filename)
+    handler.setFormatter(jsonlogger.JsonFormatter(JSON_FORMAT))
+    return handler
+
+class BackpressureQueueHandler(logging.handlers.QueueHandler):
     """
-    Loads the global configuration using config_parser and returns the corresponding logging level.
-    Defaults to INFO if not set.
+    QueueHandler that never loses INFO and above (it blocks until the writer catches up),
+    and samples or drops DEBUG records when the queue is nearly full.
     """
-    config = config_parser.load_config("config.yaml")
-    level_str = config.get("log_level", "INFO")
-    return getattr(logging, level_str.upper(), logging.INFO)
+    def __init__(self, log_queue, debug_sample=100):
+        super().__init__(log_queue)
+        self.debug_sample = debug_sample
+        self.high_watermark = int(log_queue.maxsize * 0.8) if log_queue.maxsize > 0 else 0
+        self.dropped = 0
+        self._debug_seen = 0
+
+    def prepare(self, record):
+        # Cheaper than QueueHandler.prepare: merge args into the message in place instead
+        # of copying the record and running a formatter on the caller's thread.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if record.levelno > logging.DEBUG:
+            self.queue.put(record)
+            return
+        if self.high_watermark and self.queue.qsize() >= self.high_watermark:
+            self._debug_seen += 1
+            if not self.debug_sample or self._debug_seen % self.debug_sample:
+                self.dropped += 1
+                return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        writer = getattr(self, "writer", None)
+        if writer is not None:
+            writer.stop()
+        if self.dropped:
+            sys.stderr.write(f"mtb logger: dropped {self.dropped} DEBUG records under backpressure\n")
+            self.dropped = 0
+        super().close()
+
+class BatchingJSONWriter(threading.Thread):
+    """
+    Background thread that drains the log queue, formats records as JSON lines and appends
+    them to the log file in batches. A batch is written when it reaches flush_bytes or
+    when flush_interval seconds have passed since the last write. The file is rotated by
+    size (max_bytes) and/or by day, keeping backup_count old files.
+    """
+    def __init__(self, log_queue, filename, console_handler=None, batch_size=512,
+                 flush_bytes=256 * 1024, flush_interval=1.0, max_bytes=0,
+                 rotate_daily=False, backup_count=7):
+        super().__init__(name="mtb-log-writer", daemon=True)
+        self.queue = log_queue
+        self.filename = os.path.abspath(filename)
+        self.console_handler = console_handler
+        self.batch_size = batch_size
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.backup_count = backup_count
+        self.formatter = jsonlogger.JsonFormatter(JSON_FORMAT)
+        self._stream = None
+        self._size = 0
+        self._day = None
+        self._stopped = False
+
+    def run(self):
+        buffer = []
+        buffered = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                record = False
+            batch = [] if record is False else [record]
+            # Drain whatever else is already queued, up to one batch.
+            while record is not None and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(record)
+
+            for record in batch:
+                if record is None:
+                    continue
+                line = self._format(record)
+                buffer.append(line)
+                buffered += len(line)
+                if self.console_handler is not None:
+                    self.console_handler.handle(record)
+
+            stopping = None in batch
+            if buffer and (stopping or buffered >= self.flush_bytes
+                           or time.monotonic() - last_flush >= self.flush_interval):
+                self._write("".join(buffer), buffered)
+                buffer, buffered = [], 0
+            if buffer == [] or stopping:
+                last_flush = time.monotonic()
+            if stopping:
+                break
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def stop(self, timeout=10):
+        """Flush everything queued so far and stop the thread."""
+        if self._stopped or not self.is_alive():
+            return
+        self._stopped = True
+        self.queue.put(None)
+        self.join(timeout)
+
+    def _format(self, record):
+        try:
+            return self.formatter.format(record) + "\n"
+        except Exception:
+            return f'{{"levelname": "{record.levelname}", "message": "unformattable log record"}}\n'
+
+    def _open(self):
+        self._stream = open(self.filename, "a", encoding="utf-8")
+        self._size = self._stream.tell()
+        self._day = date.fromtimestamp(os.path.getmtime(self.filename)) if self._size else date.today()
+
+    def _should_rotate(self, incoming):
+        if self.max_bytes and self._size and self._size + incoming > self.max_bytes:
+            return True
+        return self.rotate_daily and self._day != date.today()
+
+    def _rotate(self):
+        self._stream.close()
+        self._stream = None
+        if self.rotate_daily and self._day != date.today():
+            target = f"{self.filename}.{self._day.isoformat()}"
+            if os.path.exists(target):
+                os.remove(target)
+            os.replace(self.filename, target)
+            self._remove_old_daily_files()
+        else:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{self.filename}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.filename}.{i + 1}")
+            if self.backup_count > 0:
+                os.replace(self.filename, f"{self.filename}.1")
+            else:
+                os.remove(self.filename)
+
+    def _remove_old_daily_files(self):
+        directory, base = os.path.split(self.filename)
+        prefix = base + "."
+        old = sorted(f for f in os.listdir(directory)
+                     if f.startswith(prefix) and DAILY_SUFFIX.fullmatch(f[len(prefix):]))
+        for name in old[:max(0, len(old) - self.backup_count)]:
+            os.remove(os.path.join(directory, name))
+
+    def _write(self, data, size):
+        try:
+            if self._stream is None:
+                self._open()
+            if self._should_rotate(size):
+                self._rotate()
+                self._open()
+            self._stream.write(data)
+            self._stream.flush()
+            self._size += size
+        except Exception as e:
+            sys.stderr.write(f"mtb logger: error writing {self.filename}: {e}\n")
+
+def configure_logger(logger, settings):
+    """
+    Attach the mtb handlers to logger according to settings (see DEFAULT_SETTINGS).
+    In asynchronous mode the logger gets a single BackpressureQueueHandler whose
+    BatchingJSONWriter thread does the file and console output: callers no longer wait
+    on the disk, but records cost about as much CPU as in synchronous mode.
+    """
+    level = settings["log_level"]
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    console_handler = _console_handler() if settings["log_console"] else None
+
+    if settings["log_async"]:
+        log_queue = queue.Queue(maxsize=settings["log_queue_size"])
+        handler = BackpressureQueueHandler(log_queue, settings["log_debug_sample"])
+        handler.writer = BatchingJSONWriter(
+            log_queue, settings["log_file"],
+            console_handler=console_handler,
+            batch_size=settings["log_batch_size"],
+            flush_bytes=settings["log_flush_bytes"],
+            flush_interval=settings["log_flush_interval"],
+            max_bytes=settings["log_max_bytes"],
+            rotate_daily=settings["log_rotate_daily"],
+            backup_count=settings["log_backup_count"],
+        )
+        handler.writer.start()
+        atexit.register(handler.close)
+        logger.addHandler(handler)
+    else:
+        if console_handler is not None:
+            logger.addHandler(console_handler)
+        logger.addHandler(_file_handler(settings))
+    return logger
 
 def get_logger():
     """
-    Configures and returns a logger that writes:
+    Configures (once per process) and returns a logger that writes:
       - JSON-formatted log messages to a file (mtb.log)
       - Plain text messages with colored output to stdout.
-    The logger's level is determined by the global configuration (config.yaml) using config_parser.
+    The logger's level and output mode are determined by the global configuration
+    (config.yaml) using config_parser; see DEFAULT_SETTINGS for the available keys.
     """
+    global _configured
     logger = logging.getLogger("mtb")
-    logger.setLevel(get_global_log_level())
-    
-    # Only add handlers if they haven't been added yet.
-    if not logger.handlers:
-        # Console handler with colored output.
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_formatter = colorlog.ColoredFormatter(
-            fmt="%(log_color)s%(message)s%(reset)s",
-            log_colors={
-                "DEBUG": "grey",
-                "INFO": "white",
-                "WARNING": "yellow",
-                "ERROR": "red",
-                "CRITICAL": "red",
-            }
-        )
-        console_handler.setFormatter(console_formatter)
-        logger.addHandler(console_handler)
-
-        # File handler with JSON formatting.
-        file_handler = logging.FileHandler("mtb.log")
-        json_formatter = jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(message)s')
-        file_handler.setFormatter(json_formatter)
-        logger.addHandler(file_handler)
-        
+    if _configured:
+        return logger
+    with _configure_lock:
+        if not _configured:
+            if not logger.handlers:
+                configure_logger(logger, get_log_settings())
+            _configured = True
     return logger
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+import threading
+from mtb.utils import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SEGMENT_PREFIX = "metrics-"
+SEGMENT_SUFFIX = ".spool"
+DOWN_MARKER = "server-down"
+LOCK_FILE = "replay.lock"
+
+class MetricSpool:
+    """
+    Append-only local spool for Zabbix items that could not be sent.
+
+    Items are appended as JSON lines ([host, key, value, clock]) to one segment file per
+    minute, with a single write per call. Segments of past minutes are sealed: nothing
+    appends to them any more, so replay() can send and remove them without coordinating
+    with writers. The spool is capped at max_bytes; when it grows past the cap, whole
+    segments are evicted oldest-first.
+
+    A marker file records when the server was last found unreachable, so that every
+    sender (across threads and processes) can spool immediately for retry_interval
+    seconds instead of waiting on a socket timeout each time; a successful send removes
+    it before then.
+    """
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, retry_interval=60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._current = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_path(self, minute):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{minute:012d}{SEGMENT_SUFFIX}")
+
+    def segments(self):
+        """Return the segment paths, oldest first."""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def sealed_segments(self):
+        """Return the segments no writer appends to any more, oldest first."""
+        current = self._segment_path(int(time.time() // 60))
+        return [path for path in self.segments() if path < current]
+
+    def size(self):
+        total = 0
+        for path in self.segments():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def append(self, items):
+        """Append (host, key, value, clock) items to the current segment."""
+        if not items:
+            return
+        data = "".join(json.dumps(list(item)) + "\n" for item in items).encode("utf-8")
+        path = self._segment_path(int(time.time() // 60))
+        with self._lock:
+            new_segment = path != self._current
+            self._current = path
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        if new_segment:
+            self.enforce_cap()
+
+    def enforce_cap(self):
+        """Evict whole segments, oldest first, until the spool fits in max_bytes."""
+        if not self.max_bytes:
+            return
+        sizes = []
+        for path in self.segments():
+            try:
+                sizes.append((path, os.path.getsize(path)))
+            except OSError:
+                pass
+        total = sum(size for _, size in sizes)
+        for path, size in sizes[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            logger.get_logger().warning(
+                f"Metric spool over {self.max_bytes} bytes, evicted {os.path.basename(path)} ({size} bytes)")
+
+    def mark_down(self):
+        """Record that the server is unreachable now."""
+        path = os.path.join(self.directory, DOWN_MARKER)
+        with open(path, "w") as f:
+            f.write(str(time.time()))
+
+    def mark_up(self):
+        """Record that the server answered: other senders stop spooling right away."""
+        try:
+            os.remove(os.path.join(self.directory, DOWN_MARKER))
+        except OSError:
+            pass
+
+    def server_down(self):
+        """True if the server was found unreachable less than retry_interval seconds ago."""
+        try:
+            marked = os.path.getmtime(os.path.join(self.directory, DOWN_MARKER))
+        except OSError:
+            return False
+        return time.time() - marked < self.retry_interval
+
+    def read_segment(self, path):
+        """Return the items of a segment, skipping lines that cannot be parsed."""
+        items = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    host, key, value, clock = json.loads(line)
+                except (ValueError, TypeError):
+                    continue
+                items.append((host, key, value, clock))
+        return items
+
+    def replay(self, send_items, batch_size=1000):
+        """
+        Send the sealed segments oldest-first through send_items(items), which must return
+        True when the items were delivered (or definitively rejected) and False when the
+        server could not be reached. Delivered segments are removed; on failure the unsent
+        remainder is written back and replay stops. Only one process replays at a time.
+        Returns the number of items sent.
+        """
+        lock = self._acquire_replay_lock()
+        if lock is False:
+            return 0
+        sent = 0
+        try:
+            for path in self.sealed_segments():
+                try:
+                    items = self.read_segment(path)
+                except OSError:
+                    continue
+                for start in range(0, len(items), batch_size):
+                    if not send_items(items[start:start + batch_size]):
+                        self._rewrite_segment(path, items[start:])
+                        return sent
+                    sent += min(batch_size, len(items) - start)
+                os.remove(path)
+            return sent
+        finally:
+            self._release_replay_lock(lock)
+
+    def _rewrite_segment(self, path, items):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(json.dumps(list(item)) + "\n" for item in items)
+        os.replace(tmp_path, path)
+
+    def _acquire_replay_lock(self):
+        if fcntl is None:
+            return None
+        f = open(os.path.join(self.directory, LOCK_FILE), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        return f
+
+    def _release_replay_lock(self, lock):
+        if lock:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
@@ -0,0 +1,303 @@
+import re
+
+try:
+    # Python 3.11+
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+# Literals shorter than this select too many lines to be worth prefiltering on.
+MIN_LITERAL = 3
+# Up to this many distinct literals, one bytes.find() pass per literal is faster than
+# a combined regex; above it, one pass of a trie-shaped alternation wins.
+FIND_LITERALS = 16
+# A literal seen more than once per DENSE_BYTES is not worth prefiltering on (see
+# PatternMatcher.calibrate), judged on the first SAMPLE_BYTES of data.
+DENSE_BYTES = 4096
+SAMPLE_BYTES = 256 * 1024
+MIN_SAMPLE = 64 * 1024
+
+_REPEATS = tuple(getattr(sre_constants, name) for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                 if hasattr(sre_constants, name))
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+
+def strip_wildcards(pattern):
+    """
+    Drop a leading and trailing ".*" from a pattern: whether a line contains a match
+    does not depend on them, and a leading ".*" makes the search retry the rest of the
+    line from every position ('.*Connection error.*' -> 'Connection error').
+    """
+    if "|" in pattern:
+        return pattern
+    core = pattern
+    if core.startswith(".*"):
+        core = core[2:].lstrip("?")
+    if core.endswith(".*"):
+        backslashes = len(core[:-2]) - len(core[:-2].rstrip("\\"))
+        if backslashes % 2 == 0:
+            core = core[:-2]
+    return core or pattern
+
+def _score(literals):
+    return min(map(len, literals)), -len(literals)
+
+def _required(sequence):
+    """Best set of strings one of which every match of the parsed sequence contains, or None."""
+    best = None
+    run = []
+
+    def consider(candidate):
+        nonlocal best
+        if candidate and all(candidate) and (best is None or _score(candidate) > _score(best)):
+            best = candidate
+
+    for op, av in sequence:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        consider({"".join(run)} if run else None)
+        run = []
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, _, sub = av
+            if not add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+                consider(_required(sub))
+        elif op is sre_constants.BRANCH:
+            branches = [_required(branch) for branch in av[1]]
+            if all(branches):
+                consider(set().union(*branches))
+        elif op in _REPEATS and av[0] >= 1:
+            consider(_required(av[2]))
+        elif _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+            consider(_required(av))
+    consider({"".join(run)} if run else None)
+    return best
+
+def required_literals(pattern):
+    """
+    Return a set of literal strings such that every line the pattern matches contains
+    at least one of them, or None if there is no useful one (all shorter than
+    MIN_LITERAL, or case-insensitive matching). The pattern is parsed with the re
+    module's own parser: runs of literal characters in a sequence are candidates,
+    alternations give the union of their branches' sets, and groups and repeats that
+    must occur at least once contribute their own set; the most selective set (longest
+    shortest literal) wins: "ERROR (timeout|refused) on db\\d+" gives {"timeout", "refused"}.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+    literals = _required(parsed)
+    if not literals or min(map(len, literals)) < MIN_LITERAL:
+        return None
+    return literals
+
+# Opcodes are ints of overlapping values: compared by identity.
+_LOOKAROUNDS = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+_STRING_ANCHORS = (sre_constants.AT_BEGINNING_STRING, sre_constants.AT_END_STRING)
+
+def _walk(value):
+    """Yield every (op, av) pair of a parsed pattern, nested ones included."""
+    if isinstance(value, sre_parse.SubPattern):
+        value = value.data
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            if isinstance(item, tuple) and len(item) == 2 and isinstance(item[0], sre_constants._NamedIntConstant):
+                yield item
+                yield from _walk(item[1])
+            else:
+                yield from _walk(item)
+
+def is_line_local(pattern):
+    """
+    True if searching a line inside a chunk (search(chunk, start, end), MULTILINE) finds
+    the same as searching the line alone: not so with \\A or \\Z (which only match at the
+    ends of the chunk) or lookarounds (which can see the lines around).
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return False
+    for op, av in _walk(parsed):
+        if any(op is code for code in _LOOKAROUNDS):
+            return False
+        if op is sre_constants.AT and any(av is code for code in _STRING_ANCHORS):
+            return False
+    return True
+
+def trie_regex(literals):
+    """One regex matching any of the literals (bytes), with common prefixes factored out."""
+    trie = {}
+    for literal in literals:
+        node = trie
+        for byte in literal:
+            node = node.setdefault(byte, {})
+        node[None] = {}
+
+    def build(node):
+        branches = [re.escape(bytes([byte])) + build(child)
+                    for byte, child in sorted((k, v) for k, v in node.items() if k is not None)]
+        if not branches:
+            return b""
+        body = branches[0] if len(branches) == 1 and None not in node else b"(?:" + b"|".join(branches) + b")"
+        return body + b"?" if None in node else body
+
+    return re.compile(build(trie))
+
+class PatternMatcher:
+    """
+    Compiled matcher for the pattern set of one log file, over bytes.
+
+    search(chunk) takes a chunk of complete lines and yields (pattern index, line) for
+    every line a pattern matches, once per line and pattern, in line order for each
+    pattern. Patterns with required literals (see required_literals) are prefiltered:
+    the chunk is searched once for all their literals together (bytes.find per literal
+    for a few of them, one trie-shaped alternation for many) and each full regex only
+    runs on the lines holding one of its literals. Patterns without a useful literal, or
+    whose literals turn out to be frequent in the data (see calibrate), are searched over
+    the whole chunk (MULTILINE, so ^ and $ are line anchors) and each hit is checked on
+    its own line. A line matches exactly when re.search() on that line alone would.
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.regexes = [re.compile(strip_wildcards(pattern).encode("utf-8"), re.MULTILINE)
+                        for pattern in self.patterns]
+        self.line_local = [is_line_local(pattern) for pattern in self.patterns]
+        self.literals = []
+        for pattern in self.patterns:
+            literals = required_literals(pattern)
+            if literals and any("\n" in literal for literal in literals):
+                literals = None     # found across lines, not on one: no line to prefilter
+            self.literals.append(tuple(sorted(literal.encode("utf-8") for literal in literals))
+                                 if literals else None)
+        self.calibrated = False
+        self._index([i for i, literals in enumerate(self.literals) if literals])
+
+    def _index(self, prefiltered):
+        self.prefiltered = prefiltered
+        self.unfiltered = [i for i in range(len(self.patterns)) if i not in prefiltered]
+        owners = {}
+        for i in self.prefiltered:
+            for literal in self.literals[i]:
+                owners.setdefault(literal, set()).add(i)
+        self.distinct = sorted(owners)
+        # A line holding a literal holds every literal that is a substring of it: the
+        # trie search reports only the longest literal at each position, so each
+        # literal maps to the patterns of all the literals it contains.
+        self.owners = {literal: frozenset(i for other, indexes in owners.items() if other in literal
+                                          for i in indexes)
+                       for literal in self.distinct}
+        self.finder = trie_regex(self.distinct) if len(self.distinct) > FIND_LITERALS else None
+
+    def calibrate(self, sample):
+        """
+        Stop prefiltering the patterns whose literals occur more than once per
+        DENSE_BYTES of sample ("HTTP/1." in an access log): visiting every line holding
+        them costs more than running their regex over the whole chunk. Done once, on the
+        first chunk of at least MIN_SAMPLE bytes.
+        """
+        sample = sample[:SAMPLE_BYTES]
+        if len(sample) < MIN_SAMPLE:
+            return
+        self.calibrated = True
+        limit = len(sample) // DENSE_BYTES
+        dense = {literal for literal in self.distinct if sample.count(literal) > limit}
+        if dense:
+            self._index([i for i in self.prefiltered if not dense.intersection(self.literals[i])])
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def candidate_lines(self, chunk):
+        """Return [(start, end, pattern indexes)] for the lines of chunk holding a literal, in order."""
+        found = {}
+        if self.finder is not None:
+            search, owners = self.finder.search, self.owners
+            start = end = -1
+            m = search(chunk)
+            while m:
+                pos = m.start()
+                if pos >= end:
+                    start = chunk.rfind(b"\n", 0, pos) + 1
+                    end = chunk.find(b"\n", pos)
+                    if end < 0:
+                        end = len(chunk)
+                    found[start] = [end, set()]
+                found[start][1].update(owners[m.group()])
+                # Restart right after the match start: literals may overlap.
+                m = search(chunk, pos + 1)
+        else:
+            for literal in self.distinct:
+                indexes = self.owners[literal]
+                pos = chunk.find(literal)
+                while pos >= 0:
+                    start = chunk.rfind(b"\n", 0, pos) + 1
+                    end = chunk.find(b"\n", pos + len(literal))
+                    if end < 0:
+                        end = len(chunk)
+                    entry = found.get(start)
+                    if entry is None:
+                        found[start] = [end, set(indexes)]
+                    else:
+                        entry[1].update(indexes)
+                    pos = chunk.find(literal, end)
+        return [(start, end, indexes) for start, (end, indexes) in sorted(found.items())]
+
+    def search(self, chunk):
+        """Yield (pattern index, line) for the lines of chunk the patterns match."""
+        for index, start, end in self.spans(chunk):
+            yield index, chunk[start:end]
+
+    def spans(self, chunk):
+        """Same as search(), as (pattern index, line start, line end) offsets into chunk."""
+        if not self.calibrated:
+            self.calibrate(chunk)
+        if self.prefiltered:
+            for start, end, indexes in self.candidate_lines(chunk):
+                for index in sorted(indexes):
+                    if self._line_matches(index, chunk, start, end):
+                        yield index, start, end
+        for index in self.unfiltered:
+            yield from self._chunk_spans(index, chunk)
+
+    def _line_matches(self, index, chunk, start, end):
+        if self.line_local[index]:
+            return self.regexes[index].search(chunk, start, end) is not None
+        return self.regexes[index].search(chunk[start:end]) is not None
+
+    def _chunk_spans(self, index, chunk):
+        """
+        Lines of chunk pattern index matches, searched over the whole chunk. A match may
+        run across lines (\\s, [^...]) or be empty at the very end, so the line where
+        each match starts is checked on its own, and the search resumes at the next line.
+        Every line matching on its own has a match starting in it or before, so no line
+        is skipped. Patterns that are not line_local are checked line by line.
+        """
+        size = len(chunk)
+        if not self.line_local[index]:
+            start = 0
+            while start < size:
+                end = chunk.find(b"\n", start)
+                if end < 0:
+                    end = size
+                if self._line_matches(index, chunk, start, end):
+                    yield index, start, end
+                start = end + 1
+            return
+        search = self.regexes[index].search
+        pos = 0
+        while pos < size:
+            m = search(chunk, pos)
+            if m is None:
+                return
+            start = chunk.rfind(b"\n", 0, m.start()) + 1
+            if start >= size:
+                return
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                end = size
+            if m.end() <= end or search(chunk, start, end):
+                yield index, start, end
+            pos = end + 1
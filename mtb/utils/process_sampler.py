@@ -0,0 +1,180 @@
+import re
+import time
+import psutil
+from mtb.utils import logger
+
+log = logger.get_logger()
+
+# Values sent per group as process.group.<metric>[<group name>].
+GROUP_METRICS = ("count", "cpu", "rss", "threads", "fds")
+
+class ProcessGroup:
+    """
+    Processes of one application, from processes.yaml: a process belongs to the group if
+    its name is one of `names` or its command line (arguments joined by spaces) matches
+    the `cmdline` regex.
+    """
+    def __init__(self, name, names=None, cmdline=None):
+        if not names and not cmdline:
+            raise ValueError(f"Process group {name} needs names or a cmdline regex")
+        self.name = name
+        self.names = frozenset([names] if isinstance(names, str) else names or ())
+        self.cmdline = re.compile(cmdline) if cmdline else None
+
+    def matches(self, name, cmdline):
+        return name in self.names or (self.cmdline is not None and cmdline is not None
+                                      and self.cmdline.search(cmdline) is not None)
+
+def load_groups(config):
+    """Return the ProcessGroups of a parsed processes.yaml, logging and skipping invalid ones."""
+    groups = []
+    for name, entry in ((config or {}).get("groups") or {}).items():
+        try:
+            entry = entry or {}
+            groups.append(ProcessGroup(name, entry.get("names"), entry.get("cmdline")))
+        except (AttributeError, TypeError, ValueError, re.error) as e:
+            log.error(f"Ignoring process group {name}: {e}")
+    return groups
+
+class _Tracked:
+    __slots__ = ("process", "group", "cpu", "read_at")
+
+    def __init__(self, process, group):
+        self.process = process
+        self.group = group
+        self.cpu = None
+        self.read_at = None
+
+class ProcessSampler:
+    """
+    Measures CPU usage over an interval with two passes over the process table, instead
+    of one pass of cpu_percent() (always 0.0 for a process not seen before).
+
+    psutil.Process handles are cached by pid between passes (and between samples, for a
+    long-lived sampler). Handles are not checked with is_running(), which costs another
+    read of /proc/<pid>/stat per process: a pid whose CPU time went down was reused by
+    another process and gets a new handle. Each process is matched against the groups
+    once, when first seen: the command line is only read if a group needs it. The first
+    pass only reads cpu_times(); the second reads cpu_times() and memory_info(), plus
+    the thread and open-FD counts for processes in a group, inside oneshot() (one
+    kinfo_proc/task_info call for all of them on BSD and macOS). CPU is the user + system time used between the
+    passes, in percent of one CPU, over the time between the two reads of that process
+    (a pass over thousands of processes takes long enough to matter); a process started
+    between the passes counts all its CPU time over the time since the first pass began.
+    """
+    def __init__(self, groups=()):
+        self.groups = list(groups)
+        self.need_cmdline = any(group.cmdline is not None for group in self.groups)
+        self.tracked = {}
+        self.denied = 0
+
+    def _classify(self, process):
+        if not self.groups:
+            return None
+        try:
+            name = process.name()
+            cmdline = " ".join(process.cmdline()) if self.need_cmdline else None
+        except psutil.AccessDenied:
+            name = cmdline = None
+        for group in self.groups:
+            if group.matches(name, cmdline):
+                return group
+        return None
+
+    def _track(self, pid):
+        process = psutil.Process(pid)
+        tracked = self.tracked[pid] = _Tracked(process, self._classify(process))
+        return tracked
+
+    def _read(self, tracked, final):
+        """(cpu seconds, rss, threads, fds) of a tracked process, from one oneshot() read."""
+        process = tracked.process
+        if not final:
+            # One value: oneshot() would only add the cost of its cache.
+            times = process.cpu_times()
+            return times.user + times.system, 0, 0, 0
+        with process.oneshot():
+            times = process.cpu_times()
+            cpu = times.user + times.system
+            if tracked.cpu is not None and cpu < tracked.cpu:
+                return cpu, 0, 0, 0
+            rss = process.memory_info().rss
+            threads = fds = 0
+            if tracked.group is not None:
+                threads = process.num_threads()
+                try:
+                    fds = process.num_fds()
+                except psutil.AccessDenied:
+                    self.denied += 1
+        return cpu, rss, threads, fds
+
+    def _pass(self, final):
+        """Read every process; returns {pid: (tracked, read at, cpu seconds, rss, threads, fds)}."""
+        seen = {}
+        for pid in psutil.pids():
+            tracked = self.tracked.get(pid)
+            try:
+                if tracked is None:
+                    tracked = self._track(pid)
+                values = self._read(tracked, final)
+                if tracked.cpu is not None and values[0] < tracked.cpu:
+                    # Less CPU time than before: the pid was reused by another process.
+                    tracked = self._track(pid)
+                    values = self._read(tracked, final)
+                seen[pid] = (tracked, time.monotonic()) + values
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                self.tracked.pop(pid, None)
+            except psutil.AccessDenied:
+                self.denied += 1
+        for pid in [pid for pid in self.tracked if pid not in seen]:
+            del self.tracked[pid]
+        return seen
+
+    def sample(self, interval=1.0):
+        """
+        Take two passes `interval` seconds apart; returns {"groups": {group name: {count,
+        cpu, rss, threads, fds}}, "top_cpu": %, "top_mem": bytes, "processes": n,
+        "seconds": time spent reading the process table}.
+        """
+        self.denied = 0
+        busy = time.perf_counter()
+        start = time.monotonic()
+        for tracked, read_at, cpu, _, _, _ in self._pass(False).values():
+            tracked.cpu = cpu
+            tracked.read_at = read_at
+        busy = time.perf_counter() - busy
+        time.sleep(interval)
+        busy -= time.perf_counter()
+        last = self._pass(True)
+        busy += time.perf_counter()
+
+        groups = {group.name: dict.fromkeys(GROUP_METRICS, 0) for group in self.groups}
+        top_cpu = 0.0
+        top_mem = 0
+        for tracked, read_at, cpu, rss, threads, fds in last.values():
+            if tracked.cpu is not None:
+                used, elapsed = cpu - tracked.cpu, read_at - tracked.read_at
+            else:
+                used, elapsed = cpu, read_at - start
+            percent = max(0.0, used / elapsed * 100) if elapsed > 0 else 0.0
+            tracked.cpu = cpu
+            tracked.read_at = read_at
+            top_cpu = max(top_cpu, percent)
+            top_mem = max(top_mem, rss)
+            if tracked.group is not None:
+                values = groups[tracked.group.name]
+                values["count"] += 1
+                values["cpu"] += percent
+                values["rss"] += rss
+                values["threads"] += threads
+                values["fds"] += fds
+        for values in groups.values():
+            values["cpu"] = round(values["cpu"], 2)
+        return {
+            "groups": groups,
+            "top_cpu": round(top_cpu, 2),
+            "top_mem": top_mem,
+            "processes": len(last),
+            "denied": self.denied,
+            "seconds": round(busy, 3),
+        }
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+from mtb.utils import config_parser, logger
+
+log = logger.get_logger()
+
+DAY = 86400
+
+# A directory whose mtime is this close to the moment it was stat'ed may still be
+# changing within the filesystem's timestamp granularity: it is never trusted.
+RACY_SECONDS = 2
+
+# Recorded directories are written in batches of this many, each in its own short
+# transaction, so the database is not kept locked for the whole walk.
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    oldest REAL,
+    newest REAL,
+    next_due REAL,
+    children TEXT NOT NULL
+);
+"""
+
+def rules_signature(rules, root):
+    """Hash of everything that decides which files match and when they are due."""
+    data = [os.path.abspath(root)] + [
+        [rule.pattern, rule.compress, rule.delete, rule.recursive, rule.priority,
+         sorted(rule.options.items(), key=lambda item: item[0])]
+        for rule in rules
+    ]
+    return hashlib.sha1(json.dumps(data, default=str).encode()).hexdigest()
+
+def next_due(mtime, rule, now):
+    """
+    Return when the file next crosses one of its rule's thresholds, or `now` if it has
+    crossed them all (it was not removed, e.g. after an error, so look again next run).
+    """
+    for days in sorted((rule.compress, rule.delete)):
+        due = mtime + days * DAY
+        if due > now:
+            return due
+    return now
+
+class PurgeIndex:
+    """
+    Persistent per-directory state for incremental purges, in a small sqlite database.
+
+    For every directory walked, the index keeps its mtime, the oldest and newest mtime of
+    the files a rule matched there, the earliest time one of those files crosses a
+    compress or delete threshold (next_due) and the names of its subdirectories.
+
+    A directory's mtime changes whenever an entry is added, removed or renamed in it, so
+    while the mtime is unchanged and next_due has not passed, its files cannot have
+    changed state and the directory is not read at all: the walk continues straight into
+    the recorded subdirectories, at the cost of one stat per directory instead of one per
+    file. Files whose content is rewritten do not change the directory mtime, but they
+    only get younger, which delays their thresholds; a file given an older mtime in place
+    is only seen on the next full run.
+
+    The index is tied to the rules and root it was built with (see rules_signature);
+    if they change it is cleared and the next walk is a full one. If the database fails
+    during the walk (locked by another purge for longer than its timeout, disk full...),
+    the error is logged and the rest of the walk reads every directory.
+    """
+    def __init__(self, path, signature, full=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.executescript(SCHEMA)
+        self.scanned = 0
+        self.skipped = 0
+        self.pending = []
+        self.failed = False
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if full or row is None or row[0] != signature:
+            with self.db:
+                self.db.execute("DELETE FROM directories")
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,))
+
+    def _fail(self, e):
+        log.error(f"Purge state database {self.path} failed, reading every directory from now on: {e}")
+        self.failed = True
+        self.pending = []
+
+    def unchanged_children(self, directory, now):
+        """
+        Return the recorded subdirectories of directory if it can be skipped, else None.
+        """
+        if self.failed:
+            return None
+        try:
+            row = self.db.execute(
+                "SELECT mtime_ns, next_due, children FROM directories WHERE path = ?",
+                (os.path.abspath(directory),)).fetchone()
+        except sqlite3.Error as e:
+            self._fail(e)
+            return None
+        if row is None:
+            return None
+        mtime_ns, due, children = row
+        try:
+            if os.stat(directory).st_mtime_ns != mtime_ns:
+                return None
+        except OSError:
+            return None
+        if due is not None and due <= now:
+            return None
+        self.skipped += 1
+        return [os.path.join(directory, name) for name in json.loads(children)]
+
+    def record(self, directory, mtime_ns, scanned_at, oldest, newest, due, children):
+        """Store the state of a directory that was just read."""
+        self.scanned += 1
+        if self.failed:
+            return
+        if scanned_at - mtime_ns / 1e9 < RACY_SECONDS:
+            mtime_ns = 0
+        self.pending.append((os.path.abspath(directory), mtime_ns, oldest, newest, due, json.dumps(children)))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write the directories recorded since the last flush, in one transaction."""
+        if self.failed or not self.pending:
+            return
+        try:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+        except sqlite3.Error as e:
+            self._fail(e)
+            return
+        self.pending = []
+
+    def close(self):
+        """Write the remaining recorded directories and close the database."""
+        try:
+            self.flush()
+        finally:
+            self.db.close()
+
+    def stats(self):
+        return {"dirs_scanned": self.scanned, "dirs_skipped": self.skipped}
+
+def open_index(rules, root=".", full=False, path=None):
+    """
+    Open the purge index configured in config.yaml (purge_state_db, default
+    ~/.mtb/purge_state.db; empty to disable). Returns None if disabled or unusable.
+    """
+    if path is None:
+        config = config_parser.load_config("config.yaml") or {}
+        path = config.get("purge_state_db", os.path.join("~", ".mtb", "purge_state.db"))
+    if not path:
+        return None
+    path = os.path.expanduser(path)
+    try:
+        return PurgeIndex(path, rules_signature(rules, root), full)
+    except (OSError, sqlite3.Error) as e:
+        log.error(f"Cannot use purge state database {path}, running a full purge: {e}")
+        return None
@@ -0,0 +1,161 @@
+import heapq
+import os
+import re
+import time
+from collections import namedtuple
+from mtb.utils import logger, purge_index
+
+log = logger.get_logger()
+
+# A file selected for purging: its path, the rule it matched and the mtime/size taken
+# from the directory scan.
+PurgeCandidate = namedtuple("PurgeCandidate", "path rule mtime size")
+
+class PurgeRule:
+    """
+    One entry of purge.yaml: a regex matched against each path (as "./dir/file") with
+    compress/delete thresholds in days. Rules are tried by descending priority, then in
+    file order; the first match owns the file. Keys other than the known ones are kept
+    in options for the stages that use them.
+    """
+    def __init__(self, pattern, compress, delete, recursive=False, priority=0, order=0, **options):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.compress = compress
+        self.delete = delete
+        self.recursive = recursive
+        self.priority = priority
+        self.order = order
+        self.options = options
+
+    def __repr__(self):
+        return f"PurgeRule({self.pattern!r}, compress={self.compress}, delete={self.delete})"
+
+def build_rules(configs):
+    """Build PurgeRules from a {pattern: params} mapping, in evaluation order."""
+    rules = [
+        PurgeRule(pattern, order=order, **params)
+        for order, (pattern, params) in enumerate(configs.items())
+    ]
+    rules.sort(key=lambda rule: (-rule.priority, rule.order))
+    return rules
+
+class RuleMatcher:
+    """
+    Matches a path against a list of rules with a single regex call: all patterns are
+    combined into one alternation of named groups, and the group that matched tells
+    which rule won. Alternatives are tried in order, so the first matching rule wins,
+    as with a loop over the rules. Falls back to that loop if the patterns cannot be
+    combined (e.g. numbered backreferences or inline flags).
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.combined = None
+        if len(rules) > 1:
+            try:
+                self.combined = re.compile("|".join(
+                    f"(?P<_rule{i}>{rule.pattern})" for i, rule in enumerate(rules)))
+            except re.error:
+                self.combined = None
+
+    def match(self, path):
+        """Return the first rule matching path, or None."""
+        if self.combined is not None:
+            m = self.combined.match(path)
+            if m is None:
+                return None
+            return self.rules[int(m.lastgroup[5:])]
+        for rule in self.rules:
+            if rule.regex.match(path):
+                return rule
+        return None
+
+def plan(rules, root=".", index=None, now=None):
+    """
+    Walk root once with os.scandir and yield a PurgeCandidate for every file matched by
+    a rule. Files directly in root are matched against every rule; files in
+    subdirectories only against recursive rules. The mtime and size come from the
+    DirEntry stat, so no extra stat call is needed later.
+
+    With a PurgeIndex (see purge_index), directories that have not changed since they
+    were last read and hold no file due before `now` are not read again; the state of
+    every directory that is read is recorded in the index.
+    """
+    now = time.time() if now is None else now
+    top_matcher = RuleMatcher(rules)
+    recursive_rules = [rule for rule in rules if rule.recursive]
+    deep_matcher = RuleMatcher(recursive_rules)
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        if index is not None:
+            children = index.unchanged_children(directory, now)
+            if children is not None:
+                if recursive_rules:
+                    stack.extend(children)
+                continue
+            try:
+                dir_mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError as e:
+                log.error(f"Error scanning {directory}: {e}")
+                continue
+        matcher = top_matcher if directory == root else deep_matcher
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            log.error(f"Error scanning {directory}: {e}")
+            continue
+        subdirs = []
+        oldest = newest = due = None
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        if recursive_rules:
+                            stack.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                rule = matcher.match(entry.path)
+                if rule is None:
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError as e:
+                    log.error(f"Error getting age for {entry.path}: {e}")
+                    continue
+                if index is not None:
+                    file_due = purge_index.next_due(st.st_mtime, rule, now)
+                    oldest = st.st_mtime if oldest is None else min(oldest, st.st_mtime)
+                    newest = st.st_mtime if newest is None else max(newest, st.st_mtime)
+                    due = file_due if due is None else min(due, file_due)
+                yield PurgeCandidate(entry.path, rule, st.st_mtime, st.st_size)
+        if index is not None:
+            index.record(directory, dir_mtime_ns, time.time(), oldest, newest, due, subdirs)
+
+def oldest_first(rules, root=".", heap_size=100000):
+    """
+    Yield the PurgeCandidates of plan() from the oldest mtime to the newest, holding at
+    most heap_size of them in memory: each walk keeps only the heap_size oldest files
+    newer than the last one yielded (in (mtime, path) order). The tree is walked again
+    only when a batch has been consumed and the previous walk found more files than fit,
+    so a caller that stops early never causes another walk.
+    """
+    watermark = None
+    while True:
+        seen = 0
+        def eligible():
+            nonlocal seen
+            for candidate in plan(rules, root):
+                if watermark is None or (candidate.mtime, candidate.path) > watermark:
+                    seen += 1
+                    yield candidate
+        batch = heapq.nsmallest(heap_size, eligible(), key=lambda c: (c.mtime, c.path))
+        for candidate in batch:
+            yield candidate
+        if seen <= heap_size or not batch:
+            return
+        watermark = (batch[-1].mtime, batch[-1].path)
@@ -0,0 +1,202 @@
+import os
+import re
+import threading
+import time
+from mtb.utils import logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+log = logger.get_logger()
+
+_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+def parse_rate(value):
+    """
+    Parse a rate such as 500, "500", "20M" or "1.5G" (binary units, per second).
+    Returns a float, or None for None/0 (no limit).
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) or None
+    m = re.fullmatch(r"\s*([0-9.]+)\s*([kKmMgG]?)[bB]?\s*", str(value))
+    if not m:
+        raise ValueError(f"Invalid rate: {value}")
+    return float(m.group(1)) * _UNITS[m.group(2).lower()] or None
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `burst` saved up.
+    consume(n) never refuses: it takes n tokens, possibly going into debt, and sleeps
+    until the debt is paid, so requests larger than the burst (e.g. a 4 MB block) work.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n=1, scale=1.0):
+        """Take n tokens at rate * scale; returns the seconds slept."""
+        rate = self.rate * scale
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * rate)
+            self.last = now
+            self.tokens -= n
+            wait = -self.tokens / rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+def set_idle_io_priority():
+    """
+    Put the current process in the idle I/O scheduling class (Linux, like `ionice -c3`),
+    so its disk I/O only runs when no other process needs the device. Returns True if set.
+    """
+    if psutil is None or not hasattr(psutil, "IOPRIO_CLASS_IDLE"):
+        log.debug("Idle I/O priority is not supported on this platform")
+        return False
+    try:
+        psutil.Process().ionice(psutil.IOPRIO_CLASS_IDLE)
+        return True
+    except (OSError, psutil.Error) as e:
+        log.warning(f"Cannot set idle I/O priority: {e}")
+        return False
+
+class DiskBusyMonitor:
+    """
+    Estimates how busy the disks are from psutil.disk_io_counters() busy_time (Linux):
+    the fraction of wall time the busiest device spent doing I/O since the last sample.
+    Samples at most once per `interval` seconds; returns 0.0 when it cannot tell.
+    """
+    def __init__(self, device=None, interval=1.0):
+        self.device = device
+        self.interval = interval
+        self.last_time = None
+        self.last_busy = None
+        self.utilization = 0.0
+        self._lock = threading.Lock()
+
+    def _busy_times(self):
+        counters = psutil.disk_io_counters(perdisk=True) if psutil is not None else None
+        if not counters:
+            return None
+        if self.device:
+            counters = {self.device: counters[self.device]} if self.device in counters else {}
+        return {name: getattr(c, "busy_time", None) for name, c in counters.items()}
+
+    def sample(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.last_time is not None and now - self.last_time < self.interval:
+                return self.utilization
+            busy = self._busy_times()
+            if busy is not None and self.last_busy is not None and now > self.last_time:
+                deltas = [busy[name] - self.last_busy[name] for name in busy
+                          if busy[name] is not None and self.last_busy.get(name) is not None]
+                if deltas:
+                    # busy_time is in milliseconds.
+                    self.utilization = min(1.0, max(deltas) / 1000.0 / (now - self.last_time))
+            self.last_time, self.last_busy = now, busy
+            return self.utilization
+
+class Throttle:
+    """
+    Shared I/O rate limiter for purge, compression and backup.
+
+    - bytes_per_second / ops_per_second: token-bucket caps; call read(n) for every
+      block of n bytes read or written and op() for every metadata operation (unlink,
+      rename...). Either may be None for no cap.
+    - idle: put the process in the idle I/O class (Linux) when the throttle is created.
+    - adaptive: watch the disk utilization (DiskBusyMonitor) and back off while it is
+      above busy_threshold: the caps are scaled down by half on every busy sample
+      (down to 1/16) and recover gradually when the disk is quiet; without caps, each
+      call sleeps for a backoff that doubles while the disk stays busy (up to 1s).
+
+    Throttles are thread-safe and meant to be shared by all the workers of one process.
+    """
+    def __init__(self, bytes_per_second=None, ops_per_second=None, idle=False, adaptive=False,
+                 busy_threshold=0.8, device=None):
+        self.bytes = TokenBucket(bytes_per_second) if bytes_per_second else None
+        self.ops = TokenBucket(ops_per_second) if ops_per_second else None
+        self.monitor = DiskBusyMonitor(device) if adaptive and psutil is not None else None
+        self.busy_threshold = busy_threshold
+        self.scale = 1.0
+        self.backoff = 0.0
+        self.slept = 0.0
+        if idle:
+            set_idle_io_priority()
+
+    def _adapt(self):
+        if self.monitor is None:
+            return 0.0
+        if self.monitor.sample() >= self.busy_threshold:
+            self.scale = max(1 / 16, self.scale / 2)
+            self.backoff = min(1.0, self.backoff * 2 or 0.01)
+        else:
+            self.scale = min(1.0, self.scale * 1.25)
+            self.backoff = 0.0
+        if self.backoff and self.bytes is None and self.ops is None:
+            time.sleep(self.backoff)
+            return self.backoff
+        return 0.0
+
+    def read(self, n):
+        """Account for n bytes of I/O, sleeping as needed."""
+        slept = self._adapt()
+        if self.bytes is not None:
+            slept += self.bytes.consume(n, self.scale)
+        self.slept += slept
+
+    def op(self, n=1):
+        """Account for n metadata operations, sleeping as needed."""
+        slept = self._adapt()
+        if self.ops is not None:
+            slept += self.ops.consume(n, self.scale)
+        self.slept += slept
+
+def from_config(io_limit, share=1):
+    """
+    Build a Throttle from an io_limit mapping (purge.yaml rule key):
+      bytes_per_second: e.g. 20M (optional)
+      ops_per_second: e.g. 500 (optional)
+      idle: true to use the idle I/O class (optional)
+      adaptive: true to back off while the disk is busy (optional)
+      busy_threshold: utilization that counts as busy, 0-1 (optional, default 0.8)
+      device: disk name to watch, e.g. sda (optional, default: the busiest)
+    The caps are divided by `share`, for limits split across worker processes.
+    Returns None if io_limit is empty.
+    """
+    if not io_limit:
+        return None
+    bytes_per_second = parse_rate(io_limit.get("bytes_per_second"))
+    ops_per_second = parse_rate(io_limit.get("ops_per_second"))
+    return Throttle(
+        bytes_per_second=bytes_per_second / share if bytes_per_second else None,
+        ops_per_second=ops_per_second / share if ops_per_second else None,
+        idle=bool(io_limit.get("idle")),
+        adaptive=bool(io_limit.get("adaptive")),
+        busy_threshold=float(io_limit.get("busy_threshold", 0.8)),
+        device=io_limit.get("device"),
+    )
+
+_throttles = {}
+_throttles_lock = threading.Lock()
+
+def shared(io_limit, share=1):
+    """
+    Return the process-wide Throttle for an io_limit mapping, so that every file of a
+    rule (and every rule with the same limits) draws from the same buckets.
+    """
+    if not io_limit:
+        return None
+    key = (repr(sorted(io_limit.items())), share, os.getpid())
+    with _throttles_lock:
+        if key not in _throttles:
+            _throttles[key] = from_config(io_limit, share)
+        return _throttles[key]
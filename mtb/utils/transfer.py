@@ -0,0 +1,194 @@
+import errno
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from mtb.utils import logger
+
+log = logger.get_logger()
+
+CHUNK = 8 * 1024 * 1024
+COPY_BUFFER = 1024 * 1024
+FSYNC_POLICIES = ("none", "file", "full")
+
+# errnos meaning "this copy method does not work for these two files": try the next one.
+UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+TransferResult = namedtuple("TransferResult", "source target bytes seconds method")
+
+def mb_per_second(nbytes, seconds):
+    return round(nbytes / 1024 / 1024 / seconds, 2) if seconds > 0 else 0.0
+
+def _copy_file_range(fd_in, fd_out, throttle):
+    copied = 0
+    while True:
+        n = os.copy_file_range(fd_in, fd_out, CHUNK)
+        if not n:
+            return copied
+        copied += n
+        if throttle is not None:
+            throttle.read(n)
+
+def _sendfile(fd_in, fd_out, throttle):
+    # With an explicit offset sendfile does not move fd_in: start from its position and
+    # leave it after the copied data, as the other methods do.
+    offset = os.lseek(fd_in, 0, os.SEEK_CUR)
+    copied = 0
+    while True:
+        n = os.sendfile(fd_out, fd_in, offset + copied, CHUNK)
+        if not n:
+            os.lseek(fd_in, offset + copied, os.SEEK_SET)
+            return copied
+        copied += n
+        if throttle is not None:
+            throttle.read(n)
+
+def _buffered(fd_in, fd_out, throttle):
+    copied = 0
+    with open(fd_in, "rb", buffering=0, closefd=False) as f_in, open(fd_out, "wb", closefd=False) as f_out:
+        while True:
+            block = f_in.read(COPY_BUFFER)
+            if not block:
+                return copied
+            if throttle is not None:
+                throttle.read(len(block))
+            f_out.write(block)
+            copied += len(block)
+
+# Tried in order; the kernel ones copy without going through Python buffers.
+METHODS = [(name, func) for name, func, available in (
+    ("copy_file_range", _copy_file_range, hasattr(os, "copy_file_range")),
+    ("sendfile", _sendfile, hasattr(os, "sendfile")),
+    ("buffered", _buffered, True),
+) if available]
+
+def copy_data(fd_in, fd_out, throttle=None):
+    """
+    Copy everything from fd_in (at its current position) to fd_out with the first
+    method that works for this pair of files. Returns (bytes copied, method name).
+    A method is only given up if it fails before copying anything.
+    """
+    start_in, start_out = os.lseek(fd_in, 0, os.SEEK_CUR), os.lseek(fd_out, 0, os.SEEK_CUR)
+    for name, func in METHODS[:-1]:
+        try:
+            return func(fd_in, fd_out, throttle), name
+        except OSError as e:
+            if e.errno not in UNSUPPORTED or os.lseek(fd_out, 0, os.SEEK_CUR) != start_out:
+                raise
+            os.lseek(fd_in, start_in, os.SEEK_SET)
+    name, func = METHODS[-1]
+    return func(fd_in, fd_out, throttle), name
+
+def fsync_directory(path):
+    """fsync a directory so a rename into it survives a crash (no-op where unsupported)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class TransferStats:
+    """Thread-safe totals of a TransferEngine: files, bytes, busy seconds and methods used."""
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.methods = {}
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            self.files += 1
+            self.bytes += result.bytes
+            self.seconds += result.seconds
+            self.methods[result.method] = self.methods.get(result.method, 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "files": self.files,
+                "bytes": self.bytes,
+                "mb_per_second": mb_per_second(self.bytes, self.seconds),
+                "methods": dict(self.methods),
+            }
+
+class TransferEngine:
+    """
+    Copies and moves files for file-watcher deliveries and the local backup engine.
+
+    - Data is copied in the kernel with os.copy_file_range (reflinks or server-side
+      copies where the filesystem supports them), else os.sendfile, else through a
+      1 MB buffer; see copy_data().
+    - The target is written under "<target>.<unique>.tmp" in the target directory and
+      renamed into place, so it never shows up partially written under its final name;
+      the source's mode and times are kept.
+    - fsync policy: "none"; "file" (default): fsync the data before the rename; "full":
+      also fsync the target directory after the rename.
+    - move() is a rename when source and target are on the same filesystem, else a copy
+      followed by the removal of the source.
+    - At most `concurrency` transfers run at once, however many threads call in.
+    - Each transfer returns a TransferResult (bytes, seconds, method) and is added to
+      `stats`; the optional throttle (mtb.utils.throttle.Throttle) limits the bandwidth.
+    """
+    def __init__(self, fsync="file", concurrency=4, throttle=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy {fsync!r}, expected one of {', '.join(FSYNC_POLICIES)}")
+        self.fsync = fsync
+        self.throttle = throttle
+        self.slots = threading.BoundedSemaphore(max(1, concurrency))
+        self.stats = TransferStats()
+
+    def _temp_path(self, target):
+        return f"{target}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+    def copy(self, source, target):
+        """Copy source to target atomically; returns a TransferResult."""
+        with self.slots:
+            start = time.monotonic()
+            nbytes, method = self._copy(source, target)
+            result = TransferResult(source, target, nbytes, time.monotonic() - start, method)
+        self.stats.record(result)
+        return result
+
+    def _copy(self, source, target):
+        tmp = self._temp_path(target)
+        try:
+            with open(source, "rb") as f_in, open(tmp, "wb") as f_out:
+                nbytes, method = copy_data(f_in.fileno(), f_out.fileno(), self.throttle)
+                if self.fsync != "none":
+                    os.fsync(f_out.fileno())
+            shutil.copystat(source, tmp)
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        if self.fsync == "full":
+            fsync_directory(os.path.dirname(os.path.abspath(target)))
+        return nbytes, method
+
+    def move(self, source, target):
+        """Move source to target: a rename if possible, else an atomic copy and unlink."""
+        with self.slots:
+            start = time.monotonic()
+            try:
+                os.replace(source, target)
+                nbytes, method = os.path.getsize(target), "rename"
+                if self.fsync == "full":
+                    fsync_directory(os.path.dirname(os.path.abspath(target)))
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                nbytes, method = self._copy(source, target)
+                os.remove(source)
+            result = TransferResult(source, target, nbytes, time.monotonic() - start, method)
+        self.stats.record(result)
+        return result
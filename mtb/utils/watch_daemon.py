@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from watchdog.observers import Observer
+from mtb.utils import config_parser, logger
+from mtb.utils.time_utils import parse_interval
+from mtb.utils.transfer import TransferEngine
+from mtb.utils.watch_pipeline import FileAction, FileFilter, WatchPipeline
+from mtb.utils.zabbix import MetricBatch
+
+log = logger.get_logger()
+
+CONFIG_FILE = "watchers.yaml"
+
+# Per-watcher values sent to Zabbix as file_watcher.<metric>[<watcher name>].
+METRICS = ("events", "released", "rejected", "processed", "errors", "queue_depth", "latency_p95")
+
+# Changing these means watching something else: the watcher is recreated, not reconfigured.
+LOCATION_KEYS = ("directory", "recursive")
+
+def _seconds(value, default):
+    return default if value is None else parse_interval(str(value))
+
+def watcher_settings(name, config):
+    """
+    Normalize the settings of one watchers.yaml entry; raises ValueError if invalid.
+    Sizes are in bytes, ages and quiet_period are intervals ("90s", "5m", 60...).
+    """
+    if not isinstance(config, dict) or not config.get("directory"):
+        raise ValueError(f"Watcher {name} needs a directory")
+    return {
+        "directory": os.path.expanduser(str(config["directory"])),
+        "recursive": bool(config.get("recursive", False)),
+        "min_size": int(config.get("min_size", 0)),
+        "max_size": float(config.get("max_size", float("inf"))),
+        "min_age": _seconds(config.get("min_age"), 60),
+        "max_age": _seconds(config.get("max_age"), float("inf")),
+        "min_files": int(config.get("min_files", 1)),
+        "max_files": int(config.get("max_files", 1)),
+        "quiet_period": _seconds(config.get("quiet_period"), 1.0),
+        "move_to": config.get("move_to"),
+        "copy_to": config.get("copy_to"),
+        "remove_extension": bool(config.get("remove_extension", False)),
+    }
+
+class WatcherDaemon:
+    """
+    Serves every watcher of watchers.yaml from one process: one watchdog Observer (one
+    inotify instance) with a schedule per directory, one WatchPipeline per watcher (its
+    own event queue and stable-file tracking) and one worker pool and TransferEngine
+    shared by all of them.
+
+    The file is checked for changes every reload_interval seconds (through the
+    ConfigStore, so an unchanged file costs one stat). On a change, watchers whose
+    directory is unchanged are reconfigured in place, keeping their queued events and
+    pending files; new watchers are started, removed ones stopped, and watchers whose
+    directory changed are recreated. A file that fails to parse leaves the running
+    watchers untouched; a watcher whose directory does not exist is skipped until the
+    file changes. workers, transfers and fsync are only read at start.
+
+    Every metrics_interval seconds (0 disables) each watcher's counters and queue depth
+    are sent to Zabbix in one batch (see METRICS).
+    """
+    def __init__(self, config_file=CONFIG_FILE, store=None):
+        self.config_file = config_file
+        self.store = store or config_parser.get_store()
+        self.config = None
+        self.observer = Observer()
+        self.watchers = {}    # name -> (settings, pipeline, ObservedWatch)
+        self.executor = None
+        self.transfer = None
+        self.reloads = 0
+        self._stop = threading.Event()
+
+    def _action(self, settings):
+        return FileAction(settings["move_to"], settings["copy_to"], settings["remove_extension"], self.transfer)
+
+    def _filter(self, settings):
+        return FileFilter(settings["min_size"], settings["max_size"], settings["min_age"], settings["max_age"])
+
+    def _add(self, name, settings):
+        if not os.path.isdir(settings["directory"]):
+            log.error(f"Cannot watch {settings['directory']} for {name}: not a directory")
+            return
+        pipeline = WatchPipeline(self._filter(settings), self._action(settings), quiet=settings["quiet_period"],
+                                 min_files=settings["min_files"], max_files=settings["max_files"],
+                                 executor=self.executor, name=name)
+        try:
+            watch = self.observer.schedule(pipeline.handler, path=settings["directory"],
+                                           recursive=settings["recursive"])
+        except OSError as e:
+            log.error(f"Cannot watch {settings['directory']} for {name}: {e}")
+            return
+        pipeline.start()
+        self.watchers[name] = (settings, pipeline, watch)
+        log.info(f"Watching {settings['directory']} as {name}")
+
+    def _remove(self, name):
+        _, pipeline, watch = self.watchers.pop(name)
+        # Watchers of the same directory (and recursive flag) share one ObservedWatch:
+        # only this watcher's handler goes, the watch itself with the last of them.
+        if any(other == watch for _, _, other in self.watchers.values()):
+            self.observer.remove_handler_for_watch(pipeline.handler, watch)
+        else:
+            self.observer.unschedule(watch)
+        pipeline.stop()
+        log.info(f"Stopped watcher {name}")
+
+    def apply(self, config):
+        """Bring the running watchers in line with a parsed watchers.yaml."""
+        wanted = {}
+        for name, entry in (config.get("watchers") or {}).items():
+            try:
+                wanted[name] = watcher_settings(name, entry)
+            except (TypeError, ValueError) as e:
+                log.error(f"Ignoring watcher {name}: {e}")
+        for name in [name for name in self.watchers if name not in wanted]:
+            self._remove(name)
+        for name, settings in wanted.items():
+            current = self.watchers.get(name)
+            if current is None:
+                self._add(name, settings)
+            elif current[0] == settings:
+                continue
+            elif all(current[0][key] == settings[key] for key in LOCATION_KEYS):
+                current[1].configure(self._filter(settings), self._action(settings), settings["quiet_period"],
+                                     settings["min_files"], settings["max_files"])
+                self.watchers[name] = (settings, current[1], current[2])
+                log.info(f"Reconfigured watcher {name}")
+            else:
+                self._remove(name)
+                self._add(name, settings)
+
+    def reload(self):
+        """Apply watchers.yaml again if it changed; returns True if it did."""
+        config = self.store.get(self.config_file)
+        if config is self.config:
+            return False
+        if not config:
+            log.error(f"{self.config_file} is empty or unreadable, keeping the current watchers")
+            return False
+        self.config = config
+        self.reloads += 1
+        self.apply(config)
+        return True
+
+    def metrics(self):
+        """Return {watcher name: counters, latency percentiles and queue_depth}."""
+        return {name: dict(pipeline.stats.as_dict(), queue_depth=pipeline.depth())
+                for name, (_, pipeline, _) in self.watchers.items()}
+
+    def send_metrics(self):
+        with MetricBatch() as batch:
+            for name, values in self.metrics().items():
+                for metric in METRICS:
+                    batch.add(f"file_watcher.{metric}[{name}]", values.get(metric, 0))
+        failed = [result for result in batch.results if not result.ok and not result.spooled]
+        if failed:
+            log.error(f"Failed to send {len(failed)} file watcher metrics")
+
+    def run(self, limit=None):
+        """Run until stop() is called or for `limit` seconds; metrics() stays valid afterwards."""
+        config = self.store.get(self.config_file)
+        if not config:
+            raise ValueError(f"No watchers configured in {self.config_file}")
+        workers = int(config.get("workers", 8))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mtb-watchers")
+        self.transfer = TransferEngine(config.get("fsync", "file"), int(config.get("transfers", 4)))
+        self.config = config
+        self.apply(config)
+        self.observer.start()
+        reload_interval = _seconds(config.get("reload_interval"), 10)
+        metrics_interval = _seconds(config.get("metrics_interval"), 60)
+        now = time.monotonic()
+        end = now + limit if limit else float("inf")
+        next_reload = now + reload_interval
+        next_metrics = now + metrics_interval if metrics_interval else float("inf")
+        try:
+            while not self._stop.is_set() and now < end:
+                self._stop.wait(max(0.0, min(next_reload, next_metrics, end) - now))
+                now = time.monotonic()
+                if now >= next_reload:
+                    self.reload()
+                    next_reload = now + reload_interval
+                if now >= next_metrics:
+                    self.send_metrics()
+                    next_metrics = now + metrics_interval
+        finally:
+            self.observer.stop()
+            self.observer.join()
+            for _, pipeline, _ in self.watchers.values():
+                pipeline.stop()
+            self.executor.shutdown(wait=True)
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,412 @@
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from watchdog.events import FileSystemEventHandler
+from mtb.utils import logger
+from mtb.utils.transfer import TransferEngine, mb_per_second
+
+log = logger.get_logger()
+
+# Events as queued by QueueingHandler: (kind, path, monotonic time).
+CHANGED = "changed"
+DELETED = "deleted"
+
+class QueueingHandler(FileSystemEventHandler):
+    """
+    Watchdog handler that only puts (kind, path, time) tuples on an unbounded queue, so
+    the observer thread never waits on filtering or file actions and no event is lost
+    however large the burst. Created, modified, closed-after-write and moved-in files
+    are "changed"; deleted and moved-out files are "deleted". Directory events are ignored.
+    """
+    def __init__(self, events):
+        self.events = events
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        now = time.monotonic()
+        kind = event.event_type
+        if kind in ("created", "modified", "closed"):
+            self.events.put((CHANGED, event.src_path, now))
+        elif kind == "deleted":
+            self.events.put((DELETED, event.src_path, now))
+        elif kind == "moved":
+            self.events.put((DELETED, event.src_path, now))
+            self.events.put((CHANGED, event.dest_path, now))
+
+class FileFilter:
+    """
+    The file-watcher filters. check(path) returns:
+      - ("accept", None) if the file passes;
+      - ("wait", seconds) if it is younger than min_age: check again that much later;
+      - ("reject", reason) otherwise (gone, too small or large, older than max_age).
+    A rejected file that changes again is checked again on its next event.
+    """
+    def __init__(self, min_size=0, max_size=float("inf"), min_age=0, max_age=float("inf")):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_age = min_age
+        self.max_age = max_age
+
+    def check(self, path, now=None, st=None):
+        try:
+            st = st or os.stat(path)
+        except FileNotFoundError:
+            return "reject", "gone"
+        age = (time.time() if now is None else now) - st.st_mtime
+        if age > self.max_age:
+            return "reject", f"older than {self.max_age}s"
+        if not self.min_size <= st.st_size <= self.max_size:
+            return "reject", f"size {st.st_size} outside [{self.min_size}, {self.max_size}]"
+        if age < self.min_age:
+            return "wait", self.min_age - age
+        return "accept", None
+
+def strip_extension(name):
+    """Remove the last extension of a file name ("a.csv.part" -> "a.csv"); names without one are kept."""
+    base, ext = os.path.splitext(name)
+    return base if ext else name
+
+class FileAction:
+    """
+    What file-watcher does with an accepted file: copy it to copy_to, then move it to
+    move_to, optionally dropping its last extension in the target name; with neither
+    directory, remove_extension renames it in place. Without any option the file is only
+    logged. Copies and cross-filesystem moves go through a TransferEngine (zero-copy,
+    atomic, fsync policy, bounded concurrency). targets() tells the pipeline in advance which paths apply() will create, so
+    it can ignore the events they raise in a watched directory.
+    """
+    def __init__(self, move_to=None, copy_to=None, remove_extension=False, transfer=None):
+        self.move_to = move_to
+        self.copy_to = copy_to
+        self.remove_extension = remove_extension
+        self.transfer = transfer or TransferEngine()
+
+    def targets(self, path):
+        """Return the (copy target, move or rename target) of path; either may be None."""
+        name = os.path.basename(path)
+        if self.remove_extension:
+            name = strip_extension(name)
+        copy_target = os.path.join(self.copy_to, name) if self.copy_to else None
+        if self.move_to:
+            move_target = os.path.join(self.move_to, name)
+        elif name != os.path.basename(path):
+            move_target = os.path.join(os.path.dirname(path), name)
+        else:
+            move_target = None
+        return copy_target, move_target
+
+    def apply(self, path):
+        copy_target, move_target = self.targets(path)
+        if copy_target:
+            self._log("Copied", self.transfer.copy(path, copy_target))
+        if move_target:
+            self._log("Moved", self.transfer.move(path, move_target))
+        if not copy_target and not move_target:
+            log.info(f"File ready: {path}")
+
+    def _log(self, verb, result):
+        log.info(f"{verb} {result.source} to {result.target} ({result.bytes} bytes in {result.seconds:.3f}s, "
+                 f"{mb_per_second(result.bytes, result.seconds)} MB/s, {result.method})")
+
+class WatchStats:
+    """Thread-safe counters of a watch pipeline; latencies are kept for the last 10000 files."""
+    def __init__(self):
+        self.events = 0
+        self.released = 0
+        self.rejected = 0
+        self.processed = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=10000)
+        self._lock = threading.Lock()
+
+    def add(self, field, n=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def record_processed(self, latency):
+        with self._lock:
+            self.processed += 1
+            self.latencies.append(latency)
+
+    def as_dict(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            result = {
+                "events": self.events,
+                "released": self.released,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "errors": self.errors,
+            }
+        if latencies:
+            result["latency_p50"] = round(latencies[len(latencies) // 2], 4)
+            result["latency_p95"] = round(latencies[int(len(latencies) * 0.95)], 4)
+            result["latency_max"] = round(latencies[-1], 4)
+        return result
+
+class TimerWheel:
+    """
+    Hashed timer wheel: `slots` buckets of `tick` seconds. A timer due at absolute tick t
+    sits in bucket t % slots; advance(now) expires the buckets of the ticks elapsed since
+    the last call, leaving in place the timers due on a later turn of the wheel.
+    Scheduling and cancelling are O(1) and a tick only looks at its own bucket: the
+    timers due plus those of later turns that share the bucket. With slots * tick
+    covering the usual delays (51s by default) the latter stay few, so a tick costs
+    about the timers it expires, never a pass over every pending file.
+
+    Items carry their own bookkeeping in a `due` attribute (None when not scheduled; set
+    it to None to cancel). A rescheduled item may leave a stale reference in its previous
+    bucket; it is dropped when that bucket comes round.
+    """
+    def __init__(self, tick=0.05, slots=1024, now=None):
+        self.tick = tick
+        self.slots = slots
+        self.origin = time.monotonic() if now is None else now
+        self.current = 0    # next tick to expire
+        self.buckets = [[] for _ in range(slots)]
+
+    def schedule(self, item, delay, now):
+        due = max(self.current, math.ceil((now + delay - self.origin) / self.tick))
+        old = item.due
+        item.due = due
+        if old is None or old % self.slots != due % self.slots:
+            self.buckets[due % self.slots].append(item)
+
+    def next_expiry(self):
+        """Monotonic time at which the next tick can be expired."""
+        return self.origin + self.current * self.tick
+
+    def _expire(self, index, upto, expired):
+        bucket = self.buckets[index]
+        if not bucket:
+            return
+        keep = []
+        for item in bucket:
+            due = item.due
+            if due is None or due % self.slots != index:
+                continue
+            if due <= upto:
+                item.due = None
+                expired.append(item)
+            else:
+                keep.append(item)
+        self.buckets[index] = keep
+
+    def advance(self, now):
+        """Return the items due at or before now."""
+        target = int((now - self.origin) / self.tick)
+        expired = []
+        if target - self.current >= self.slots:
+            # Fell behind by more than a turn: one pass over every bucket.
+            for index in range(self.slots):
+                self._expire(index, target, expired)
+            self.current = target + 1
+        while self.current <= target:
+            self._expire(self.current % self.slots, self.current, expired)
+            self.current += 1
+        return expired
+
+class PendingFile:
+    """A file waiting to become stable, kept small with __slots__ (tens of thousands may be in flight)."""
+    __slots__ = ("path", "first_seen", "last_event", "size", "mtime_ns", "due")
+
+    def __init__(self, path, when, st):
+        self.path = path
+        self.first_seen = when
+        self.last_event = when
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.due = None
+
+class WatchPipeline:
+    """
+    Event pipeline behind file-watcher:
+
+      observer thread -> QueueingHandler -> event queue (unbounded, never blocks)
+        -> coalescer thread: tracks every changed path until it is stable, runs the
+           FileFilter (files younger than min_age are rescheduled, not dropped) and
+           groups accepted files in batches of min_files..max_files
+        -> bounded worker pool: applies the FileAction to each file of a batch.
+
+    A file is stable once it has had no events and its size and mtime have not changed
+    for `quiet` seconds: a file still being written (even on a filesystem that raises
+    no modify events) is not handed to the actions. Pending files sit in a TimerWheel:
+    events only update the file's last event time, and the file is looked at (one stat)
+    when its timer expires, then either released or rescheduled. The coalescer keeps one
+    compact PendingFile per path, however many events the path gets.
+
+    At most `workers * 2` batches are queued for the pool; beyond that the coalescer
+    waits for the workers, while new events keep accumulating in the event queue, so the
+    observer is never blocked. A shared executor may be passed in (one pool for several
+    pipelines).
+    """
+    def __init__(self, file_filter, action, quiet=1.0, workers=4, min_files=1, max_files=1,
+                 executor=None, name="file-watcher", tick=None):
+        self.name = name
+        self.configure(file_filter, action, quiet, min_files, max_files)
+        self.events = queue.SimpleQueue()
+        self.handler = QueueingHandler(self.events)
+        self.stats = WatchStats()
+        self.pending = {}    # path -> PendingFile
+        self.wheel = TimerWheel(tick or max(0.01, min(0.1, quiet / 4)))
+        self.ready = []      # accepted (path, first event time) waiting for min_files
+        self.ignored = {}    # paths created by the actions -> expiry
+        self._ignored_lock = threading.Lock()
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"mtb-{name}")
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def configure(self, file_filter, action, quiet, min_files=1, max_files=1):
+        """
+        Set the filter, action, quiet period and batch sizes. May be called while the
+        pipeline runs (configuration reload): queued events and pending files are kept
+        and handled with the new settings.
+        """
+        self.filter = file_filter
+        self.action = action
+        self.quiet = quiet
+        self.min_files = max(1, min_files)
+        self.max_files = max(self.min_files, max_files)
+
+    def depth(self):
+        """Events not yet looked at plus files waiting to be stable or batched."""
+        return self.events.qsize() + len(self.pending) + len(self.ready)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"mtb-{self.name}-coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop the coalescer (and the pool, if it is the pipeline's own); returns the number
+        of paths left pending, including those of events still queued.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._own_executor:
+            self.executor.shutdown(wait=wait)
+        self._take_queued()
+        left = len(self.pending) + len(self.ready)
+        if left:
+            log.warning(f"{self.name}: stopped with {left} files not processed yet")
+        return left
+
+    def _run(self):
+        while not self._stop.is_set():
+            timeout = 0.5
+            if self.pending:
+                timeout = min(timeout, max(0.0, self.wheel.next_expiry() - time.monotonic()))
+            try:
+                self._on_event(*self.events.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            else:
+                self._take_queued()
+            self._release_due(time.monotonic())
+
+    def _take_queued(self):
+        """Handle every event already queued, in one go."""
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+            self._on_event(*event)
+
+    def _on_event(self, kind, path, when):
+        self.stats.add("events")
+        if self._is_ignored(path, when):
+            return
+        if kind == DELETED:
+            entry = self.pending.pop(path, None)
+            if entry is not None:
+                entry.due = None
+            return
+        entry = self.pending.get(path)
+        if entry is not None:
+            # No rescheduling here: the timer checks last_event when it expires.
+            entry.last_event = when
+            return
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        entry = self.pending[path] = PendingFile(path, when, st)
+        self.wheel.schedule(entry, self.quiet, when)
+
+    def _is_ignored(self, path, when):
+        if not self.ignored:
+            return False
+        with self._ignored_lock:
+            expiry = self.ignored.get(path)
+            if expiry is None:
+                return False
+            if expiry < when:
+                del self.ignored[path]
+                return False
+            return True
+
+    def _release_due(self, now):
+        for entry in self.wheel.advance(now):
+            if self.pending.get(entry.path) is entry:
+                self._check(entry, now)
+        self._dispatch()
+
+    def _check(self, entry, now):
+        quiet_until = entry.last_event + self.quiet
+        if quiet_until > now:
+            self.wheel.schedule(entry, quiet_until - now, now)
+            return
+        try:
+            st = os.stat(entry.path)
+        except FileNotFoundError:
+            del self.pending[entry.path]
+            return
+        if st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns:
+            entry.size, entry.mtime_ns = st.st_size, st.st_mtime_ns
+            self.wheel.schedule(entry, self.quiet, now)
+            return
+        verdict, detail = self.filter.check(entry.path, st=st)
+        if verdict == "wait":
+            self.wheel.schedule(entry, detail, now)
+            return
+        del self.pending[entry.path]
+        if verdict == "reject":
+            self.stats.add("rejected")
+            log.debug(f"{self.name}: skipped {entry.path}: {detail}")
+            return
+        self.stats.add("released")
+        self.ready.append((entry.path, entry.first_seen))
+
+    def _dispatch(self):
+        while len(self.ready) >= self.min_files:
+            batch, self.ready = self.ready[:self.max_files], self.ready[self.max_files:]
+            self.slots.acquire()
+            self.executor.submit(self._process, batch)
+
+    def _process(self, batch):
+        try:
+            for path, first_seen in batch:
+                produced = [target for target in self.action.targets(path) if target]
+                if produced:
+                    expiry = time.monotonic() + max(5.0, self.quiet * 4)
+                    with self._ignored_lock:
+                        for target in produced:
+                            self.ignored[target] = expiry
+                try:
+                    self.action.apply(path)
+                except Exception as e:
+                    log.error(f"{self.name}: error handling {path}: {e}")
+                    self.stats.add("errors")
+                    continue
+                self.stats.record_processed(time.monotonic() - first_seen)
+        finally:
+            self.slots.release()
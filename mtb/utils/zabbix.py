@@ -1,32 +1,247 @@
+import os
+import time
+import threading
+from collections import namedtuple
 from mtb.utils import config_parser, logger
-from zabbix_utils import ZabbixSender  # Make sure zabbix_utils is installed
+from mtb.utils.metric_spool import MetricSpool
+from zabbix_utils import Sender, ItemValue  # Make sure zabbix_utils is installed
 
-def send_metric(key, value, host=None):
+DEFAULT_CHUNK_SIZE = 250
+DEFAULT_SPOOL_DIR = os.path.join(os.path.expanduser("~"), ".mtb", "spool")
+
+# Outcome of one item. The trapper protocol only reports processed/failed counts per
+# request, so every item of a chunk carries that chunk's response: ok is True when the
+# whole chunk was processed, False when the chunk failed or could not be sent. spooled
+# is True when the item was kept in the local spool to be replayed later.
+MetricResult = namedtuple("MetricResult", "host key value clock ok chunk response spooled",
+                          defaults=(False,))
+
+_spools = {}
+_spools_lock = threading.Lock()
+
+def item_key(name, *params):
+    """
+    Build an item key such as log.matches["/var/log/app.log","ERROR [0-9]+"]. Parameters
+    containing a comma, bracket, quote or leading space are quoted, with '"' escaped.
     """
-    Sends a metric to Zabbix using the zabbix_utils library.
-    Global configuration is read from config.yaml:
+    if not params:
+        return name
+    quoted = []
+    for param in map(str, params):
+        if any(c in param for c in ',[]"') or param.startswith(" "):
+            param = '"' + param.replace('"', '\\"') + '"'
+        quoted.append(param)
+    return f"{name}[{','.join(quoted)}]"
+
+def get_zabbix_settings():
+    """
+    Returns the Zabbix sender settings from config.yaml:
       - zabbix_server: Zabbix server address (default: 127.0.0.1)
       - zabbix_port: Zabbix port (default: 10051)
       - zabbix_host: The host name as registered in Zabbix (default: mtb-host)
-    
+      - zabbix_chunk_size: Items per trapper request (default: 250)
+      - zabbix_timeout: Socket timeout in seconds (default: 10)
+      - zabbix_connect_timeout: Timeout of the TCP connection to the server in seconds
+        (default: 2), so an unreachable server is spooled for quickly
+      - zabbix_spool_dir: Spool for values that could not be sent (default: ~/.mtb/spool;
+        empty to disable spooling)
+      - zabbix_spool_max_bytes: Spool size cap, oldest values are evicted first (default: 64 MB)
+      - zabbix_retry_interval: Seconds to spool without trying the server after a failed
+        send (default: 60)
+      - zabbix_replay_batch_size: Spooled items per request when replaying (default: 1000)
+    """
+    config = config_parser.load_config("config.yaml")
+    return {
+        "server": config.get("zabbix_server", "127.0.0.1"),
+        "port": config.get("zabbix_port", 10051),
+        "host": config.get("zabbix_host", "mtb-host"),
+        "chunk_size": config.get("zabbix_chunk_size", DEFAULT_CHUNK_SIZE),
+        "timeout": config.get("zabbix_timeout", 10),
+        "connect_timeout": config.get("zabbix_connect_timeout", 2),
+        "spool_dir": config.get("zabbix_spool_dir", DEFAULT_SPOOL_DIR),
+        "spool_max_bytes": config.get("zabbix_spool_max_bytes", 64 * 1024 * 1024),
+        "retry_interval": config.get("zabbix_retry_interval", 60),
+        "replay_batch_size": config.get("zabbix_replay_batch_size", 1000),
+    }
+
+def get_spool(settings=None):
+    """Return the process-wide MetricSpool for the configured directory, or None if disabled."""
+    settings = settings or get_zabbix_settings()
+    directory = os.path.expanduser(settings["spool_dir"] or "")
+    if not directory:
+        return None
+    with _spools_lock:
+        spool = _spools.get(directory)
+        if spool is None:
+            try:
+                spool = MetricSpool(directory, settings["spool_max_bytes"], settings["retry_interval"])
+            except OSError as e:
+                logger.get_logger().error(f"Cannot use metric spool {directory}: {e}")
+                return None
+            _spools[directory] = spool
+        return spool
+
+class MetricBatch:
+    """
+    Collects (host, key, value, clock) items and sends them to Zabbix in chunks of
+    chunk_size items, one trapper request (and one TCP connection) per chunk.
+
+    A chunk is sent as soon as it is full; flush() sends the remainder. Used as a context
+    manager, the batch is flushed on exit:
+
+        with MetricBatch() as batch:
+            for key, value in metrics.items():
+                batch.add(key, value)
+        failed = [r for r in batch.results if not r.ok]
+
+    When the server cannot be reached, the chunk is appended to the local spool instead
+    of being dropped, and for the next zabbix_retry_interval seconds every batch spools
+    right away without trying the network. Connecting is given connect_timeout seconds
+    (then timeout for the request itself), so the first failed send does not hold the
+    caller for the full timeout. After a successful send, flush() replays the spooled
+    values (with their original clocks) in large requests.
+
+    Settings not given explicitly are read from config.yaml (see get_zabbix_settings).
+    """
+    def __init__(self, host=None, chunk_size=None, server=None, port=None, timeout=None, use_spool=True,
+                 connect_timeout=None):
+        settings = get_zabbix_settings()
+        self.host = host or settings["host"]
+        self.chunk_size = max(1, int(chunk_size or settings["chunk_size"]))
+        self.server = server or settings["server"]
+        self.port = port or settings["port"]
+        self.timeout = timeout or settings["timeout"]
+        self.connect_timeout = min(connect_timeout or settings["connect_timeout"], self.timeout)
+        self.replay_batch_size = settings["replay_batch_size"]
+        self.spool = get_spool(settings) if use_spool else None
+        self.pending = []
+        self.results = []
+        self.chunks_sent = 0
+        self._sender = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, key, value, host=None, clock=None):
+        """Queue one value; clock defaults to now (Unix timestamp)."""
+        self.pending.append((host or self.host, key, value, int(clock if clock is not None else time.time())))
+        if len(self.pending) >= self.chunk_size:
+            self._send_pending()
+
+    def flush(self):
+        """Send every pending item and return the results of all items sent by this batch."""
+        self._send_pending()
+        if self.spool is not None and any(result.ok for result in self.results):
+            self.replay_spool()
+        return self.results
+
+    def replay_spool(self):
+        """Send the sealed spool segments; returns the number of items replayed."""
+        if self.spool is None:
+            return 0
+        sent = self.spool.replay(self._deliver, self.replay_batch_size)
+        if sent:
+            logger.get_logger().info(f"Replayed {sent} spooled metrics to Zabbix")
+        return sent
+
+    def _send_pending(self):
+        while self.pending:
+            chunk = self.pending[:self.chunk_size]
+            del self.pending[:self.chunk_size]
+            self.results.extend(self._send_chunk(chunk))
+
+    def _new_sender(self, chunk_size):
+        # The Sender's timeout applies to connect(); the socket wrapper, called once the
+        # connection is up, gives the request itself the full timeout.
+        return Sender(server=self.server, port=self.port, timeout=self.connect_timeout,
+                      chunk_size=chunk_size, socket_wrapper=self._connected)
+
+    def _connected(self, connection, tls):
+        connection.settimeout(self.timeout)
+        return connection
+
+    def _get_sender(self):
+        if self._sender is None:
+            self._sender = self._new_sender(self.chunk_size)
+        return self._sender
+
+    def _deliver(self, items):
+        """Send spooled items in one request; False if the server could not be reached."""
+        try:
+            response = self._new_sender(max(len(items), 1)).send(
+                [ItemValue(host, key, value, clock) for host, key, value, clock in items])
+        except Exception as e:
+            logger.get_logger().error(f"Error replaying {len(items)} spooled metrics to Zabbix: {e}")
+            self.spool.mark_down()
+            return False
+        if response.failed:
+            logger.get_logger().error(f"Zabbix rejected part of the replayed metrics: {response}")
+        return True
+
+    def _send_chunk(self, chunk):
+        log = logger.get_logger()
+        self.chunks_sent += 1
+        number = self.chunks_sent
+        if self.spool is not None and self.spool.server_down():
+            self.spool.append(chunk)
+            log.debug(f"Zabbix marked unreachable, spooled chunk {number} of {len(chunk)} metrics")
+            return [MetricResult(host, key, value, clock, False, number, "spooled", True)
+                    for host, key, value, clock in chunk]
+        spooled = False
+        try:
+            response = self._get_sender().send(
+                [ItemValue(host, key, value, clock) for host, key, value, clock in chunk])
+            if self.spool is not None:
+                self.spool.mark_up()
+            ok = response.failed == 0
+            if ok:
+                log.debug(f"Sent chunk {number} of {len(chunk)} metrics to Zabbix, result: {response}")
+            else:
+                log.error(f"Zabbix rejected part of chunk {number}: {response}")
+        except Exception as e:
+            log.error(f"Error sending chunk {number} of {len(chunk)} metrics to Zabbix: {e}")
+            ok, response = False, e
+            if self.spool is not None:
+                self.spool.append(chunk)
+                self.spool.mark_down()
+                spooled = True
+        return [MetricResult(host, key, value, clock, ok, number, response, spooled)
+                for host, key, value, clock in chunk]
+
+def delivered(result):
+    """
+    True if the item of a MetricResult needs no resending: it was sent, spooled, or
+    received and rejected by the server (an unknown item, a value of the wrong type),
+    which sending it again would not change.
+    """
+    return result.ok or result.spooled or not isinstance(result.response, Exception)
+
+def send_metric(key, value, host=None):
+    """
+    Sends a single metric to Zabbix using the zabbix_utils library.
+    Prefer MetricBatch when sending several values: it uses one connection per chunk.
+
     :param key: The Zabbix item key (e.g. disk.usage[/])
     :param value: The value to send.
     :param host: Optional; override the host name.
-    :return: The result from the Zabbix sender.
+    :return: The MetricResult of the value, or None if it could not be sent.
     """
     log = logger.get_logger()
-    config = config_parser.load_config("config.yaml")
-    zabbix_server = config.get("zabbix_server", "127.0.0.1")
-    zabbix_port = config.get("zabbix_port", 10051)
-    if host is None:
-        host = config.get("zabbix_host", "mtb-host")
-    
-    try:
-        sender = ZabbixSender(server=zabbix_server, port=zabbix_port)
-        # Assume the send() method accepts a dict with host, key, and value.
-        result = sender.send({'host': host, 'key': key, 'value': value})
-        log.info(f"Sent metric {key} = {value} to Zabbix, result: {result}")
+    batch = MetricBatch(host=host)
+    batch.add(key, value)
+    result = batch.flush()[0]
+    if result.ok:
+        log.info(f"Sent metric {key} = {value} to Zabbix, result: {result.response}")
         return result
-    except Exception as e:
-        log.error(f"Error sending metric to Zabbix: {e}")
+    if result.spooled:
+        log.warning(f"Zabbix unreachable, spooled metric {key} = {value}")
         return None
+    log.error(f"Error sending metric to Zabbix: {result.response}")
+    return None
@@ -10,6 +10,7 @@ setup(
     install_requires=[
         "click",
         "pyyaml",
+        "psutil",
         "python-json-logger",
         "watchdog",  # for file watching functionality
     ],
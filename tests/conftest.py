@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# The fake Zabbix trapper lives with the benchmarks that also use it.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from fake_trapper import FakeTrapper  # noqa: E402
+from mtb.utils import zabbix  # noqa: E402
+
+@pytest.fixture
+def trapper():
+    with FakeTrapper() as server:
+        yield server
+
+@pytest.fixture
+def zabbix_settings(monkeypatch, tmp_path, trapper):
+    """Settings of every MetricBatch of the test: the fake trapper and a spool in tmp_path."""
+    settings = dict(zabbix.get_zabbix_settings(), server="127.0.0.1", port=trapper.port, timeout=5,
+                    spool_dir=str(tmp_path / "spool"))
+    monkeypatch.setattr(zabbix, "get_zabbix_settings", lambda: settings)
+    return settings
@@ -0,0 +1,69 @@
+import hashlib
+import random
+import threading
+
+from mtb.backup_engines.registry import get_engine
+
+class CountingThrottle:
+    def __init__(self):
+        self.ops = 0
+        self.bytes = 0
+
+    def read(self, n):
+        self.bytes += n
+
+    def op(self, n=1):
+        self.ops += n
+
+def test_storage_operations_go_through_the_throttle(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    for i in range(3):
+        (source / f"file{i}.log").write_bytes(b"data %d\n" % i * 100)
+    throttle = CountingThrottle()
+    engine = get_engine("local", {"destination": str(tmp_path / "store")}, throttle)
+
+    stats = engine.backup(str(source))
+    assert stats.errors == 0
+    stored = list(engine.list_keys())
+    # One lookup and one write per file, one write for the manifest.
+    assert len(stored) == 4
+    assert throttle.ops == 3 + len(stored)
+    assert throttle.bytes >= 3 * 700
+
+def test_files_are_sent_from_the_worker_threads(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    for i in range(4):
+        (source / f"file{i}.log").write_bytes(b"data %d\n" % i * 100)
+    engine = get_engine("local", {"destination": str(tmp_path / "store"), "hash_workers": 4})
+    # Passes only if the four uploads are in progress at the same time.
+    barrier = threading.Barrier(4, timeout=10)
+    put_file = engine.put_file
+
+    def concurrent_put_file(src_path, key):
+        barrier.wait()
+        return put_file(src_path, key)
+
+    engine.put_file = concurrent_put_file
+    stats = engine.backup(str(source))
+    assert stats.errors == 0
+    assert stats.files == 4
+
+def test_chunked_backup_with_several_workers(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    data = random.Random(0).randbytes(300 * 1024)
+    for i in range(6):
+        # Identical and overlapping files share chunks across the workers.
+        (source / f"file{i}.bin").write_bytes(data[:(i % 3 + 1) * 100 * 1024])
+    settings = {"destination": str(tmp_path / "store"), "hash_workers": 4, "chunking": True,
+                "chunk_index": str(tmp_path / "chunks.db")}
+    engine = get_engine("local", settings)
+    stats = engine.backup(str(source))
+    assert stats.errors == 0
+    assert len(engine.chunk_store.index) == stats.new_chunks
+    restored = tmp_path / "restored"
+    entry_hash = hashlib.sha256(data).hexdigest()
+    assert engine.chunk_store.restore_file(entry_hash, restored) == len(data)
+    assert restored.read_bytes() == data
@@ -0,0 +1,34 @@
+import io
+import random
+
+import pytest
+
+from mtb.backup_engines import chunk_store
+from mtb.backup_engines.chunk_store import Chunker
+
+def corpora():
+    rng = random.Random(7)
+    words = [b"INFO", b"ERROR", b"GET", b"/api/v1/orders", b"status=200", b"user=alice"]
+    text = b"".join(b" ".join(rng.choice(words) for _ in range(8)) + b" id=%x\n" % rng.getrandbits(48)
+                    for _ in range(20000))
+    return [rng.randbytes(600000), text, b"\0" * 300000]
+
+@pytest.mark.parametrize("sizes", [(16 * 1024, 64 * 1024, 256 * 1024), (1024, 4096, 16384)])
+def test_numpy_and_python_boundaries_agree(sizes):
+    pytest.importorskip("numpy")
+    chunker = Chunker(*sizes)
+    for data in corpora():
+        pos = 0
+        while pos < len(data):
+            end = min(len(data), pos + chunker.max_size)
+            cut = chunker._cut_numpy(data, pos, end)
+            assert cut == chunker._cut_python(data, pos, end)
+            pos = cut
+
+def test_chunks_rebuild_the_file(monkeypatch):
+    data = corpora()[1]
+    chunks = list(Chunker().chunks(io.BytesIO(data)))
+    assert b"".join(chunks) == data
+    assert all(len(chunk) <= 256 * 1024 for chunk in chunks)
+    monkeypatch.setattr(chunk_store, "numpy", None)
+    assert list(Chunker().chunks(io.BytesIO(data))) == chunks
@@ -0,0 +1,24 @@
+import os
+import zipfile
+
+from mtb.utils import file_utils
+
+def test_zip_codec_keeps_level_and_timestamp(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"2026-10-18 10:00:00 INFO request done\n" * 20000)
+    os.utime(path, (1700000000, 1700000000))
+    sizes = {}
+    for level in (1, 9):
+        out = file_utils.compress_file(str(path), codec="zip", level=level, verify=True)
+        sizes[level] = os.path.getsize(out)
+        with zipfile.ZipFile(out) as zipf:
+            assert zipf.namelist() == ["app.log"]
+        assert file_utils.original_mtime(out) == 1700000000
+        os.remove(out)
+    assert sizes[9] < sizes[1]
+
+def test_available_codecs(monkeypatch):
+    assert file_utils.available_codecs() == sorted(
+        name for name in file_utils.CODECS if name != "zstd" or file_utils.zstandard is not None)
+    monkeypatch.setattr(file_utils.ZstdCodec, "available", False)
+    assert "zstd" not in file_utils.available_codecs()
@@ -0,0 +1,21 @@
+import json
+
+from mtb.utils.log_fields import FieldAggregator, add_field_metrics
+
+class Batch:
+    def __init__(self):
+        self.items = {}
+
+    def add(self, key, value):
+        self.items[key] = value
+
+def test_count_field_is_sent_as_one_json_value():
+    aggregator = FieldAggregator({"status": "count", "duration_ms": "stats"})
+    aggregator.feed(b'{"status": 200, "duration_ms": 12.5}\n{"status": "500", "duration_ms": 40}\n'
+                    b'{"status": 200, "duration_ms": 7}\n')
+    batch = Batch()
+    add_field_metrics(batch, "/var/log/app.log", aggregator)
+    assert json.loads(batch.items["log.field.values[/var/log/app.log,status]"]) == {"200": 2, "500": 1}
+    assert not [key for key in batch.items if key.startswith("log.field.values") and key.count(",") > 1]
+    assert batch.items["log.field.count[/var/log/app.log,duration_ms]"] == 3
+    assert batch.items["log.field.max[/var/log/app.log,duration_ms]"] == 40.0
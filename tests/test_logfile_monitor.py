@@ -0,0 +1,48 @@
+import pytest
+
+from mtb.commands import logfile_monitor
+from mtb.utils import log_scanner
+from mtb.utils.zabbix import item_key
+
+@pytest.fixture
+def store_path(monkeypatch, tmp_path):
+    path = str(tmp_path / "offsets.db")
+    monkeypatch.setattr(logfile_monitor, "open_store", lambda: log_scanner.OffsetStore(path))
+    return path
+
+def offsets(path):
+    store = log_scanner.OffsetStore(path)
+    try:
+        return {row[0]: row[1] for row in store.db.execute("SELECT path, offset FROM files")}
+    finally:
+        store.close()
+
+def matches(trapper, path):
+    return [item["value"] for item in trapper.items if item["key"] == item_key("log.matches", path, "ERROR")]
+
+def test_rejected_item_does_not_block_offsets(tmp_path, trapper, zabbix_settings, store_path):
+    a, b = tmp_path / "a.log", tmp_path / "b.log"
+    a.write_bytes(b"ERROR one\n")
+    b.write_bytes(b"INFO two\n")
+    config = {str(a): {"patterns": ["ERROR"], "from_start": True},
+              str(b): {"patterns": ["ERROR"], "from_start": True}}
+    # An item the server does not know (not created yet) is rejected.
+    trapper.reject_keys.add(item_key("log.age", str(b)))
+    for _ in range(3):
+        assert logfile_monitor.scan_logs(config) == 0
+    assert matches(trapper, str(a)) == ["1", "0", "0"]
+    assert offsets(store_path) == {str(a): 10, str(b): 9}
+
+def test_undelivered_metrics_rescan_only_their_file(tmp_path, zabbix_settings, store_path, monkeypatch):
+    a = tmp_path / "a.log"
+    a.write_bytes(b"ERROR one\n")
+    config = {str(a): {"patterns": ["ERROR"]}}
+    # Server down and no spool: nothing can be delivered.
+    zabbix_settings.update(port=1, spool_dir="")
+    assert logfile_monitor.scan_logs(config) == 1
+    # Seen for the first time: its position at first sight (the end) is kept.
+    assert offsets(store_path) == {str(a): 10}
+    with open(a, "ab") as f:
+        f.write(b"ERROR two\n")
+    assert logfile_monitor.scan_logs(config) == 1
+    assert offsets(store_path) == {str(a): 10}
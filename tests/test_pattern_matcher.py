@@ -0,0 +1,84 @@
+import random
+import re
+
+import pytest
+
+from mtb.utils.pattern_matcher import FIND_LITERALS, MIN_SAMPLE, PatternMatcher, is_line_local
+
+WORDS = ["retry", "abc", "WARN", "ERROR", "foo", "bar", "Connection", "error", "timeout",
+         "x", "y", "z", "a", "b", "GET", "/api/orders", "HTTP/1.1", "200", "500", "user"]
+SEPARATORS = [" ", " ", " ", "  ", "\t", ": ", ""]
+
+PATTERNS = [
+    r"retry\s+abc",                 # \s can match the newline between two lines
+    r"x?y*",                        # matches everywhere, empty matches too
+    r"[^a]+z",                      # [^a] can match newlines
+    r"abc\n?foo",
+    r"bar\nfoo",                    # a literal holding a newline: never on one line
+    r"^WARN",
+    r"error$",
+    r"\Aabc",                       # only the start of each line, not of the chunk
+    r"foo\Z",
+    r"(?<=a)b",
+    r"user(?! 500)",
+    r"^$",
+    r"\bbar\b",
+    r".*Connection error.*",
+    r"HTTP/1\.1\s+500",             # dense literal, dropped from the prefilter by calibrate
+    r"timeout|ERROR",
+]
+
+def make_corpus(size, seed):
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = "".join(rng.choice(WORDS) + rng.choice(SEPARATORS) for _ in range(rng.randrange(0, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines).encode("utf-8")
+
+def expected(patterns, chunk):
+    """What the matcher must find: re.search() on every line alone."""
+    regexes = [re.compile(pattern.encode("utf-8")) for pattern in patterns]
+    lines = chunk.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    return sorted((index, line) for index, regex in enumerate(regexes) for line in lines if regex.search(line))
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("final_newline", [True, False])
+def test_matches_per_line_search(seed, final_newline):
+    chunk = make_corpus(2 * MIN_SAMPLE, seed)
+    if final_newline:
+        chunk += b"\n"
+    matcher = PatternMatcher(PATTERNS)
+    assert sorted(matcher.search(chunk)) == expected(PATTERNS, chunk)
+    # Calibrated on the first chunk, the same matcher must still agree on the next ones.
+    other = make_corpus(MIN_SAMPLE // 2, seed + 100)
+    assert sorted(matcher.search(other)) == expected(PATTERNS, other)
+
+def test_many_literals():
+    patterns = [f"{word}{i}" for i, word in enumerate(WORDS)] + PATTERNS
+    assert len(patterns) > FIND_LITERALS
+    chunk = make_corpus(2 * MIN_SAMPLE, 7)
+    chunk += b"\n" + b"\n".join(f"{word}{i} tail".encode() for i, word in enumerate(WORDS)) + b"\n"
+    matcher = PatternMatcher(patterns)
+    assert matcher.finder is not None
+    assert sorted(matcher.search(chunk)) == expected(patterns, chunk)
+
+def test_no_phantom_line_after_final_newline():
+    matcher = PatternMatcher([r"x?", r"^$"])
+    assert list(matcher.spans(b"a\nb\n")) == [(0, 0, 1), (0, 2, 3)]
+    assert list(matcher.spans(b"a\n\n")) == [(0, 0, 1), (0, 2, 2), (1, 2, 2)]
+
+def test_match_across_lines_is_rejected():
+    matcher = PatternMatcher([r"retry\s+abc", r"[^a]+z"])
+    assert list(matcher.search(b"retry\nabc\nretry  abc\nz\nxz\n")) == [(0, b"retry  abc"), (1, b"xz")]
+
+def test_is_line_local():
+    assert is_line_local(r"^WARN\s+(a|b)$")
+    assert not is_line_local(r"\Aabc")
+    assert not is_line_local(r"(a|foo\Z)")
+    assert not is_line_local(r"(?<=a)b")
+    assert not is_line_local(r"x(?!y)")
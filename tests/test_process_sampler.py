@@ -0,0 +1,67 @@
+import contextlib
+from collections import namedtuple
+from types import SimpleNamespace
+
+import psutil
+
+from mtb.utils import process_sampler
+from mtb.utils.process_sampler import ProcessGroup, ProcessSampler
+
+CpuTimes = namedtuple("CpuTimes", "user system")
+MemoryInfo = namedtuple("MemoryInfo", "rss")
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def fake_process_table(monkeypatch, clock, usage, orders):
+    """Processes using usage[pid] of a CPU; reading one takes a second; passes list them in orders."""
+    class FakeProcess:
+        def __init__(self, pid):
+            self.pid = pid
+
+        def name(self):
+            return f"app{self.pid}"
+
+        def cpu_times(self):
+            clock.now += 1.0
+            return CpuTimes(usage[self.pid] * clock.now, 0.0)
+
+        def oneshot(self):
+            return contextlib.nullcontext()
+
+        def memory_info(self):
+            return MemoryInfo(1024)
+
+        def num_threads(self):
+            return 1
+
+        def num_fds(self):
+            return 3
+
+    orders = iter(orders)
+    monkeypatch.setattr(psutil, "Process", FakeProcess)
+    monkeypatch.setattr(psutil, "pids", lambda: next(orders))
+    monkeypatch.setattr(process_sampler, "time", SimpleNamespace(
+        monotonic=clock.monotonic, perf_counter=clock.perf_counter, sleep=clock.sleep))
+
+def test_cpu_is_measured_over_each_process_own_interval(monkeypatch):
+    clock = Clock()
+    # The second pass reads the processes in the other order: 1 is read 4s after its
+    # first read, 2 only 2s after.
+    fake_process_table(monkeypatch, clock, {1: 0.5, 2: 0.25}, [[1, 2], [2, 1]])
+    sampler = ProcessSampler([ProcessGroup("one", names=["app1"]), ProcessGroup("two", names=["app2"])])
+    result = sampler.sample(interval=1.0)
+    assert result["groups"]["one"]["cpu"] == 50.0
+    assert result["groups"]["two"]["cpu"] == 25.0
+    assert result["top_cpu"] == 50.0
+    assert result["groups"]["one"]["fds"] == 3
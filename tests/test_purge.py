@@ -0,0 +1,30 @@
+import os
+import time
+
+from mtb.commands import purge
+from mtb.utils.purge_planner import PurgeCandidate, PurgeRule
+
+def test_parallel_purge_gives_the_parent_one_share_of_io_limit(tmp_path, monkeypatch):
+    io_limit = {"ops_per_second": 1000}
+    delete_rule = PurgeRule(r".*\.old$", 1, 2, io_limit=io_limit)
+    bundle_rule = PurgeRule(r".*\.log$", 1, 100, bundle="day", io_limit=io_limit)
+    now = time.time()
+    candidates = []
+    for name, rule in (("a.old", delete_rule), ("b.log", bundle_rule), ("c.log", bundle_rule)):
+        path = tmp_path / name
+        path.write_bytes(b"x" * 100)
+        candidates.append(PurgeCandidate(str(path), rule, now - 5 * 86400, 100))
+    shares = []
+    shared = purge.throttle.shared
+
+    def recording_shared(limit, share=1):
+        shares.append(share)
+        return shared(limit, share)
+
+    monkeypatch.setattr(purge.throttle, "shared", recording_shared)
+    purge.process_files_parallel(candidates, now, workers=2)
+
+    # Two workers and the parent (bundling and deletions): three shares each.
+    assert shares and set(shares) == {3}
+    assert not os.path.exists(candidates[0].path)
+    assert sorted(os.listdir(tmp_path))[0].startswith("bundle-")
@@ -0,0 +1,58 @@
+import os
+import sqlite3
+
+from mtb.utils import purge_index
+from mtb.utils.purge_planner import PurgeRule, plan
+
+def make_tree(root, directories):
+    for i in range(directories):
+        path = root / f"d{i}"
+        path.mkdir()
+        (path / "app.log").write_bytes(b"x")
+        os.utime(path, (0, 0))
+    os.utime(root, (0, 0))
+
+def open_index(tmp_path, rules, root):
+    return purge_index.PurgeIndex(str(tmp_path / "state.db"), purge_index.rules_signature(rules, root))
+
+def test_directories_are_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(purge_index, "BATCH_SIZE", 2)
+    root = tmp_path / "root"
+    root.mkdir()
+    make_tree(root, 5)
+    rules = [PurgeRule(r".*\.log$", 1, 2, recursive=True)]
+    index = open_index(tmp_path, rules, str(root))
+    other = sqlite3.connect(tmp_path / "state.db", timeout=0)
+    walk = plan(rules, str(root), index, now=1e9)
+    next(walk)
+    next(walk)
+    next(walk)
+    # Three directories read, two written: the database is not locked between batches.
+    assert other.execute("SELECT count(*) FROM directories").fetchone() == (2,)
+    with other:
+        other.execute("INSERT INTO meta VALUES ('other', 'writer')")
+    assert len(list(walk)) == 2
+    index.close()
+    assert other.execute("SELECT count(*) FROM directories").fetchone() == (6,)
+
+def test_locked_database_falls_back_to_full_walk(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    make_tree(root, 3)
+    rules = [PurgeRule(r".*\.log$", 1, 2, recursive=True)]
+    index = open_index(tmp_path, rules, str(root))
+    assert len(list(plan(rules, str(root), index, now=1e9))) == 3
+    index.close()
+
+    index = open_index(tmp_path, rules, str(root))
+    index.db.close()
+    index.db = sqlite3.connect(tmp_path / "state.db", timeout=0)
+    other = sqlite3.connect(tmp_path / "state.db")
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        assert len(list(plan(rules, str(root), index, now=1e9))) == 3
+    finally:
+        other.rollback()
+    assert index.failed
+    assert index.stats() == {"dirs_scanned": 4, "dirs_skipped": 0}
+    index.close()
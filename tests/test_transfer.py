@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+from mtb.utils import transfer
+
+@pytest.mark.parametrize("name,func", transfer.METHODS)
+def test_copy_starts_at_the_current_position(tmp_path, name, func):
+    source = tmp_path / "source"
+    source.write_bytes(b"header\n" + b"payload " * 1000)
+    with open(source, "rb") as f_in, open(tmp_path / "target", "wb") as f_out:
+        f_in.seek(7)
+        assert func(f_in.fileno(), f_out.fileno(), None) == 8000
+        assert os.lseek(f_in.fileno(), 0, os.SEEK_CUR) == source.stat().st_size
+    assert (tmp_path / "target").read_bytes() == b"payload " * 1000
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mtb.utils.watch_daemon import WatcherDaemon
+from mtb.utils.watch_pipeline import CHANGED, DELETED, FileAction, FileFilter, WatchPipeline
+
+@pytest.fixture
+def daemon():
+    daemon = WatcherDaemon(store=object())
+    daemon.executor = ThreadPoolExecutor(max_workers=1)
+    daemon.observer.start()
+    yield daemon
+    daemon.observer.stop()
+    daemon.observer.join()
+    for _, pipeline, _ in daemon.watchers.values():
+        pipeline.stop()
+    daemon.executor.shutdown(wait=True)
+
+def wait_for_events(daemon, name, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        events = daemon.metrics()[name]["events"]
+        if events:
+            return events
+        time.sleep(0.05)
+    return 0
+
+def test_removing_a_watcher_keeps_the_shared_watch(daemon, tmp_path):
+    watchers = {"a": {"directory": str(tmp_path)}, "b": {"directory": str(tmp_path)}}
+    daemon.apply({"watchers": watchers})
+    assert daemon.watchers["a"][2] == daemon.watchers["b"][2]
+    assert len(daemon.observer.emitters) == 1
+
+    daemon.apply({"watchers": {"b": watchers["b"]}})
+    assert len(daemon.observer.emitters) == 1
+    (tmp_path / "data.csv").write_bytes(b"x")
+    assert wait_for_events(daemon, "b")
+
+    daemon.apply({"watchers": {}})
+    assert not daemon.observer.emitters
+
+def test_stop_counts_the_queued_events(tmp_path):
+    # Never started: every event is still in the queue when the pipeline stops.
+    pipeline = WatchPipeline(FileFilter(), FileAction(), quiet=60, workers=1)
+    for name in ("a", "b"):
+        (tmp_path / name).write_text(name)
+        for _ in range(3):
+            pipeline.events.put((CHANGED, str(tmp_path / name), time.monotonic()))
+    pipeline.events.put((DELETED, str(tmp_path / "gone"), time.monotonic()))
+    assert pipeline.stop() == 2
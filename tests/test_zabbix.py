@@ -0,0 +1,105 @@
+import os
+import socket
+import time
+
+from mtb.utils.zabbix import MetricBatch, item_key
+
+def unused_port():
+    """A local port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_items_are_sent_in_chunks(trapper, zabbix_settings):
+    with MetricBatch(chunk_size=4) as batch:
+        for i in range(10):
+            batch.add(f"test.item[{i}]", i)
+            # A chunk goes out as soon as it is full.
+            assert trapper.requests == (i + 1) // 4
+    assert trapper.requests == 3
+    assert [item["key"] for item in trapper.items] == [f"test.item[{i}]" for i in range(10)]
+    assert [item["value"] for item in trapper.items] == [str(i) for i in range(10)]
+
+def test_per_item_results(trapper, zabbix_settings):
+    with MetricBatch(host="web-1", chunk_size=2) as batch:
+        batch.add("a", 1, clock=1000)
+        batch.add("b", 2)
+        batch.add("c", 3, host="web-2")
+    assert [(r.host, r.key, r.value, r.ok, r.chunk, r.spooled) for r in batch.results] == [
+        ("web-1", "a", 1, True, 1, False),
+        ("web-1", "b", 2, True, 1, False),
+        ("web-2", "c", 3, True, 2, False),
+    ]
+    assert batch.results[0].clock == 1000
+    assert [item["host"] for item in trapper.items] == ["web-1", "web-1", "web-2"]
+
+def test_rejected_item_fails_its_chunk_only(trapper, zabbix_settings):
+    trapper.reject_keys.add("bad")
+    with MetricBatch(chunk_size=2) as batch:
+        for key in ("a", "b", "bad", "c", "d"):
+            batch.add(key, 0)
+    assert [(r.key, r.ok, r.chunk, r.spooled) for r in batch.results] == [
+        ("a", True, 1, False),
+        ("b", True, 1, False),
+        ("bad", False, 2, False),
+        ("c", False, 2, False),
+        ("d", True, 3, False),
+    ]
+
+def test_unreachable_server_fails_every_chunk(zabbix_settings):
+    with MetricBatch(port=unused_port(), chunk_size=2, use_spool=False) as batch:
+        for i in range(3):
+            batch.add(f"test.item[{i}]", i)
+    assert [(r.ok, r.chunk, r.spooled) for r in batch.results] == [(False, 1, False), (False, 1, False),
+                                                                   (False, 2, False)]
+    assert all(isinstance(r.response, Exception) for r in batch.results)
+
+def test_item_key():
+    assert item_key("log.matches", "/var/log/app.log", "ERROR") == "log.matches[/var/log/app.log,ERROR]"
+    assert item_key("k", "a,b", 'say "hi"') == 'k["a,b","say \\"hi\\""]'
+
+def seal(spool):
+    """Move the current segments to a past minute, as if that minute was over."""
+    for minute, path in enumerate(spool.segments()):
+        os.rename(path, spool._segment_path(minute))
+
+def test_spool_and_replay(trapper, zabbix_settings):
+    down = unused_port()
+    with MetricBatch(port=down) as batch:
+        batch.add("a", 1, clock=1000)
+    assert [(r.ok, r.spooled) for r in batch.results] == [(False, True)]
+    spool = batch.spool
+    assert spool.server_down()
+
+    # While the server is marked down, batches spool without trying it.
+    with MetricBatch(chunk_size=1) as batch:
+        batch.add("b", 2, clock=2000)
+    assert [(r.ok, r.spooled, r.response) for r in batch.results] == [(False, True, "spooled")]
+    assert trapper.connections == 0
+
+    # Once it answers again, the next batch replays the spool with the original clocks.
+    spool.mark_up()
+    seal(spool)
+    with MetricBatch() as batch:
+        batch.add("c", 3, clock=3000)
+    assert [r.ok for r in batch.results] == [True]
+    assert [(item["key"], item["clock"]) for item in trapper.items] == [("c", 3000), ("a", 1000), ("b", 2000)]
+    assert spool.segments() == []
+    assert not spool.server_down()
+
+def test_successful_send_clears_the_down_marker(trapper, zabbix_settings):
+    with MetricBatch() as batch:
+        batch.spool.mark_down()
+        batch.spool.retry_interval = 0
+        batch.add("a", 1)
+    assert batch.results[0].ok
+    batch.spool.retry_interval = 60
+    assert not batch.spool.server_down()
+
+def test_connect_timeout_does_not_limit_the_request(trapper, zabbix_settings):
+    trapper.delay = 0.5
+    start = time.monotonic()
+    with MetricBatch(timeout=5, connect_timeout=0.1, use_spool=False) as batch:
+        batch.add("a", 1)
+    assert batch.results[0].ok
+    assert time.monotonic() - start >= 0.5